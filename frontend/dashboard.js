@@ -35,9 +35,10 @@ async function loadCampaigns() {
 
     // Update continue button
     if (dashboardContinueBtn) {
-        dashboardContinueBtn.disabled = cachedCampaigns.length === 0;
-        dashboardContinueBtn.innerText = cachedCampaigns.length > 0
-            ? `Continuar Campanha (${cachedCampaigns.length})`
+        const total = cachedCampaigns.total ?? cachedCampaigns.length;
+        dashboardContinueBtn.disabled = total === 0;
+        dashboardContinueBtn.innerText = total > 0
+            ? `Continuar Campanha (${total})`
             : "Continuar Campanha";
     }
 }
@@ -132,6 +132,33 @@ async function loadSidebarCampaigns() {
     }
 }
 
+// History is loaded one page at a time: the newest messages first, older
+// pages when the player scrolls to the top (GET ...?before=<start>).
+const HISTORY_PAGE_SIZE = 50;
+let historyStart = 0;      // Position of the oldest message loaded so far
+let loadingOlderHistory = false;
+
+async function fetchHistoryPage(before = null) {
+    const params = new URLSearchParams({ limit: HISTORY_PAGE_SIZE });
+    if (before !== null) params.set('before', before);
+    const response = await fetch(`/campaigns/${currentCampaignId}/history?${params}`, {
+        headers: { 'Authorization': `Bearer ${getAuthToken()}` }
+    });
+    return response.json();
+}
+
+// History entries come from the server's display projection: only player and
+// narrator turns, already without their JSON blocks
+function buildMessageElement(msg) {
+    const msgDiv = document.createElement('div');
+    msgDiv.classList.add('message', msg.role === 'user' ? 'user' : 'bot');
+    const bubble = document.createElement('div');
+    bubble.classList.add('bubble');
+    bubble.innerHTML = parseMarkdown(msg.content);
+    msgDiv.appendChild(bubble);
+    return msgDiv;
+}
+
 async function loadHistory() {
     messagesDiv.innerHTML = '';
     const loadingDiv = document.createElement('div');
@@ -140,17 +167,14 @@ async function loadHistory() {
     messagesDiv.appendChild(loadingDiv);
 
     try {
-        const response = await fetch(`/campaigns/${currentCampaignId}/history`, {
-            headers: { 'Authorization': `Bearer ${getAuthToken()}` }
-        });
-        const data = await response.json();
+        const data = await fetchHistoryPage();
 
         messagesDiv.removeChild(loadingDiv);
+        historyStart = data.start || 0;
 
         if (data.history && data.history.length > 0) {
             for (const msg of data.history) {
-                if (msg.role === 'user') await appendMessage(msg.content, 'user', false);
-                if (msg.role === 'assistant') await appendMessage(msg.content, 'bot', false);
+                messagesDiv.appendChild(buildMessageElement(msg));
             }
         } else {
             await appendMessage("Campanha carregada. Histórico vazio.", 'system');
@@ -162,6 +186,28 @@ async function loadHistory() {
     }
 }
 
+async function loadOlderHistory() {
+    if (loadingOlderHistory || historyStart <= 0) return;
+    loadingOlderHistory = true;
+    try {
+        const data = await fetchHistoryPage(historyStart);
+        historyStart = data.start || 0;
+
+        // Prepend and keep the messages on screen where they were
+        const previousHeight = messagesDiv.scrollHeight;
+        const fragment = document.createDocumentFragment();
+        for (const msg of data.history || []) {
+            fragment.appendChild(buildMessageElement(msg));
+        }
+        messagesDiv.insertBefore(fragment, messagesDiv.firstChild);
+        messagesDiv.scrollTop += messagesDiv.scrollHeight - previousHeight;
+    } catch (e) {
+        console.error('Failed to load older messages', e);
+    } finally {
+        loadingOlderHistory = false;
+    }
+}
+
 async function sendMessage() {
     try {
         const text = userInput.value.trim();
@@ -194,8 +240,8 @@ async function sendMessage() {
         messagesDiv.appendChild(loadingDiv);
         scrollToBottom();
 
-        // alert("Passo 3: Fetching...");
-        const response = await fetch('/chat', {
+        // Stream the narrative as it is generated (Server-Sent Events over POST)
+        const response = await fetch('/chat/stream', {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
@@ -207,27 +253,47 @@ async function sendMessage() {
             })
         });
 
-        // alert("Passo 4: Response status " + response.status);
-        const data = await response.json();
-
-        if (messagesDiv.contains(loadingDiv)) messagesDiv.removeChild(loadingDiv);
+        if (!response.ok || !response.body) {
+            throw new Error(`HTTP ${response.status}`);
+        }
 
-        if (data.response) {
-            await appendMessage(data.response, 'bot', true);
+        let streamBubble = null;
+        let streamedText = '';
 
-            // Refresh sidebar AFTER message is fully displayed
-            // Add delay to ensure backend has processed the JSON
-            setTimeout(() => {
-                if (window.refreshSidebar) {
-                    console.log('[GAME] Refreshing sidebar after AI response');
-                    window.refreshSidebar();
+        await readChatStream(response, {
+            onToken: (token) => {
+                if (!streamBubble) {
+                    if (messagesDiv.contains(loadingDiv)) messagesDiv.removeChild(loadingDiv);
+                    streamBubble = createBotBubble();
                 }
-            }, 500);
-        } else if (data.error) {
-            await appendMessage("Erro do Servidor: " + data.error, 'bot');
-            const msg = Array.isArray(data.detail) ? data.detail[0].msg : JSON.stringify(data.detail);
-            await appendMessage("Erro de Validação: " + msg, 'bot');
-        }
+                streamedText += token;
+                streamBubble.innerHTML = parseMarkdown(streamedText);
+                scrollToBottom();
+            },
+            onDone: async (data) => {
+                if (messagesDiv.contains(loadingDiv)) messagesDiv.removeChild(loadingDiv);
+                if (streamBubble) {
+                    // Final text is cleaned server-side and includes level-up / passive messages
+                    streamBubble.innerHTML = parseMarkdown(stripJsonBlocks(data.response));
+                    scrollToBottom();
+                } else {
+                    await appendMessage(data.response, 'bot', true);
+                }
+
+                // Refresh sidebar AFTER message is fully displayed
+                // Add delay to ensure backend has processed the JSON
+                setTimeout(() => {
+                    if (window.refreshSidebar) {
+                        console.log('[GAME] Refreshing sidebar after AI response');
+                        window.refreshSidebar();
+                    }
+                }, 500);
+            },
+            onError: async (data) => {
+                if (messagesDiv.contains(loadingDiv)) messagesDiv.removeChild(loadingDiv);
+                await appendMessage("Erro do Servidor: " + data.error, 'bot');
+            }
+        });
     } catch (error) {
         if (messagesDiv.contains(loadingDiv)) messagesDiv.removeChild(loadingDiv);
         alert("Erro no chat: " + error.message);
@@ -241,6 +307,49 @@ async function sendMessage() {
 // --- Helper Functions ---
 function scrollToBottom() { messagesDiv.scrollTop = messagesDiv.scrollHeight; }
 
+/**
+ * Read a text/event-stream response and dispatch token / done / error events
+ */
+async function readChatStream(response, handlers) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        let separator;
+        while ((separator = buffer.indexOf('\n\n')) !== -1) {
+            const rawEvent = buffer.slice(0, separator);
+            buffer = buffer.slice(separator + 2);
+
+            let eventName = 'message';
+            let dataText = '';
+            for (const line of rawEvent.split('\n')) {
+                if (line.startsWith('event:')) eventName = line.slice(6).trim();
+                else if (line.startsWith('data:')) dataText += line.slice(5).trim();
+            }
+            const data = dataText ? JSON.parse(dataText) : {};
+
+            if (eventName === 'token') handlers.onToken(data.text);
+            else if (eventName === 'done') await handlers.onDone(data);
+            else if (eventName === 'error') await handlers.onError(data);
+        }
+    }
+}
+
+function createBotBubble() {
+    const msgDiv = document.createElement('div');
+    msgDiv.classList.add('message', 'bot');
+    const bubble = document.createElement('div');
+    bubble.classList.add('bubble');
+    msgDiv.appendChild(bubble);
+    messagesDiv.appendChild(msgDiv);
+    return bubble;
+}
+
 function stripJsonBlocks(text) {
     return text.replace(/```json[\s\S]*?```/gi, '').trim();
 }
@@ -320,6 +429,9 @@ function appendMessage(text, sender, typewriter = false) {
 function setupEventListeners() {
     // Chat
     sendBtn.addEventListener('click', sendMessage);
+    messagesDiv.addEventListener('scroll', () => {
+        if (messagesDiv.scrollTop < 100) loadOlderHistory();
+    });
     userInput.addEventListener('keypress', (e) => { if (e.key === 'Enter') sendMessage(); });
 
     // Reset Button
@@ -1,5 +1,7 @@
 // shared_campaigns.js - Campaign Management
 
+const CAMPAIGN_PAGE_SIZE = 20;
+
 /**
  * Fetch all campaigns for current user
  */
@@ -13,6 +15,35 @@ async function fetchCampaigns() {
     }
 }
 
+/**
+ * Fetch one page of campaigns (server-side sort + cursor)
+ * @returns {Object} { campaigns, next_cursor, total }
+ */
+async function fetchCampaignPage({ sort = 'last_played', order = 'desc', limit = CAMPAIGN_PAGE_SIZE, cursor = null } = {}) {
+    const params = new URLSearchParams({ sort, order, limit });
+    if (cursor) params.set('cursor', cursor);
+    try {
+        const data = await apiGet(`/campaigns?${params}`);
+        return { campaigns: data.campaigns || [], next_cursor: data.next_cursor || null, total: data.total || 0 };
+    } catch (error) {
+        console.error('Failed to fetch campaigns:', error);
+        return { campaigns: [], next_cursor: null, total: 0 };
+    }
+}
+
+/**
+ * One-line summary: level, HP, turns (filled in by the server after each turn)
+ */
+function formatCampaignSummary(campaign) {
+    const summary = campaign.summary || {};
+    const parts = [];
+    if (summary.nivel !== undefined) parts.push(`Nível ${summary.nivel}`);
+    if (summary.vida_maxima) parts.push(`❤️ ${summary.vida_atual}/${summary.vida_maxima}`);
+    if (summary.turnos) parts.push(`${summary.turnos} turnos`);
+    parts.push(new Date(campaign.last_played).toLocaleDateString());
+    return parts.join(' · ');
+}
+
 /**
  * Delete a campaign
  */
@@ -44,12 +75,13 @@ function renderCampaignList(container, campaigns, options = {}) {
     const {
         showDelete = true,
         onCampaignClick = navigateToCampaign,
-        onDeleteClick = null
+        onDeleteClick = null,
+        append = false
     } = options;
 
-    container.innerHTML = '';
+    if (!append) container.innerHTML = '';
 
-    if (!campaigns || campaigns.length === 0) {
+    if (!append && (!campaigns || campaigns.length === 0)) {
         container.innerHTML = '<div style="color: #aaa; padding: 10px; text-align: center;">Nenhuma campanha encontrada.</div>';
         return;
     }
@@ -62,7 +94,8 @@ function renderCampaignList(container, campaigns, options = {}) {
         el.innerHTML = `
             <div class="campaign-info">
                 <div class="campaign-name">${campaign.name}</div>
-                <div class="campaign-meta">${new Date(campaign.last_played).toLocaleDateString()}</div>
+                <div class="campaign-meta">${formatCampaignSummary(campaign)}</div>
+                ${campaign.summary && campaign.summary.ultima_mensagem ? `<div class="campaign-preview">${escapeCampaignText(campaign.summary.ultima_mensagem)}</div>` : ''}
             </div>
             ${showDelete ? `<button class="delete-btn" title="Excluir Campanha" data-id="${campaign.id}">🗑️</button>` : ''}
         `;
@@ -98,8 +131,16 @@ function renderCampaignList(container, campaigns, options = {}) {
     });
 }
 
+function escapeCampaignText(text) {
+    const div = document.createElement('div');
+    div.textContent = text;
+    return div.innerHTML;
+}
+
 /**
- * Load and render campaigns in a container
+ * Load and render campaigns in a container, one page at a time
+ * ("Carregar mais" fetches the next page). Returns the first page;
+ * its `total` property is the number of campaigns of the user.
  */
 async function loadAndRenderCampaigns(containerId, options = {}) {
     const container = document.getElementById(containerId);
@@ -110,14 +151,37 @@ async function loadAndRenderCampaigns(containerId, options = {}) {
 
     container.innerHTML = '<div style="color: #aaa; padding: 10px; text-align: center;">Carregando...</div>';
 
-    const campaigns = await fetchCampaigns();
-    renderCampaignList(container, campaigns, options);
+    const { sort, order } = options;
+    const page = await fetchCampaignPage({ sort, order });
+    renderCampaignList(container, page.campaigns, options);
+
+    let cursor = page.next_cursor;
+    if (cursor) {
+        const moreBtn = document.createElement('button');
+        moreBtn.className = 'load-more-btn';
+        moreBtn.innerText = 'Carregar mais';
+        moreBtn.addEventListener('click', async () => {
+            moreBtn.disabled = true;
+            const next = await fetchCampaignPage({ sort, order, cursor });
+            moreBtn.remove();
+            renderCampaignList(container, next.campaigns, { ...options, append: true });
+            cursor = next.next_cursor;
+            if (cursor) {
+                moreBtn.disabled = false;
+                container.appendChild(moreBtn);
+            }
+        });
+        container.appendChild(moreBtn);
+    }
 
+    const campaigns = page.campaigns;
+    campaigns.total = page.total;
     return campaigns;
 }
 
 // Export to window
 window.fetchCampaigns = fetchCampaigns;
+window.fetchCampaignPage = fetchCampaignPage;
 window.deleteCampaign = deleteCampaign;
 window.navigateToCampaign = navigateToCampaign;
 window.renderCampaignList = renderCampaignList;
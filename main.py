@@ -1,17 +1,43 @@
 from fastapi import FastAPI, HTTPException, Header
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel, EmailStr
 from typing import Optional
-from src.core.chat import process_message
+from contextlib import asynccontextmanager
+import asyncio
+import json
+from src.core.chat import process_message, process_message_stream
 from src.core.player import load_player, save_player
-from src.core.auth import create_user, authenticate_user, get_user_by_id
-from src.core.sessions import create_session, validate_session, delete_session
-from src.core.campaigns import get_campaigns, create_campaign, get_campaign_details
-from src.core.chat import get_chat_history
+from src.core.auth import create_user, authenticate_user, get_user_by_id, run_password_task, AuthBusyError
+from src.core.sessions import create_session, validate_session, delete_session, start_session_sweeper, stop_session_sweeper
+from src.core.campaigns import list_campaigns as list_user_campaigns, create_campaign, get_campaign_details, start_activity_flusher, stop_activity_flusher
+from src.core.chat import get_chat_history, campaign_lock
+from src.core.storage import start_cache_flusher, stop_cache_flusher
+from src.core.memory import stop_memory_worker
+from src.core import llm
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Background workers: storage cache flusher, expired-session sweeper and
+    # campaign activity flusher. Pending activity goes into the cache before
+    # the cache is flushed one last time on shutdown.
+    start_cache_flusher()
+    start_session_sweeper()
+    start_activity_flusher()
+    await llm.warm_up()
+    yield
+    await stop_memory_worker()
+    await llm.close()
+    stop_session_sweeper()
+    stop_activity_flusher()
+    stop_cache_flusher()
+
+app = FastAPI(lifespan=lifespan)
+
+# Messages per history page (GET /campaigns/{id}/history)
+HISTORY_PAGE_SIZE = 50
+HISTORY_MAX_PAGE_SIZE = 200
 
 class ChatRequest(BaseModel):
     message: str
@@ -28,6 +54,9 @@ class PlayerCreateRequest(BaseModel):
     historia: str
     atributos: dict
 
+class ForkRequest(BaseModel):
+    name: Optional[str] = None
+
 class RegisterRequest(BaseModel):
     username: str
     email: EmailStr
@@ -105,7 +134,7 @@ async def create_player(request: PlayerCreateRequest):
         
         save_player(request.user_id, player, campaign_id=campaign_id)
         
-        primeira_resposta = process_message("Quero começar minha aventura agora.", request.user_id, campaign_id=campaign_id)
+        primeira_resposta = await process_message("Quero começar minha aventura agora.", request.user_id, campaign_id=campaign_id)
         
         # Return response compatible with what legacy might expect, plus campaign_id
         return {"response": primeira_resposta, "campaign_id": campaign_id}
@@ -115,7 +144,8 @@ async def create_player(request: PlayerCreateRequest):
 
 # Campaign Endpoints
 @app.get("/campaigns")
-async def list_campaigns(authorization: Optional[str] = Header(None)):
+async def list_campaigns(sort: str = "last_played", order: str = "desc", limit: Optional[int] = None, cursor: Optional[str] = None, authorization: Optional[str] = Header(None)):
+    """Campaigns with their summaries; pass limit (and next_cursor) to page through them"""
     try:
         if not authorization or not authorization.startswith("Bearer "):
             return JSONResponse(status_code=401, content={"error": "No token provided"})
@@ -125,8 +155,10 @@ async def list_campaigns(authorization: Optional[str] = Header(None)):
         if not user_id:
             return JSONResponse(status_code=401, content={"error": "Invalid token"})
         
-        campaigns = get_campaigns(int(user_id))
-        return {"campaigns": campaigns}
+        try:
+            return list_user_campaigns(int(user_id), sort=sort, order=order, limit=limit, cursor=cursor)
+        except ValueError as e:
+            return JSONResponse(status_code=400, content={"error": str(e)})
     except Exception as e:
         return JSONResponse(status_code=500, content={"error": str(e)})
 
@@ -189,11 +221,11 @@ async def create_new_campaign(request: PlayerCreateRequest, authorization: Optio
         
         # Run hidden setup (User won't see this)
         from src.core.chat import generate_character_setup
-        generate_character_setup(user_id_int, campaign_id, system_prompt)
+        await generate_character_setup(user_id_int, campaign_id, system_prompt)
         
         # After generation, we send the introductory message
         intro_prompt = "Descreva onde meu personagem está e como a aventura começa, baseado na minha história."
-        primeira_resposta = process_message(intro_prompt, user_id_int, campaign_id)
+        primeira_resposta = await process_message(intro_prompt, user_id_int, campaign_id)
         
         return {"campaign_id": campaign_id, "response": primeira_resposta, "name": campaign_name}
         
@@ -201,15 +233,22 @@ async def create_new_campaign(request: PlayerCreateRequest, authorization: Optio
         return JSONResponse(status_code=500, content={"error": str(e)})
 
 @app.get("/campaigns/{campaign_id}/history")
-async def get_history(campaign_id: str, authorization: Optional[str] = Header(None)):
+async def get_history(campaign_id: str, before: Optional[int] = None, after: Optional[int] = None, limit: int = HISTORY_PAGE_SIZE, authorization: Optional[str] = Header(None)):
+    """
+    One page of the history, newest first by default. `start` is the cursor
+    for older messages (?before=start) and `end` for newer ones (?after=end).
+    """
     try:
         if not authorization: return JSONResponse(status_code=401, content={"error": "Unauthorized"})
         token = authorization.replace("Bearer ", "")
         user_id = validate_session(token)
         if not user_id: return JSONResponse(status_code=401, content={"error": "Invalid token"})
-        
-        history = get_chat_history(int(user_id), campaign_id)
-        return {"history": history}
+
+        try:
+            page = get_chat_history(int(user_id), campaign_id, limit=min(limit, HISTORY_MAX_PAGE_SIZE), before=before, after=after)
+        except ValueError as e:
+            return JSONResponse(status_code=400, content={"error": str(e)})
+        return {"history": page["messages"], "start": page["start"], "end": page["end"], "total": page["total"]}
     except Exception as e:
         return JSONResponse(status_code=500, content={"error": str(e)})
 
@@ -232,6 +271,71 @@ async def remove_campaign(campaign_id: str, authorization: Optional[str] = Heade
     except Exception as e:
         return JSONResponse(status_code=500, content={"error": str(e)})
 
+@app.post("/campaigns/{campaign_id}/fork")
+async def fork_existing_campaign(campaign_id: str, request: ForkRequest = None, authorization: Optional[str] = Header(None)):
+    """Branch a campaign into a new one that starts from its current state"""
+    try:
+        if not authorization: return JSONResponse(status_code=401, content={"error": "Unauthorized"})
+        token = authorization.replace("Bearer ", "")
+        user_id = validate_session(token)
+        if not user_id: return JSONResponse(status_code=401, content={"error": "Invalid token"})
+
+        from src.core.campaigns import fork_campaign
+        async with campaign_lock(int(user_id), campaign_id):
+            fork_id = fork_campaign(int(user_id), campaign_id, name=request.name if request else None)
+        if fork_id is None:
+            return JSONResponse(status_code=404, content={"error": "Campanha não encontrada."})
+        return {"campaign_id": fork_id, "name": get_campaign_details(int(user_id), fork_id)["name"]}
+    except Exception as e:
+        return JSONResponse(status_code=500, content={"error": str(e)})
+
+@app.get("/campaigns/{campaign_id}/save-points")
+async def get_save_points(campaign_id: str, authorization: Optional[str] = Header(None)):
+    try:
+        if not authorization: return JSONResponse(status_code=401, content={"error": "Unauthorized"})
+        token = authorization.replace("Bearer ", "")
+        user_id = validate_session(token)
+        if not user_id: return JSONResponse(status_code=401, content={"error": "Invalid token"})
+
+        from src.core.campaigns import list_save_points
+        return {"save_points": list_save_points(int(user_id), campaign_id)}
+    except Exception as e:
+        return JSONResponse(status_code=500, content={"error": str(e)})
+
+@app.post("/campaigns/{campaign_id}/save-points")
+async def create_save_point(campaign_id: str, request: ForkRequest = None, authorization: Optional[str] = Header(None)):
+    try:
+        if not authorization: return JSONResponse(status_code=401, content={"error": "Unauthorized"})
+        token = authorization.replace("Bearer ", "")
+        user_id = validate_session(token)
+        if not user_id: return JSONResponse(status_code=401, content={"error": "Invalid token"})
+
+        from src.core.campaigns import fork_campaign
+        async with campaign_lock(int(user_id), campaign_id):
+            save_point_id = fork_campaign(int(user_id), campaign_id, name=request.name if request else None, save_point=True)
+        if save_point_id is None:
+            return JSONResponse(status_code=404, content={"error": "Campanha não encontrada."})
+        return {"save_point_id": save_point_id, "name": get_campaign_details(int(user_id), save_point_id)["name"]}
+    except Exception as e:
+        return JSONResponse(status_code=500, content={"error": str(e)})
+
+@app.post("/campaigns/{campaign_id}/save-points/{save_point_id}/restore")
+async def restore_campaign_save_point(campaign_id: str, save_point_id: str, authorization: Optional[str] = Header(None)):
+    try:
+        if not authorization: return JSONResponse(status_code=401, content={"error": "Unauthorized"})
+        token = authorization.replace("Bearer ", "")
+        user_id = validate_session(token)
+        if not user_id: return JSONResponse(status_code=401, content={"error": "Invalid token"})
+
+        from src.core.campaigns import restore_save_point
+        async with campaign_lock(int(user_id), campaign_id):
+            success = restore_save_point(int(user_id), campaign_id, save_point_id)
+        if not success:
+            return JSONResponse(status_code=404, content={"error": "Ponto de salvamento não encontrado."})
+        return {"message": "Ponto de salvamento restaurado."}
+    except Exception as e:
+        return JSONResponse(status_code=500, content={"error": str(e)})
+
 # Authentication endpoints
 @app.post("/auth/register")
 async def register(request: RegisterRequest):
@@ -244,13 +348,15 @@ async def register(request: RegisterRequest):
         if request.email != request.confirm_email:
             return JSONResponse(status_code=400, content={"error": "Os emails não coincidem."})
         
-        # Create user
-        user = create_user(request.username, request.email, request.password)
+        # Create user (bcrypt runs in the password pool, not on the event loop)
+        user = await asyncio.wrap_future(run_password_task(create_user, request.username, request.email, request.password))
         
         # Create session
         token = create_session(user['user_id'])
         
         return {"token": token, "user": user}
+    except AuthBusyError as e:
+        return JSONResponse(status_code=503, content={"error": str(e)})
     except ValueError as e:
         return JSONResponse(status_code=400, content={"error": str(e)})
     except Exception as e:
@@ -259,13 +365,15 @@ async def register(request: RegisterRequest):
 @app.post("/auth/login")
 async def login(request: LoginRequest):
     try:
-        # Authenticate user
-        user = authenticate_user(request.username, request.password)
+        # Authenticate user (bcrypt runs in the password pool, not on the event loop)
+        user = await asyncio.wrap_future(run_password_task(authenticate_user, request.username, request.password))
         
         # Create session
         token = create_session(user['user_id'])
         
         return {"token": token, "user": user}
+    except AuthBusyError as e:
+        return JSONResponse(status_code=503, content={"error": str(e)})
     except ValueError as e:
         return JSONResponse(status_code=401, content={"error": str(e)})
     except Exception as e:
@@ -306,11 +414,27 @@ async def chat(request: ChatRequest):
     print(f"DEBUG: Endpoint /chat chamado por User {request.user_id} na Campaign {request.campaign_id}")
     print(f"DEBUG: Mensagem: {request.message}")
     try:
-        resposta = process_message(request.message, request.user_id, request.campaign_id)
+        resposta = await process_message(request.message, request.user_id, request.campaign_id)
         return {"response": resposta}
     except Exception as e:
         return JSONResponse(status_code=500, content={"error": str(e)})
 
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """Same as /chat, but streams the narrative as Server-Sent Events (token ... done)"""
+    async def event_source():
+        try:
+            async for event, data in process_message_stream(request.message, request.user_id, request.campaign_id):
+                yield f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+        except Exception as e:
+            yield f"event: error\ndata: {json.dumps({'error': str(e)}, ensure_ascii=False)}\n\n"
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 app.mount("/", StaticFiles(directory="frontend", html=True), name="static")
 
 if __name__ == "__main__":
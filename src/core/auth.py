@@ -1,94 +1,238 @@
 import bcrypt
-import json
-from pathlib import Path
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from .storage import load_collection, get_record, put_record
 
-# Base directory for user data
-BASE_DIR = Path(__file__).resolve().parent.parent.parent
-USERS_FILE = BASE_DIR / "data" / "users.json"
+USERS_COLLECTION = "users"
 
-def ensure_users_file():
-    """Ensure users.json exists"""
-    USERS_FILE.parent.mkdir(parents=True, exist_ok=True)
-    if not USERS_FILE.exists():
-        USERS_FILE.write_text("{}")
+# bcrypt cost factor. Changing it upgrades stored hashes on the user's next login.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# Password work runs off the event loop in a small dedicated pool. At most
+# PASSWORD_HASH_WORKERS hashes run at once and PASSWORD_HASH_QUEUE_LIMIT wait;
+# beyond that new logins/registrations are refused with AuthBusyError.
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+PASSWORD_HASH_QUEUE_LIMIT = int(os.getenv("PASSWORD_HASH_QUEUE_LIMIT", "32"))
+# The pool's stats (get_password_hash_stats) are logged every this many tasks; 0 disables it
+PASSWORD_HASH_STATS_LOG_EVERY = int(os.getenv("PASSWORD_HASH_STATS_LOG_EVERY", "100"))
+
+class AuthBusyError(Exception):
+    """Raised when the password hashing pool is saturated"""
+
+_hash_pool = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+_hash_admission = threading.BoundedSemaphore(PASSWORD_HASH_WORKERS + PASSWORD_HASH_QUEUE_LIMIT)
+_hash_stats_lock = threading.Lock()
+_hash_stats = {
+    "tasks": 0, "rejected": 0, "hashes": 0, "verifications": 0, "rehashed": 0,
+    "queue_wait_ms_total": 0.0, "queue_wait_ms_max": 0.0, "hash_ms_total": 0.0
+}
+
+# In-memory indexes built once from the users collection and kept in sync by create_user:
+# case-folded username/email -> user_id, and user_id -> public profile (no password hash).
+_indexes_ready = False
+_by_username = {}
+_by_email = {}
+_profiles = {}
+_max_user_id = 0
+_index_lock = threading.Lock()
 
 def load_users():
-    """Load all users from users.json"""
-    ensure_users_file()
-    with open(USERS_FILE, 'r', encoding='utf-8') as f:
-        return json.load(f)
+    """Load all users (data/users.json or the users table, depending on STORAGE_BACKEND)"""
+    return load_collection(USERS_COLLECTION)
+
+def _public_profile(user_id: str, user_data: dict) -> dict:
+    return {"user_id": user_id, "username": user_data['username'], "email": user_data['email']}
+
+def _index_user(user_id: str, user_data: dict):
+    global _max_user_id
+    # setdefault: if legacy data holds duplicates, the first user keeps the name
+    _by_username.setdefault(user_data['username'].casefold(), user_id)
+    _by_email.setdefault(user_data['email'].casefold(), user_id)
+    _profiles[user_id] = _public_profile(user_id, user_data)
+    if user_id.isdigit():
+        _max_user_id = max(_max_user_id, int(user_id))
 
-def save_users(users):
-    """Save users to users.json"""
-    ensure_users_file()
-    with open(USERS_FILE, 'w', encoding='utf-8') as f:
-        json.dump(users, f, indent=2, ensure_ascii=False)
+def _ensure_indexes():
+    global _indexes_ready
+    if _indexes_ready:
+        return
+    with _index_lock:
+        if not _indexes_ready:
+            for user_id, user_data in load_users().items():
+                _index_user(user_id, user_data)
+            _indexes_ready = True
+
+def _allocate_user_id() -> str:
+    """Next free numeric ID (call with _index_lock held). Monotonic, so IDs left by deletions are not reused."""
+    global _max_user_id
+    candidate = _max_user_id + 1
+    while get_record(USERS_COLLECTION, str(candidate)) is not None:
+        candidate += 1
+    _max_user_id = candidate
+    return str(candidate)
+
+def _record_stat(**values):
+    with _hash_stats_lock:
+        for key, value in values.items():
+            if key == "queue_wait_ms_max":
+                _hash_stats[key] = max(_hash_stats[key], value)
+            else:
+                _hash_stats[key] += value
 
 def hash_password(password: str) -> str:
     """Hash a password using bcrypt"""
-    salt = bcrypt.gensalt()
+    started = time.perf_counter()
+    salt = bcrypt.gensalt(rounds=BCRYPT_ROUNDS)
     hashed = bcrypt.hashpw(password.encode('utf-8'), salt)
+    _record_stat(hashes=1, hash_ms_total=(time.perf_counter() - started) * 1000)
     return hashed.decode('utf-8')
 
 def verify_password(password: str, password_hash: str) -> bool:
     """Verify a password against its hash"""
-    return bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
+    started = time.perf_counter()
+    ok = bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
+    _record_stat(verifications=1, hash_ms_total=(time.perf_counter() - started) * 1000)
+    return ok
+
+def _hash_rounds(password_hash: str) -> int:
+    # bcrypt format: $2b$<rounds>$<salt+hash>
+    try:
+        return int(password_hash.split("$")[2])
+    except (IndexError, ValueError):
+        return 0
+
+def run_password_task(fn, *args):
+    """
+    Submit an auth operation that hashes/verifies passwords to the bcrypt pool.
+    Returns a concurrent.futures.Future (await it with asyncio.wrap_future).
+    Raises AuthBusyError immediately if the pool queue is full.
+    """
+    if not _hash_admission.acquire(blocking=False):
+        _record_stat(rejected=1)
+        raise AuthBusyError("Servidor ocupado. Tente novamente em instantes.")
+
+    enqueued = time.perf_counter()
+
+    def task():
+        wait_ms = (time.perf_counter() - enqueued) * 1000
+        _record_stat(tasks=1, queue_wait_ms_total=wait_ms, queue_wait_ms_max=wait_ms)
+        try:
+            return fn(*args)
+        finally:
+            _hash_admission.release()
+            _log_stats_periodically()
+
+    try:
+        return _hash_pool.submit(task)
+    except Exception:
+        _hash_admission.release()
+        raise
+
+def _log_stats_periodically():
+    with _hash_stats_lock:
+        tasks = _hash_stats["tasks"]
+    if PASSWORD_HASH_STATS_LOG_EVERY > 0 and tasks % PASSWORD_HASH_STATS_LOG_EVERY == 0:
+        stats = get_password_hash_stats()
+        print(
+            f"INFO: Password pool: {stats['tasks']} task(s), {stats['rejected']} rejected, "
+            f"queue wait avg {stats['queue_wait_ms_avg']} ms / max {stats['queue_wait_ms_max']:.1f} ms, "
+            f"hash avg {stats['hash_ms_avg']} ms at {stats['rounds']} rounds, {stats['rehashed']} rehashed"
+        )
+
+def get_password_hash_stats() -> dict:
+    with _hash_stats_lock:
+        stats = dict(_hash_stats)
+    operations = stats["hashes"] + stats["verifications"]
+    stats["queue_wait_ms_avg"] = round(stats["queue_wait_ms_total"] / stats["tasks"], 2) if stats["tasks"] else 0.0
+    stats["hash_ms_avg"] = round(stats["hash_ms_total"] / operations, 2) if operations else 0.0
+    stats["rounds"] = BCRYPT_ROUNDS
+    return stats
+
+def _index_new_users():
+    """Index users written to storage by another worker process since our indexes were built; call with _index_lock held"""
+    for user_id, user_data in load_users().items():
+        if user_id not in _profiles:
+            _index_user(user_id, user_data)
+
+def _check_available(username: str, email: str):
+    """Raise ValueError if the username or email is already registered; call with _index_lock held"""
+    if username.casefold() in _by_username:
+        raise ValueError("Username already exists")
+    if email.casefold() in _by_email:
+        raise ValueError("Email already exists")
 
 def create_user(username: str, email: str, password: str) -> dict:
     """Create a new user"""
-    users = load_users()
-    
-    # Check if username or email already exists
-    for user_id, user_data in users.items():
-        if user_data['username'].lower() == username.lower():
-            raise ValueError("Username already exists")
-        if user_data['email'].lower() == email.lower():
-            raise ValueError("Email already exists")
-    
-    # Generate new user ID
-    user_id = str(len(users) + 1)
-    
-    # Create user object
-    user = {
-        "username": username,
-        "email": email,
-        "password_hash": hash_password(password),
-        "created_at": datetime.now().isoformat()
-    }
-    
-    users[user_id] = user
-    save_users(users)
-    
-    return {"user_id": user_id, "username": username, "email": email}
+    _ensure_indexes()
+
+    # Duplicates are turned away before paying for the hash
+    with _index_lock:
+        _check_available(username, email)
+
+    # Hash outside the lock: it is the slow part
+    password_hash = hash_password(password)
+
+    with _index_lock:
+        # Checked again, against storage too: another signup (here or in
+        # another worker) may have taken the name while hashing
+        _index_new_users()
+        _check_available(username, email)
+
+        # Generate new user ID
+        user_id = _allocate_user_id()
+
+        # Create user object
+        user = {
+            "username": username,
+            "email": email,
+            "password_hash": password_hash,
+            "created_at": datetime.now().isoformat()
+        }
+
+        put_record(USERS_COLLECTION, user_id, user)
+        _index_user(user_id, user)
+
+    return _public_profile(user_id, user)
 
 def authenticate_user(username: str, password: str) -> dict:
     """Authenticate a user and return user info"""
-    users = load_users()
-    
-    for user_id, user_data in users.items():
-        if user_data['username'].lower() == username.lower():
-            if verify_password(password, user_data['password_hash']):
-                return {
-                    "user_id": user_id,
-                    "username": user_data['username'],
-                    "email": user_data['email']
-                }
-            else:
-                raise ValueError("Invalid password")
-    
-    raise ValueError("User not found")
+    _ensure_indexes()
+
+    user_id = _by_username.get(username.casefold())
+    if user_id is None:
+        # Maybe registered by another worker process since our indexes were built
+        with _index_lock:
+            _index_new_users()
+        user_id = _by_username.get(username.casefold())
+    user_data = get_record(USERS_COLLECTION, user_id) if user_id else None
+    if not user_data:
+        raise ValueError("User not found")
+
+    if verify_password(password, user_data['password_hash']):
+        # Upgrade (or downgrade) the stored hash when BCRYPT_ROUNDS changed
+        if _hash_rounds(user_data['password_hash']) != BCRYPT_ROUNDS:
+            user_data = dict(user_data, password_hash=hash_password(password))
+            put_record(USERS_COLLECTION, user_id, user_data)
+            _record_stat(rehashed=1)
+        return _public_profile(user_id, user_data)
+    else:
+        raise ValueError("Invalid password")
 
 def get_user_by_id(user_id: str) -> dict:
     """Get user info by ID"""
-    users = load_users()
-    
-    if user_id in users:
-        user = users[user_id]
-        return {
-            "user_id": user_id,
-            "username": user['username'],
-            "email": user['email']
-        }
-    
+    _ensure_indexes()
+
+    profile = _profiles.get(user_id)
+    if profile:
+        return dict(profile)
+
+    # Created by another worker process since our indexes were built
+    user_data = get_record(USERS_COLLECTION, user_id)
+    if user_data:
+        with _index_lock:
+            _index_user(user_id, user_data)
+        return _public_profile(user_id, user_data)
+
     raise ValueError("User not found")
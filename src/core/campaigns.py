@@ -1,19 +1,66 @@
 from datetime import datetime
+import os
+import json
 import uuid
-from .storage import load_json, save_json
+import copy
+import base64
+import threading
+from .storage import load_json, save_json, delete_file
+from .history import fork_history
 
 MANIFEST_FILE = "campaigns.json"
 
+# last_played and the campaign summary (level, HP, turns, tokens, last reply
+# preview) change on every chat turn. Instead of rewriting the manifest each
+# time, the changes are kept in memory and written in one batch per user every
+# CAMPAIGN_ACTIVITY_FLUSH_INTERVAL seconds (and on shutdown).
+# Manifest read-modify-writes (create, delete, activity flush) hold
+# _manifest_lock so they can't drop each other's changes.
+CAMPAIGN_ACTIVITY_FLUSH_INTERVAL = float(os.getenv("CAMPAIGN_ACTIVITY_FLUSH_INTERVAL", "30"))
+# Characters of the last reply kept in the summary
+PREVIEW_LENGTH = 140
+# Sortable fields of the campaign list and how to read them from an entry
+SORT_KEYS = {
+    "last_played": lambda c: c.get("last_played") or "",
+    "created_at": lambda c: c.get("created_at") or "",
+    "name": lambda c: (c.get("name") or "").lower(),
+    "nivel": lambda c: (c.get("summary") or {}).get("nivel") or 0,
+    "turnos": lambda c: (c.get("summary") or {}).get("turnos") or 0,
+}
+
+# Small per-campaign documents a fork gets its own copy of; the history is
+# shared through sealed log segments (see storage.fork_records)
+FORK_DOCUMENTS = ("player.json", "memory.json", "system_prompt.json")
+
+_manifest_lock = threading.RLock()
+_indexes = {}           # user_id -> (manifest list, {campaign_id: campaign})
+_pending_activity = {}  # user_id -> {campaign_id: {field: value}}
+_activity_thread = None
+_activity_stop = threading.Event()
+
+def _get_manifest(user_id: int) -> tuple:
+    """(campaigns, {campaign_id: campaign}); the index is rebuilt only when the manifest object changes"""
+    with _manifest_lock:
+        campaigns = load_json(user_id, MANIFEST_FILE, default=[])
+        cached = _indexes.get(user_id)
+        if cached is None or cached[0] is not campaigns:
+            index = {camp["id"]: camp for camp in campaigns}
+            # A reloaded manifest hasn't seen the timestamps still waiting for a flush
+            for campaign_id, changes in _pending_activity.get(user_id, {}).items():
+                if campaign_id in index:
+                    index[campaign_id].update(changes)
+            cached = (campaigns, index)
+            _indexes[user_id] = cached
+        return cached
+
 def get_campaigns(user_id: int):
     """List all campaigns for a user"""
-    return load_json(user_id, MANIFEST_FILE, default=[])
+    return _get_manifest(user_id)[0]
 
 def create_campaign(user_id: int, name: str, theme: str, class_name: str, mode: str):
     """Create a new campaign and return its ID"""
-    campaigns = get_campaigns(user_id)
-    
     campaign_id = str(uuid.uuid4())[:8] # Short UUID for ID
-    
+
     new_campaign = {
         "id": campaign_id,
         "name": name, # Usually "Character Name - Theme"
@@ -23,42 +70,215 @@ def create_campaign(user_id: int, name: str, theme: str, class_name: str, mode:
         "created_at": datetime.now().isoformat(),
         "last_played": datetime.now().isoformat()
     }
-    
-    campaigns.append(new_campaign)
-    save_json(user_id, MANIFEST_FILE, campaigns)
-    
+
+    with _manifest_lock:
+        campaigns, index = _get_manifest(user_id)
+        campaigns.append(new_campaign)
+        index[campaign_id] = new_campaign
+        save_json(user_id, MANIFEST_FILE, campaigns)
+
     return campaign_id
 
+def _touch_campaign(user_id: int, campaign_id: str, changes: dict):
+    """Apply `changes` to the in-memory manifest entry; written by flush_campaign_activity"""
+    camp = _get_manifest(user_id)[1].get(campaign_id)
+    if camp is None:
+        return
+    camp.update(changes)
+    _pending_activity.setdefault(user_id, {}).setdefault(campaign_id, {}).update(changes)
+
 def update_campaign_activity(user_id: int, campaign_id: str):
-    """Update last_played timestamp"""
-    campaigns = get_campaigns(user_id)
-    for camp in campaigns:
-        if camp["id"] == campaign_id:
-            camp["last_played"] = datetime.now().isoformat()
+    """Update last_played timestamp (in memory; written by flush_campaign_activity)"""
+    with _manifest_lock:
+        _touch_campaign(user_id, campaign_id, {"last_played": datetime.now().isoformat()})
+
+def record_campaign_turn(user_id: int, campaign_id: str, player: dict, reply: str, tokens: int = 0):
+    """
+    Update the campaign's summary at the end of a turn, so the campaign list
+    can show level, HP, turn count, token usage and the last reply without
+    loading each campaign's player and history.
+    """
+    with _manifest_lock:
+        camp = _get_manifest(user_id)[1].get(campaign_id)
+        if camp is None:
+            return
+        summary = dict(camp.get("summary") or {})
+        summary["turnos"] = summary.get("turnos", 0) + 1
+        summary["tokens"] = summary.get("tokens", 0) + tokens
+        preview = " ".join((reply or "").split())
+        summary["ultima_mensagem"] = preview if len(preview) <= PREVIEW_LENGTH else preview[:PREVIEW_LENGTH - 1].rstrip() + "…"
+        if player:
+            inventory = player.get("inventario", {})
+            summary["nivel"] = player.get("nivel", 1)
+            summary["vida_atual"] = inventory.get("vida_atual")
+            summary["vida_maxima"] = inventory.get("vida_maxima")
+        _touch_campaign(user_id, campaign_id, {"last_played": datetime.now().isoformat(), "summary": summary})
+
+def flush_campaign_activity() -> int:
+    """Write pending activity and summaries, one manifest save per user. Returns how many manifests were saved."""
+    with _manifest_lock:
+        pending = dict(_pending_activity)
+        _pending_activity.clear()
+        for user_id, campaign_changes in pending.items():
+            campaigns, index = _get_manifest(user_id)
+            for campaign_id, changes in campaign_changes.items():
+                if campaign_id in index:
+                    index[campaign_id].update(changes)
             save_json(user_id, MANIFEST_FILE, campaigns)
-            break
+    return len(pending)
+
+def _activity_loop():
+    while not _activity_stop.wait(CAMPAIGN_ACTIVITY_FLUSH_INTERVAL):
+        try:
+            flush_campaign_activity()
+        except Exception as e:
+            print(f"ERROR: Campaign activity flush failed: {e}")
+
+def start_activity_flusher():
+    """Start the background thread that writes pending campaign activity"""
+    global _activity_thread
+    if _activity_thread and _activity_thread.is_alive():
+        return
+    _activity_stop.clear()
+    _activity_thread = threading.Thread(target=_activity_loop, name="campaign-activity", daemon=True)
+    _activity_thread.start()
+
+def stop_activity_flusher():
+    """Stop the thread and write what is still pending (before the storage cache's last flush)"""
+    _activity_stop.set()
+    if _activity_thread:
+        _activity_thread.join(timeout=5)
+    flush_campaign_activity()
 
 def get_campaign_details(user_id: int, campaign_id: str):
     """Get metadata for a specific campaign"""
-    campaigns = get_campaigns(user_id)
-    for camp in campaigns:
-        if camp["id"] == campaign_id:
-            return camp
-    return None
+    return _get_manifest(user_id)[1].get(campaign_id)
 
 def delete_campaign(user_id: int, campaign_id: str):
-    """Delete a campaign entirely"""
-    campaigns = get_campaigns(user_id)
-    
-    # Filter out the campaign to delete
-    new_campaigns = [c for c in campaigns if c["id"] != campaign_id]
-    
-    if len(new_campaigns) == len(campaigns):
-        return False # Not found
-        
-    save_json(user_id, MANIFEST_FILE, new_campaigns)
-    
+    """Delete a campaign entirely (with its save points)"""
+    with _manifest_lock:
+        campaigns, index = _get_manifest(user_id)
+        if campaign_id not in index:
+            return False # Not found
+
+        removed = {campaign_id} | {c["id"] for c in campaigns if c.get("save_point_of") == campaign_id}
+        campaigns[:] = [c for c in campaigns if c["id"] not in removed]
+        for removed_id in removed:
+            del index[removed_id]
+            _pending_activity.get(user_id, {}).pop(removed_id, None)
+        save_json(user_id, MANIFEST_FILE, campaigns)
+
     from .storage import delete_campaign_folder
-    delete_campaign_folder(user_id, campaign_id)
-    
+    for removed_id in removed:
+        delete_campaign_folder(user_id, removed_id)
+
+    return True
+
+def _copy_campaign_data(user_id: int, source_id: str, target_id: str):
+    """Make target's state (player, memory, pinned prompt, history) a copy of source's"""
+    for filename in FORK_DOCUMENTS:
+        data = load_json(user_id, filename, default=None, campaign_id=source_id)
+        if data is None:
+            delete_file(user_id, filename, campaign_id=target_id)
+        else:
+            # Cached documents are shared objects: the copy must not alias the source
+            save_json(user_id, filename, copy.deepcopy(data), campaign_id=target_id)
+    fork_history(user_id, source_id, target_id)
+
+def fork_campaign(user_id: int, campaign_id: str, name: str = None, save_point: bool = False):
+    """
+    Branch a campaign: the new campaign starts from the current state and
+    both go their own way from here. The history is shared copy-on-write, so
+    forking does not depend on its length. With `save_point` the copy is a
+    save point of the campaign: hidden from the list, restored with
+    restore_save_point. Returns the new id, or None if the campaign is unknown.
+    """
+    with _manifest_lock:
+        campaigns, index = _get_manifest(user_id)
+        source = index.get(campaign_id)
+        if source is None:
+            return None
+        fork_id = str(uuid.uuid4())[:8]
+        now = datetime.now().isoformat()
+        fork = {k: copy.deepcopy(v) for k, v in source.items() if k not in ("save_point_of", "forked_from")}
+        fork.update({"id": fork_id, "created_at": now, "last_played": now})
+        if save_point:
+            fork["name"] = name or f"Ponto de salvamento {datetime.now():%d/%m/%Y %H:%M}"
+            fork["save_point_of"] = campaign_id
+        else:
+            fork["name"] = name or f"{source['name']} (ramificação)"
+            fork["forked_from"] = campaign_id
+
+        _copy_campaign_data(user_id, campaign_id, fork_id)
+        campaigns.append(fork)
+        index[fork_id] = fork
+        save_json(user_id, MANIFEST_FILE, campaigns)
+    return fork_id
+
+def list_save_points(user_id: int, campaign_id: str) -> list:
+    """Save points of a campaign, newest first"""
+    save_points = [c for c in get_campaigns(user_id) if c.get("save_point_of") == campaign_id]
+    return sorted(save_points, key=lambda c: c["created_at"], reverse=True)
+
+def restore_save_point(user_id: int, campaign_id: str, save_point_id: str) -> bool:
+    """Bring a campaign back to one of its save points (the save point stays available)"""
+    with _manifest_lock:
+        index = _get_manifest(user_id)[1]
+        save_point = index.get(save_point_id)
+        if campaign_id not in index or save_point is None or save_point.get("save_point_of") != campaign_id:
+            return False
+        _copy_campaign_data(user_id, save_point_id, campaign_id)
+        changes = {"last_played": datetime.now().isoformat()}
+        if "summary" in save_point:
+            changes["summary"] = copy.deepcopy(save_point["summary"])
+        _touch_campaign(user_id, campaign_id, changes)
     return True
+
+def _encode_cursor(value, campaign_id: str) -> str:
+    raw = json.dumps([value, campaign_id], ensure_ascii=False).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def _decode_cursor(cursor: str) -> tuple:
+    try:
+        value, campaign_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (ValueError, TypeError):
+        raise ValueError("cursor inválido")
+    return value, campaign_id
+
+def list_campaigns(user_id: int, sort: str = "last_played", order: str = "desc", limit: int = None, cursor: str = None) -> dict:
+    """
+    One page of the user's campaigns with their summaries:
+    {"campaigns": [...], "next_cursor": str or None, "total": int}.
+    The cursor is the (sort value, id) of the last entry of the previous page,
+    so pages stay stable while campaigns are created or deleted. Raises ValueError.
+    """
+    if sort not in SORT_KEYS:
+        raise ValueError(f"sort deve ser um de {', '.join(SORT_KEYS)}")
+    if order not in ("asc", "desc"):
+        raise ValueError("order deve ser 'asc' ou 'desc'")
+    if limit is not None and limit < 1:
+        raise ValueError("limit deve ser positivo")
+
+    sort_key = SORT_KEYS[sort]
+    with _manifest_lock:
+        campaigns = list(get_campaigns(user_id))
+    key = lambda c: (sort_key(c), c["id"])
+    campaigns.sort(key=key, reverse=order == "desc")
+
+    if cursor:
+        after = _decode_cursor(cursor)
+        try:
+            if order == "desc":
+                campaigns = [c for c in campaigns if key(c) < after]
+            else:
+                campaigns = [c for c in campaigns if key(c) > after]
+        except TypeError:
+            raise ValueError("cursor inválido")
+
+    campaigns = [c for c in campaigns if not c.get("save_point_of")]
+    page = campaigns if limit is None else campaigns[:limit]
+    next_cursor = None
+    if limit is not None and len(campaigns) > limit:
+        next_cursor = _encode_cursor(*key(page[-1]))
+    total = sum(1 for c in get_campaigns(user_id) if not c.get("save_point_of"))
+    return {"campaigns": page, "next_cursor": next_cursor, "total": total}
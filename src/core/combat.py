@@ -0,0 +1,193 @@
+from .dice import get_rng, attribute_modifier
+from .player import normalize_text
+
+# Encounter tracker: combatants, initiative order, HP, conditions and the
+# round counter live in player["combate"] (saved with the turn's player
+# transaction). The model reports what happens through the state patch
+# ("combate": {"dano": {"Goblin 1": 5}}); the numbers are applied here and
+# the model gets a compact encounter table back instead of reconstructing
+# everything from the prose.
+
+PLAYER_ID = "jogador"
+DEFEATED = "derrotado"
+
+def get_encounter(player: dict):
+    """The active encounter, or None"""
+    encounter = player.get("combate")
+    return encounter if encounter and encounter.get("ativo") else None
+
+def _player_entry(player: dict, rng) -> dict:
+    bonus = attribute_modifier(player, "destreza")
+    return {"id": PLAYER_ID, "nome": player.get("nome") or "Jogador", "iniciativa": rng.randint(1, 20) + bonus, "bonus": bonus}
+
+def _sort(encounter: dict):
+    # Highest initiative first; ties go to the higher bonus, then by name for a stable order
+    encounter["combatentes"].sort(key=lambda c: (-c["iniciativa"], -c.get("bonus", 0), c["nome"]))
+
+def _check_int(value, field: str, minimum: int = None) -> int:
+    if isinstance(value, bool) or not isinstance(value, int) or (minimum is not None and value < minimum):
+        raise ValueError(f"combate: '{field}' inválido ({value!r})")
+    return value
+
+def start_combat(player: dict, enemies: list, rng=None) -> list:
+    """
+    Start an encounter (or add reinforcements to the active one). Each enemy:
+    {"nome": "Goblin", "vida": 7, "ca": 13, "quantidade": 2, "iniciativa": 2}
+    where "iniciativa" is the enemy's initiative bonus. Raises ValueError.
+    """
+    rng = rng or get_rng()
+    encounter = get_encounter(player)
+    messages = []
+    if encounter is None:
+        encounter = {"ativo": True, "rodada": 1, "combatentes": [_player_entry(player, rng)]}
+        player["combate"] = encounter
+        messages.append("⚔️ Combate iniciado!")
+
+    taken = {normalize_text(c["nome"]) for c in encounter["combatentes"]}
+    for enemy in enemies:
+        if not isinstance(enemy, dict) or not enemy.get("nome"):
+            raise ValueError("combate: inimigo sem 'nome'")
+        vida = _check_int(enemy.get("vida"), "vida", 1)
+        ca = _check_int(enemy.get("ca", 10), "ca", 0)
+        bonus = _check_int(enemy.get("iniciativa", 0), "iniciativa")
+        quantidade = _check_int(enemy.get("quantidade", 1), "quantidade", 1)
+        for n in range(1, quantidade + 1):
+            nome = enemy["nome"] if quantidade == 1 else f"{enemy['nome']} {n}"
+            suffix = n
+            while normalize_text(nome) in taken:
+                suffix += 1
+                nome = f"{enemy['nome']} {suffix}"
+            taken.add(normalize_text(nome))
+            encounter["combatentes"].append({
+                "id": nome, "nome": nome, "iniciativa": rng.randint(1, 20) + bonus, "bonus": bonus,
+                "vida_atual": vida, "vida_maxima": vida, "ca": ca, "condicoes": []
+            })
+    _sort(encounter)
+    return messages
+
+def find_combatant(player: dict, name: str):
+    """Combatant by name (case/accent insensitive); 'jogador' or the character's name is the player"""
+    encounter = get_encounter(player)
+    if encounter is None or not isinstance(name, str):
+        return None
+    key = normalize_text(name).strip()
+    for combatant in encounter["combatentes"]:
+        if normalize_text(combatant["nome"]) == key or (key == PLAYER_ID and combatant["id"] == PLAYER_ID):
+            return combatant
+    return None
+
+def find_target(player: dict, text: str):
+    """First enemy still standing whose name appears in `text` (the player's action)"""
+    encounter = get_encounter(player)
+    if encounter is None:
+        return None
+    lowered = normalize_text(text)
+    # Longest names first so "Goblin 2" wins over "Goblin"
+    enemies = sorted((c for c in encounter["combatentes"] if c["id"] != PLAYER_ID and DEFEATED not in c["condicoes"]),
+                     key=lambda c: -len(c["nome"]))
+    for enemy in enemies:
+        if normalize_text(enemy["nome"]) in lowered:
+            return enemy
+    return None
+
+def _change_hp(player: dict, name: str, amount: int) -> str:
+    combatant = find_combatant(player, name)
+    if combatant is None:
+        raise ValueError(f"combate: '{name}' não está no combate")
+    if combatant["id"] == PLAYER_ID:
+        inventory = player.setdefault("inventario", {})
+        holder, maxima = inventory, inventory.get("vida_maxima")
+    else:
+        holder, maxima = combatant, combatant["vida_maxima"]
+    atual = holder.get("vida_atual", 0)
+    novo = max(0, atual + amount)
+    if maxima is not None:
+        novo = min(novo, max(atual, maxima))
+    holder["vida_atual"] = novo
+
+    if combatant["id"] != PLAYER_ID:
+        if novo == 0 and DEFEATED not in combatant["condicoes"]:
+            combatant["condicoes"].append(DEFEATED)
+            return f"💀 {combatant['nome']} foi derrotado"
+        if novo > 0 and DEFEATED in combatant["condicoes"]:
+            combatant["condicoes"].remove(DEFEATED)
+    return None
+
+def end_combat(player: dict) -> str:
+    encounter = get_encounter(player)
+    if encounter is None:
+        return None
+    player.pop("combate", None)
+    return f"🏁 Combate encerrado após {encounter['rodada']} rodada(s)."
+
+def apply_combat_patch(player: dict, ops: dict, rng=None) -> list:
+    """
+    Apply the "combate" part of a state patch, in this order:
+      {"iniciar": [...], "dano": {"Goblin 1": 5, "jogador": 4}, "cura": {"Goblin 2": 3},
+       "condicoes": {"Goblin 2": ["caído"]}, "remover": ["Goblin 2"], "encerrar": true}
+    The encounter ends by itself when no enemy is left standing. Raises ValueError.
+    """
+    if not isinstance(ops, dict):
+        raise ValueError("combate deve ser um objeto")
+    messages = []
+    if ops.get("iniciar"):
+        if not isinstance(ops["iniciar"], list):
+            raise ValueError("combate: 'iniciar' deve ser uma lista")
+        messages.extend(start_combat(player, ops["iniciar"], rng))
+
+    if get_encounter(player) is None:
+        if any(ops.get(k) for k in ("dano", "cura", "condicoes", "remover")):
+            raise ValueError("combate: nenhum combate ativo")
+        return messages
+
+    for key, sign in (("dano", -1), ("cura", 1)):
+        amounts = ops.get(key) or {}
+        if not isinstance(amounts, dict):
+            raise ValueError(f"combate: '{key}' deve ser um objeto {{nome: valor}}")
+        for name, amount in amounts.items():
+            message = _change_hp(player, name, sign * _check_int(amount, key, 0))
+            if message:
+                messages.append(message)
+
+    if not isinstance(ops.get("condicoes") or {}, dict) or not isinstance(ops.get("remover") or [], list):
+        raise ValueError("combate: 'condicoes' deve ser um objeto e 'remover' uma lista")
+    for name, conditions in (ops.get("condicoes") or {}).items():
+        combatant = find_combatant(player, name)
+        if combatant is None or not isinstance(conditions, list):
+            raise ValueError(f"combate: condições inválidas para '{name}'")
+        kept = [DEFEATED] if DEFEATED in combatant.get("condicoes", []) else []
+        combatant["condicoes"] = kept + [c for c in conditions if c != DEFEATED]
+
+    for name in ops.get("remover") or []:
+        combatant = find_combatant(player, name)
+        if combatant is None or combatant["id"] == PLAYER_ID:
+            raise ValueError(f"combate: não é possível remover '{name}'")
+        get_encounter(player)["combatentes"].remove(combatant)
+
+    standing = [c for c in get_encounter(player)["combatentes"] if c["id"] != PLAYER_ID and DEFEATED not in c["condicoes"]]
+    if ops.get("encerrar") or not standing:
+        messages.append(end_combat(player))
+    return messages
+
+def advance_round(player: dict):
+    """Called once per player turn while an encounter is active"""
+    encounter = get_encounter(player)
+    if encounter is not None:
+        encounter["rodada"] += 1
+
+def encounter_table(player: dict):
+    """Compact table for the prompt, in initiative order; None outside combat"""
+    encounter = get_encounter(player)
+    if encounter is None:
+        return None
+    inventory = player.get("inventario", {})
+    rows = []
+    for c in encounter["combatentes"]:
+        if c["id"] == PLAYER_ID:
+            row = f"{c['nome']} (jogador) ini {c['iniciativa']} PV {inventory.get('vida_atual', '?')}/{inventory.get('vida_maxima', '?')}"
+        else:
+            row = f"{c['nome']} ini {c['iniciativa']} PV {c['vida_atual']}/{c['vida_maxima']} CA {c['ca']}"
+        if c.get("condicoes"):
+            row += f" [{', '.join(c['condicoes'])}]"
+        rows.append(row)
+    return f"Combate, rodada {encounter['rodada']} (ordem de iniciativa): " + " > ".join(rows)
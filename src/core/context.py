@@ -0,0 +1,105 @@
+import os
+import time
+from .storage import load_json, save_json, delete_file
+from .history import tail_history, count_history
+from .memory import load_memory, render_memory
+
+# Builds the message list sent to the model for a turn:
+#   [pinned system instruction] + [campaign memory] + [newest history that fits the budget] + [trailing messages]
+# The pinned instruction is stored once per campaign and sent byte-identical every
+# turn, so the start of every request is the same and provider prompt caching hits.
+
+SYSTEM_PROMPT_FILE = "system_prompt.json"
+# Input token budget for one turn (pinned prompt + history + reinforcement)
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "6000"))
+# Most recent messages read from the log when filling the window
+CONTEXT_SCAN_LIMIT = int(os.getenv("CONTEXT_SCAN_LIMIT", "200"))
+# Per-message framing overhead (role, separators) in the chat format
+MESSAGE_OVERHEAD_TOKENS = 4
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("o200k_base")
+except Exception:
+    _encoding = None
+
+_last_stats = {}  # (user_id, campaign_id) -> stats of the last built context
+
+def count_tokens(text: str) -> int:
+    """Token count of `text`: exact with tiktoken installed, else ~4 characters per token"""
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    return (len(text) + 3) // 4
+
+def message_tokens(message: dict) -> int:
+    return count_tokens(message.get("content") or "") + MESSAGE_OVERHEAD_TOKENS
+
+def save_system_prompt(user_id: int, campaign_id: str, content: str):
+    save_json(user_id, SYSTEM_PROMPT_FILE, {"content": content}, campaign_id=campaign_id)
+
+def clear_system_prompt(user_id: int, campaign_id: str):
+    delete_file(user_id, SYSTEM_PROMPT_FILE, campaign_id=campaign_id)
+
+def get_system_prompt(user_id: int, campaign_id: str) -> str:
+    """The campaign's pinned system instruction, or None if it was not built yet"""
+    stored = load_json(user_id, SYSTEM_PROMPT_FILE, default=None, campaign_id=campaign_id)
+    if isinstance(stored, dict):
+        return stored.get("content") or None
+    return None
+
+def build_context(user_id: int, campaign_id: str, trailing: list = None, budget: int = None) -> list:
+    """
+    Messages for the next model call. The pinned instruction, the campaign
+    memory and `trailing` (e.g. the turn reinforcement) are always sent;
+    history not yet covered by the memory fills what is left
+    of the budget from newest to oldest and stops at the first message that
+    does not fit, so the window is always a contiguous suffix of the log. The
+    newest message (the player's action) is always included.
+    """
+    started = time.perf_counter()
+    budget = budget or CONTEXT_TOKEN_BUDGET
+    trailing = trailing or []
+
+    pinned = get_system_prompt(user_id, campaign_id)
+    head = [{"role": "system", "content": pinned}] if pinned else []
+
+    # Messages already folded into the memory are replaced by it
+    memory = load_memory(user_id, campaign_id)
+    memory_text = render_memory(memory)
+    if memory_text:
+        head.append({"role": "system", "content": memory_text})
+    uncovered = max(count_history(user_id, campaign_id) - memory["covered"], 0)
+
+    used = sum(message_tokens(m) for m in head) + sum(message_tokens(m) for m in trailing)
+    fixed_tokens = used
+
+    # The pinned instruction also sits in the log (first turn); don't send it twice
+    recent = tail_history(user_id, campaign_id, min(CONTEXT_SCAN_LIMIT, uncovered))
+    history = [m for m in recent if not (m.get("role") == "system" and m.get("content") == pinned)]
+    window = []
+    for message in reversed(history):
+        cost = message_tokens(message)
+        if window and used + cost > budget:
+            break
+        window.append(message)
+        used += cost
+    window.reverse()
+
+    _last_stats[(str(user_id), campaign_id)] = {
+        "tokens": used,
+        "budget": budget,
+        "pinned_tokens": fixed_tokens,
+        "memory_tokens": count_tokens(memory_text),
+        "memory_covered": memory["covered"],
+        "history_messages": len(window),
+        "history_dropped": len(history) - len(window),
+        "build_ms": round((time.perf_counter() - started) * 1000, 2)
+    }
+    print(f"INFO: Context for campaign {campaign_id}: {used}/{budget} tokens, {len(window)} history message(s)")
+    return head + window + trailing
+
+def get_context_stats(user_id: int, campaign_id: str) -> dict:
+    """Stats of the last context built for this campaign (tokens sent vs. budget)"""
+    return dict(_last_stats.get((str(user_id), campaign_id), {}))
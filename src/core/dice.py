@@ -0,0 +1,165 @@
+import os
+import re
+import random
+from .player import calculate_item_buffs, normalize_text
+
+# Server-side dice and checks. In D&D / dice modes a risky action used to cost
+# two model calls ("Role para acertar (d20 + mod)", then the narration after
+# the player typed the roll). The turn now rolls here, with the character's
+# attribute + item buff modifier, and hands the result to the model as a
+# system message in the same call.
+
+DICE_SEED = os.getenv("DICE_SEED") # Fixed sequence for tests / reproducible sessions
+_rng = random.Random(DICE_SEED)
+
+MAX_DICE = 100
+MAX_SIDES = 1000
+
+TERM_PATTERN = re.compile(r"([+-]?)\s*(?:(\d*)d(\d+)|(\d+))")
+EXPRESSION_PATTERN = re.compile(r"^\s*[+-]?\s*(?:\d*d\d+|\d+)(?:\s*[+-]\s*(?:\d*d\d+|\d+))*\s*$")
+
+ATTRIBUTES = ("forca", "destreza", "constituicao", "inteligencia", "sabedoria", "carisma")
+ATTRIBUTE_LABELS = {
+    "forca": "Força", "destreza": "Destreza", "constituicao": "Constituição",
+    "inteligencia": "Inteligência", "sabedoria": "Sabedoria", "carisma": "Carisma"
+}
+SPELL_ATTRIBUTE = {
+    "mago": "inteligencia", "artifice": "inteligencia", "clerigo": "sabedoria", "druida": "sabedoria",
+    "patrulheiro": "sabedoria", "bardo": "carisma", "feiticeiro": "carisma", "bruxo": "carisma", "paladino": "carisma"
+}
+
+# (label, attribute, word starts) in priority order; first hit wins
+CHECK_KEYWORDS = [
+    ("Ataque à distância", "destreza", ["atiro", "disparo", "flecha", "arremesso"]),
+    ("Ataque mágico", None, ["conjuro", "lanço a magia", "lanco a magia", "uso a magia"]),
+    ("Ataque", "forca", ["ataco", "atacar", "golpeio", "golpear", "acerto o", "corto o", "esfaqueio", "investida"]),
+    ("Furtividade", "destreza", ["furtiv", "me escondo", "esgueiro", "sorrateir"]),
+    ("Acrobacia", "destreza", ["acrobacia", "equilibr", "salto mortal"]),
+    ("Prestidigitação", "destreza", ["arrombo", "destranco", "bato a carteira", "furto"]),
+    ("Atletismo", "forca", ["escalo", "escalar", "empurro", "arrombar a porta", "nado", "salto"]),
+    ("Persuasão", "carisma", ["persuad", "convenc", "negocio", "barganh"]),
+    ("Enganação", "carisma", ["minto", "engano", "blefo", "disfarço"]),
+    ("Intimidação", "carisma", ["intimido", "ameaço"]),
+    ("Percepção", "sabedoria", ["procuro", "observo", "vasculho", "escuto"]),
+    ("Investigação", "inteligencia", ["investigo", "examino", "analiso"]),
+    ("Intuição", "sabedoria", ["desconfio", "leio as intenções", "percebo se"]),
+]
+CHECKS = [
+    (label, attribute, re.compile(r"\b(?:" + "|".join(re.escape(k) for k in keywords) + ")"))
+    for label, attribute, keywords in CHECK_KEYWORDS
+]
+
+# The player already rolled (old flow, dice UI): don't roll again
+ALREADY_ROLLED = re.compile(r"\b(?:rolei|tirei)\b.*\d|\b\d+\s+no\s+dado\b")
+DC_PATTERN = re.compile(r"\b(?:cd|ca|dc)\s*(\d+)\b")
+
+def get_rng() -> random.Random:
+    return _rng
+
+def parse_dice(expression: str) -> tuple:
+    """
+    "2d6+1d4-1" -> ([(2, 6, 1), (1, 4, 1)], -1): dice terms as
+    (count, sides, sign) plus the flat modifier. Raises ValueError.
+    """
+    text = expression.lower().replace(" ", "")
+    if not EXPRESSION_PATTERN.match(text):
+        raise ValueError(f"Expressão de dados inválida: '{expression}'")
+    dice = []
+    modifier = 0
+    for sign, count, sides, flat in TERM_PATTERN.findall(text):
+        factor = -1 if sign == "-" else 1
+        if flat:
+            modifier += factor * int(flat)
+            continue
+        count = int(count) if count else 1
+        sides = int(sides)
+        if not 1 <= count <= MAX_DICE or not 2 <= sides <= MAX_SIDES:
+            raise ValueError(f"Dados fora do limite: {count}d{sides}")
+        dice.append((count, sides, factor))
+    return dice, modifier
+
+def roll(expression: str, rng: random.Random = None) -> dict:
+    """Roll a dice expression: {"expressao", "rolagens", "modificador", "total"}"""
+    rng = rng or _rng
+    dice, modifier = parse_dice(expression)
+    rolls = []
+    total = modifier
+    for count, sides, factor in dice:
+        for _ in range(count):
+            value = rng.randint(1, sides)
+            rolls.append(value)
+            total += factor * value
+    return {"expressao": expression.strip(), "rolagens": rolls, "modificador": modifier, "total": total}
+
+def ability_modifier(score: int) -> int:
+    return (score - 10) // 2
+
+def proficiency_bonus(nivel: int) -> int:
+    return 2 + (max(nivel, 1) - 1) // 4
+
+def attribute_modifier(player: dict, attribute: str) -> int:
+    """Modifier from the base attribute plus the buffs of the carried items"""
+    buffs, _, _ = calculate_item_buffs(player.get("inventario", {}).get("itens", []))
+    score = player.get("atributos", {}).get(attribute, 10) + buffs.get(attribute, 0)
+    return ability_modifier(score)
+
+def spell_attribute(player: dict) -> str:
+    classe = normalize_text(player.get("classe", ""))
+    for name, attribute in SPELL_ATTRIBUTE.items():
+        if name in classe:
+            return attribute
+    return "inteligencia"
+
+def detect_check(user_message: str):
+    """
+    The check a player action calls for, or None:
+    {"tipo": "Ataque", "atributo": "forca", "cd": 15 or None}
+    """
+    text = user_message.lower()
+    if ALREADY_ROLLED.search(text):
+        return None
+    for label, attribute, pattern in CHECKS:
+        if pattern.search(text):
+            dc = DC_PATTERN.search(text)
+            return {"tipo": label, "atributo": attribute, "cd": int(dc.group(1)) if dc else None}
+    return None
+
+def resolve_check(player: dict, tipo: str, atributo: str = None, cd: int = None, rng: random.Random = None) -> dict:
+    """
+    Roll a d20 check for `player`: attribute modifier (base + item buffs),
+    plus proficiency on attacks. `cd` (DC / target AC) is optional; without it
+    the model judges the total against the difficulty it has in mind.
+    """
+    atributo = atributo or spell_attribute(player)
+    modifier = attribute_modifier(player, atributo)
+    if tipo.startswith("Ataque"):
+        modifier += proficiency_bonus(player.get("nivel", 1))
+    d20 = roll("1d20", rng)["total"]
+    total = d20 + modifier
+    result = {"tipo": tipo, "atributo": atributo, "d20": d20, "modificador": modifier, "total": total, "cd": cd}
+    if d20 == 20:
+        result["sucesso"], result["critico"] = True, True
+    elif d20 == 1:
+        result["sucesso"], result["critico"] = False, True
+    elif cd is not None:
+        result["sucesso"] = total >= cd
+    return result
+
+def describe_check(result: dict) -> str:
+    """One line for the player and the model, e.g. 'Ataque (Força): d20 14 +5 = 19 vs CD 15 → sucesso'"""
+    text = (
+        f"{result['tipo']} ({ATTRIBUTE_LABELS.get(result['atributo'], result['atributo'])}): "
+        f"d20 {result['d20']} {result['modificador']:+d} = {result['total']}"
+    )
+    if result["cd"] is not None:
+        text += f" vs CD {result['cd']}"
+    if result.get("critico"):
+        text += " → CRÍTICO " + ("(sucesso)" if result["sucesso"] else "(falha)")
+    elif "sucesso" in result:
+        text += " → " + ("sucesso" if result["sucesso"] else "falha")
+    return text
+
+def describe_roll(result: dict) -> str:
+    rolls = " + ".join(str(r) for r in result["rolagens"]) or "0"
+    modifier = f" {result['modificador']:+d}" if result["modificador"] else ""
+    return f"{result['expressao']}: [{rolls}]{modifier} = {result['total']}"
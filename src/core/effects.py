@@ -0,0 +1,135 @@
+import heapq
+
+# Timed status effects ("cura de 10 PV por 3 rounds - 3/3"). Each effect has
+# a type, a magnitude, a tick interval and a remaining count, and lives in
+# player["efeitos"]: a min-heap of [turn_due, seq, effect] persisted as-is.
+# turn_due is the next turn the effect ticks (vida/mana) or expires (status),
+# so a turn only pops the effects that are due instead of walking them all.
+
+VIDA = "vida"
+MANA = "mana"
+STATUS = "status"
+EFFECT_TYPES = (VIDA, MANA, STATUS)
+
+# Permanent passives tied to a plain status string (no counter)
+PASSIVE_STATUS = {
+    "Recuperação de Vida Extrema": (VIDA, 15, "❤️ Recuperação Extrema")
+}
+
+def current_turn(player: dict) -> int:
+    return player.get("turno", 0)
+
+def _check_int(value, field: str, minimum: int = None) -> int:
+    if isinstance(value, bool) or not isinstance(value, int) or (minimum is not None and value < minimum):
+        raise ValueError(f"efeito: '{field}' inválido ({value!r})")
+    return value
+
+def add_effect(player: dict, nome: str, tipo: str, valor: int = 0, duracao: int = 1, intervalo: int = 1) -> dict:
+    """
+    Start an effect on `player`, replacing one with the same name.
+    vida/mana effects apply `valor` (signed) every `intervalo` turns, `duracao`
+    times; status effects only last `duracao` turns. Raises ValueError.
+    """
+    if not nome or not isinstance(nome, str):
+        raise ValueError("efeito sem 'nome'")
+    if tipo not in EFFECT_TYPES:
+        raise ValueError(f"efeito '{nome}': tipo deve ser um de {', '.join(EFFECT_TYPES)}")
+    _check_int(valor, "valor")
+    _check_int(duracao, "duracao", 1)
+    _check_int(intervalo, "intervalo", 1)
+
+    end_effect(player, nome)
+    turno = current_turn(player)
+    seq = player.get("efeitos_seq", 0) + 1
+    player["efeitos_seq"] = seq
+    effect = {"nome": nome, "tipo": tipo, "valor": valor, "intervalo": intervalo, "restante": duracao, "total": duracao}
+    # Ticks start on the next turn; a status is active for the next `duracao` turns
+    due = turno + (duracao + 1 if tipo == STATUS else intervalo)
+    heapq.heappush(player.setdefault("efeitos", []), [due, seq, effect])
+
+    status = player.setdefault("status", [])
+    if nome not in status:
+        status.append(nome)
+    return effect
+
+def end_effect(player: dict, nome: str) -> bool:
+    """Remove an effect before it runs out (e.g. poison cured). True if it was active"""
+    heap = player.get("efeitos", [])
+    kept = [entry for entry in heap if entry[2]["nome"] != nome]
+    if len(kept) == len(heap):
+        return False
+    heapq.heapify(kept)
+    player["efeitos"] = kept
+    if nome in player.get("status", []):
+        player["status"].remove(nome)
+    return True
+
+def _change(inventory: dict, key: str, valor: int) -> int:
+    """Add `valor` to vida/mana within [0, máxima]. Returns the actual change"""
+    atual = inventory.get(f"{key}_atual", 0)
+    novo = max(0, atual + valor)
+    if f"{key}_maxima" in inventory:
+        novo = min(novo, max(atual, inventory[f"{key}_maxima"]))
+    inventory[f"{key}_atual"] = novo
+    return novo - atual
+
+def tick_effects(player: dict) -> list:
+    """
+    Advance the player one turn: apply the effects due now, expire the ones
+    that ran out and reschedule the rest. Returns messages for the player.
+    """
+    turno = current_turn(player) + 1
+    player["turno"] = turno
+    heap = player.get("efeitos", [])
+    inventory = player.setdefault("inventario", {})
+    messages = []
+
+    while heap and heap[0][0] <= turno:
+        _, seq, effect = heapq.heappop(heap)
+        nome = effect["nome"]
+        if effect["tipo"] == STATUS:
+            effect["restante"] = 0
+        elif effect["tipo"] == MANA and "mana_atual" not in inventory:
+            effect["restante"] -= 1 # No mana in this mode (D&D 5E): the tick is spent
+        else:
+            delta = _change(inventory, effect["tipo"], effect["valor"])
+            effect["restante"] -= 1
+            icon = "❤️" if effect["tipo"] == VIDA and effect["valor"] >= 0 else "☠️" if effect["tipo"] == VIDA else "🔷"
+            unit = "PV" if effect["tipo"] == VIDA else "Mana"
+            messages.append(f"{icon} {nome}: {delta:+d} {unit} ({effect['restante']}/{effect['total']})")
+
+        if effect["restante"] > 0:
+            heapq.heappush(heap, [turno + effect["intervalo"], seq, effect])
+        else:
+            if nome in player.get("status", []):
+                player["status"].remove(nome)
+            messages.append(f"⌛ Efeito terminou: {nome}")
+
+    for nome in player.get("status", []):
+        passive = PASSIVE_STATUS.get(nome)
+        if passive:
+            tipo, valor, label = passive
+            delta = _change(inventory, tipo, valor)
+            if delta:
+                messages.append(f"{label}: {delta:+d} PV")
+
+    return messages
+
+def effect_label(player: dict, effect: dict, due: int) -> str:
+    """Compact description with the counter, e.g. 'Regeneração +10 PV/turno 2/3'"""
+    if effect["tipo"] == STATUS:
+        return f"{effect['nome']} ({due - current_turn(player)} turnos)"
+    unit = "PV" if effect["tipo"] == VIDA else "Mana"
+    every = "turno" if effect["intervalo"] == 1 else f"{effect['intervalo']} turnos"
+    return f"{effect['nome']} {effect['valor']:+d} {unit}/{every} {effect['restante']}/{effect['total']}"
+
+def effect_labels(player: dict) -> dict:
+    """Labels of the active effects by name, soonest first"""
+    return {entry[2]["nome"]: effect_label(player, entry[2], entry[0]) for entry in sorted(player.get("efeitos", []))}
+
+def effects_summary(player: dict):
+    """One prompt line with the active timers, or None when there are none"""
+    labels = effect_labels(player)
+    if not labels:
+        return None
+    return "Efeitos ativos (aplicados pelo sistema a cada turno, não recalcule): " + "; ".join(labels.values())
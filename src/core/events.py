@@ -0,0 +1,252 @@
+import re
+import unicodedata
+from .player import perform_long_rest, inject_implicit_buffs
+
+# Narrative event extractor: the "backup" detection for replies where the AI
+# forgot (part of) the JSON block. One keyword sweep finds every place where an
+# event can start; the precompiled patterns are only tried, anchored, at those
+# places instead of each one scanning the whole reply.
+
+REST = "rest"
+SLOT_USED = "slot_used"
+DAMAGE = "damage"
+HP_SET = "hp_set"
+ITEM_GAINED = "item_gained"
+SPELL_LEARNED = "spell_learned"
+
+# Matched against the lowercased reply
+SLOT_PATTERN = re.compile(r"gasta\s+(\d+)\s+slot.*?n[ií]vel\s+(\d+)")
+DAMAGE_PATTERN = re.compile(r"levou?\s+(\d+)\s+pontos?\s+de\s+dano")
+HP_PATTERN = re.compile(r"vida\s+atual.*?(\d+)")
+# Matched against the original reply (names must start with a capital letter)
+ITEM_PATTERN = re.compile(r"(?:recebe|adquire|ganha|pega|encontra)\s+(?:um|uma|o|a)?\s*([A-ZÀ-Ú][a-zA-ZÀ-Ú\s]+?)(?:[\.,]|$)")
+SPELL_PATTERN = re.compile(r"(?:aprende|recebe|descobre)\s+(?:a magia|o feitiço)\s*([A-ZÀ-Ú][a-zA-ZÀ-Ú\s]+?)(?:[\.,]|$)")
+
+REST_KEYWORDS = ["descanso longo", "long rest", "fazer um descanso", "vou descansar", "descansou", "acampou"]
+
+# Reply cleanup: JSON/code fences and meta-commentary lines about the JSON
+JSON_FENCE_PATTERN = re.compile(r"```(?:json)?\s*\{.*?\}\s*```", re.DOTALL)
+CODE_FENCE_PATTERN = re.compile(r"```.*?```", re.DOTALL)
+META_PATTERN = re.compile(r"(?i)\n*(O JSON .*|Segue o JSON .*|Status atualizado.*|JSON de inventário.*|Atualização de estado:.*):?.*")
+META_KEYWORDS = ["o json ", "segue o json ", "status atualizado", "json de inventário", "atualização de estado:"]
+
+class KeywordScanner:
+    """
+    Multi-keyword literal scanner: every (position, keyword) occurrence in one
+    call. Each keyword is located with str.find, which runs in C and beats a
+    pure-Python Aho-Corasick automaton by an order of magnitude at this
+    keyword count.
+    """
+
+    def __init__(self, keywords: list):
+        self.keywords = list(dict.fromkeys(keywords))
+
+    def scan(self, text: str) -> list:
+        hits = []
+        for keyword in self.keywords:
+            pos = text.find(keyword)
+            while pos != -1:
+                hits.append((pos, keyword))
+                pos = text.find(keyword, pos + 1)
+        hits.sort()
+        return hits
+
+LOWER_SCANNER = KeywordScanner(["gasta", "levo", "vida"] + REST_KEYWORDS)
+CASED_SCANNER = KeywordScanner(["recebe", "adquire", "ganha", "pega", "encontra", "aprende", "descobre"])
+META_SCANNER = KeywordScanner(META_KEYWORDS)
+
+def normalize_name(name: str) -> str:
+    """Case, accent and whitespace insensitive form of an item/spell name"""
+    name = unicodedata.normalize("NFD", name)
+    name = "".join(c for c in name if unicodedata.category(c) != "Mn")
+    return " ".join(name.lower().split())
+
+class NameIndex:
+    """Normalized names for dedupe: exact hits by set, partial ones with one substring search"""
+
+    def __init__(self, names=()):
+        self.names = set()
+        self._haystack = ""
+        for name in names:
+            self.add(name)
+
+    def add(self, name: str):
+        normalized = normalize_name(name)
+        if normalized and normalized not in self.names:
+            self.names.add(normalized)
+            self._haystack += normalized + "\n"
+
+    def __contains__(self, name: str) -> bool:
+        return normalize_name(name) in self.names
+
+    def overlaps(self, name: str) -> bool:
+        """True if `name` is one of the names or part of one ("Espada" vs "Espada Longa")"""
+        normalized = normalize_name(name)
+        return normalized in self.names or normalized in self._haystack
+
+def _anchored_matches(pattern, text: str, positions: list) -> list:
+    """Non-overlapping matches of `pattern` starting at `positions`, like findall over the whole text"""
+    matches = []
+    last_end = 0
+    for pos in positions:
+        if pos < last_end:
+            continue
+        match = pattern.match(text, pos)
+        if match:
+            matches.append(match)
+            last_end = match.end()
+    return matches
+
+def extract_events(assistant_message: str, user_message: str = "") -> list:
+    """
+    Typed events found in the reply, in application order:
+      {"type": REST}
+      {"type": SLOT_USED, "level": "1", "amount": 1}
+      {"type": DAMAGE, "amount": 4} or {"type": HP_SET, "value": 20}
+      {"type": ITEM_GAINED, "name": "Espada Curta"}
+      {"type": SPELL_LEARNED, "name": "Bola de Fogo"}
+    """
+    lowered = assistant_message.lower()
+    by_keyword = {}
+    for pos, keyword in LOWER_SCANNER.scan(lowered):
+        by_keyword.setdefault(keyword, []).append(pos)
+    events = []
+
+    user_lowered = user_message.lower()
+    if any(k in by_keyword for k in REST_KEYWORDS) or any(k in user_lowered for k in REST_KEYWORDS):
+        events.append({"type": REST})
+
+    slot = _first_match(SLOT_PATTERN, lowered, by_keyword.get("gasta", []))
+    if slot:
+        events.append({"type": SLOT_USED, "amount": int(slot.group(1)), "level": slot.group(2)})
+
+    damage = _first_match(DAMAGE_PATTERN, lowered, by_keyword.get("levo", []))
+    if damage:
+        events.append({"type": DAMAGE, "amount": int(damage.group(1))})
+    elif "agora" in lowered:
+        hp = _first_match(HP_PATTERN, lowered, by_keyword.get("vida", []))
+        if hp:
+            events.append({"type": HP_SET, "value": int(hp.group(1))})
+
+    cased = CASED_SCANNER.scan(assistant_message)
+    item_positions = [pos for pos, k in cased if k not in ("aprende", "descobre")]
+    spell_positions = [pos for pos, k in cased if k in ("aprende", "recebe", "descobre")]
+    for match in _anchored_matches(ITEM_PATTERN, assistant_message, item_positions):
+        events.append({"type": ITEM_GAINED, "name": match.group(1).strip()})
+    for match in _anchored_matches(SPELL_PATTERN, assistant_message, spell_positions):
+        events.append({"type": SPELL_LEARNED, "name": match.group(1).strip()})
+
+    return events
+
+def _first_match(pattern, text: str, positions: list):
+    for pos in positions:
+        match = pattern.match(text, pos)
+        if match:
+            return match
+    return None
+
+def clean_reply(assistant_message: str) -> str:
+    """Reply without JSON/code blocks and meta-commentary lines about them"""
+    text = JSON_FENCE_PATTERN.sub("", assistant_message)
+    text = CODE_FENCE_PATTERN.sub("", text) # Fallback for other code blocks if any
+
+    lowered = text.lower()
+    if len(lowered) != len(text):
+        return META_PATTERN.sub("", text) # Rare case mapping: positions would not line up
+
+    # Drop from the phrase (plus the blank lines before it) to the end of its line
+    parts = []
+    cursor = 0
+    for pos, _ in META_SCANNER.scan(lowered):
+        if pos < cursor:
+            continue
+        start = pos
+        while start > cursor and text[start - 1] == "\n":
+            start -= 1
+        end = text.find("\n", pos)
+        end = len(text) if end == -1 else end
+        parts.append(text[cursor:start])
+        cursor = end
+    parts.append(text[cursor:])
+    return "".join(parts)
+
+def reported_event_types(updates: list) -> set:
+    """
+    Event types the model's own state updates already cover (full fields or
+    patch deltas): applying the narrative backup for them too would count the
+    same damage, slot or item twice.
+    """
+    covered = set()
+    for update in updates:
+        inventory = update.get("inventario", update)
+        patch = update.get("patch") if isinstance(update.get("patch"), dict) else {}
+        combat = patch.get("combate") if isinstance(patch.get("combate"), dict) else {}
+        if "vida_atual" in inventory or "vida" in inventory or "vida" in patch or combat.get("dano") or combat.get("cura"):
+            covered.update((DAMAGE, HP_SET))
+        if "spell_slots" in update or "spell_slots" in inventory or "slots" in patch:
+            covered.add(SLOT_USED)
+        if "itens" in inventory or "add" in patch:
+            covered.add(ITEM_GAINED)
+        if update.get("magias"):
+            covered.add(SPELL_LEARNED)
+    return covered
+
+def apply_events(events: list, user_id: int, campaign_id: str, player: dict) -> list:
+    """Apply extracted events to the turn's player state. Returns messages for the player"""
+    messages = []
+    if not player:
+        return messages
+
+    inventory = player.setdefault("inventario", {})
+    item_index = None
+    spell_index = None
+
+    for event in events:
+        kind = event["type"]
+        if kind == REST:
+            messages.append(perform_long_rest(user_id, campaign_id, player=player))
+
+        elif kind == SLOT_USED:
+            slots = player.get("spell_slots", {})
+            if event["level"] in slots:
+                slots[event["level"]]["usado"] = slots[event["level"]].get("usado", 0) + event["amount"]
+                print(f"BACKUP: Detected spell cast - updated level {event['level']} slots")
+
+        elif kind == DAMAGE:
+            new_hp = max(0, inventory.get("vida_atual", 0) - event["amount"])
+            inventory["vida_atual"] = new_hp
+            print(f"BACKUP: Detected {event['amount']} damage - HP updated to {new_hp}")
+
+        elif kind == HP_SET:
+            inventory["vida_atual"] = event["value"]
+            print(f"BACKUP: Detected HP statement - updated to {event['value']}")
+
+        elif kind == ITEM_GAINED:
+            name = event["name"]
+            # Simple heuristic: Item names usually aren't super long sentences.
+            if len(name) > 30 or len(name) < 3:
+                continue
+            items = inventory.setdefault("itens", [])
+            if item_index is None:
+                item_index = NameIndex((i.get("nome") or i.get("item") or "") if isinstance(i, dict) else i for i in items)
+            if item_index.overlaps(name):
+                continue
+            new_item = {"nome": name, "quantidade": 1, "descricao": "Item detectado via narrativa."}
+            items.append(inject_implicit_buffs([new_item], player.get("classe", ""))[0])
+            item_index.add(name)
+            print(f"BACKUP: Detected new item via narrative: {name}")
+
+        elif kind == SPELL_LEARNED:
+            name = event["name"]
+            if len(name) > 30 or len(name) < 3:
+                continue
+            magias = player.setdefault("magias", [])
+            if spell_index is None:
+                spell_index = NameIndex(m.get("nome", "") for m in magias)
+            if name in spell_index:
+                continue
+            magias.append({"nome": name, "nivel": 1, "custo_mana": 10, "descricao": "Magia aprendida na aventura."})
+            spell_index.add(name)
+            print(f"BACKUP: Detected new spell via narrative: {name}")
+
+    return messages
@@ -0,0 +1,132 @@
+from .events import clean_reply
+from .storage import load_json, delete_file, append_records, read_records, tail_records, count_records, has_records, clear_records, fork_records
+
+# Chat history is an append-only JSONL log: one message per line.
+HISTORY_FILE = "history.jsonl"
+LEGACY_HISTORY_FILE = "history.json"
+# What the player sees: only user/assistant turns, assistant replies without
+# their JSON blocks. Kept next to the log and appended with it, so the chat
+# view never ships system instructions or raw state blocks to the browser.
+DISPLAY_FILE = "display.jsonl"
+DISPLAY_ROLES = ("user", "assistant")
+
+_migrated = set()  # (user_id, campaign_id) pairs already checked for a legacy history.json
+_projected = set()  # (user_id, campaign_id) pairs whose display log is known to be built
+
+def _ensure_migrated(user_id: int, campaign_id: str = None):
+    """Convert a legacy history.json (single JSON array) into the JSONL log, once per process"""
+    key = (str(user_id), campaign_id)
+    if key in _migrated:
+        return
+
+    legacy = load_json(user_id, LEGACY_HISTORY_FILE, default=None, campaign_id=campaign_id)
+    if legacy is not None:
+        if isinstance(legacy, list) and not has_records(user_id, HISTORY_FILE, campaign_id):
+            append_records(user_id, HISTORY_FILE, legacy, campaign_id)
+            print(f"INFO: Migrated {len(legacy)} messages from {LEGACY_HISTORY_FILE} to {HISTORY_FILE}")
+        delete_file(user_id, LEGACY_HISTORY_FILE, campaign_id=campaign_id)
+
+    _migrated.add(key)
+
+def project_messages(messages: list) -> list:
+    """Display entries for `messages`: user/assistant only, replies cleaned like the turn's response"""
+    entries = []
+    for message in messages:
+        if message.get("role") not in DISPLAY_ROLES:
+            continue
+        content = message.get("content") or ""
+        if message["role"] == "assistant":
+            content = clean_reply(content).strip()
+        if content:
+            entries.append({"role": message["role"], "content": content})
+    return entries
+
+def _ensure_projected(user_id: int, campaign_id: str = None):
+    """Build the display log of a campaign that predates it, once per process"""
+    key = (str(user_id), campaign_id)
+    if key in _projected:
+        return
+    _ensure_migrated(user_id, campaign_id)
+    if not has_records(user_id, DISPLAY_FILE, campaign_id) and has_records(user_id, HISTORY_FILE, campaign_id):
+        entries = project_messages(read_records(user_id, HISTORY_FILE, campaign_id))
+        append_records(user_id, DISPLAY_FILE, entries, campaign_id)
+        print(f"INFO: Built display history for campaign {campaign_id} ({len(entries)} messages)")
+    _projected.add(key)
+
+def append_messages(user_id: int, campaign_id: str, messages: list):
+    """Append messages to the end of the campaign history (and their display entries)"""
+    _ensure_projected(user_id, campaign_id)
+    append_records(user_id, HISTORY_FILE, messages, campaign_id)
+    append_records(user_id, DISPLAY_FILE, project_messages(messages), campaign_id)
+
+def load_history(user_id: int, campaign_id: str) -> list:
+    """Full history, oldest first"""
+    _ensure_migrated(user_id, campaign_id)
+    return read_records(user_id, HISTORY_FILE, campaign_id)
+
+def tail_history(user_id: int, campaign_id: str, limit: int) -> list:
+    """Last `limit` messages, oldest first, without reading the whole log"""
+    _ensure_migrated(user_id, campaign_id)
+    return tail_records(user_id, HISTORY_FILE, limit, campaign_id)
+
+def _page(user_id: int, campaign_id: str, filename: str, limit: int, before: int = None, after: int = None) -> dict:
+    if limit < 1 or (before is not None and before < 0) or (after is not None and after < 0):
+        raise ValueError("limit deve ser positivo e before/after não negativos")
+    if before is not None and after is not None:
+        raise ValueError("use before ou after, não os dois")
+    total = count_records(user_id, filename, campaign_id)
+    if after is not None:
+        start = min(after, total)
+        end = min(start + limit, total)
+    else:
+        end = total if before is None else min(before, total)
+        start = max(end - limit, 0)
+    messages = tail_records(user_id, filename, end - start, campaign_id, skip=total - end) if end > start else []
+    return {"messages": messages, "start": start, "end": end, "total": total}
+
+def page_history(user_id: int, campaign_id: str, limit: int, before: int = None, after: int = None) -> dict:
+    """
+    A window of the log addressed by message position (0 = oldest):
+    the `limit` messages before `before`, the ones from `after` on, or the
+    newest ones. Returns {"messages", "start", "end", "total"}; `start` is
+    the next `before` cursor and `end` the next `after` cursor. Only the
+    returned messages are parsed. Raises ValueError.
+    """
+    _ensure_migrated(user_id, campaign_id)
+    return _page(user_id, campaign_id, HISTORY_FILE, limit, before, after)
+
+def load_display_history(user_id: int, campaign_id: str) -> list:
+    """The whole display projection, oldest first"""
+    _ensure_projected(user_id, campaign_id)
+    return read_records(user_id, DISPLAY_FILE, campaign_id)
+
+def page_display_history(user_id: int, campaign_id: str, limit: int, before: int = None, after: int = None) -> dict:
+    """Like page_history, over the display projection (positions count display entries)"""
+    _ensure_projected(user_id, campaign_id)
+    return _page(user_id, campaign_id, DISPLAY_FILE, limit, before, after)
+
+def count_history(user_id: int, campaign_id: str) -> int:
+    """Number of messages in the log"""
+    _ensure_migrated(user_id, campaign_id)
+    return count_records(user_id, HISTORY_FILE, campaign_id)
+
+def has_history(user_id: int, campaign_id: str) -> bool:
+    _ensure_migrated(user_id, campaign_id)
+    return has_records(user_id, HISTORY_FILE, campaign_id)
+
+def clear_history(user_id: int, campaign_id: str = None):
+    delete_file(user_id, LEGACY_HISTORY_FILE, campaign_id=campaign_id)
+    clear_records(user_id, HISTORY_FILE, campaign_id)
+    clear_records(user_id, DISPLAY_FILE, campaign_id)
+
+def fork_history(user_id: int, campaign_id: str, target_campaign_id: str):
+    """
+    Give `target_campaign_id` the history of `campaign_id`, replacing its own.
+    The log is sealed and its segments hardlinked, so the cost does not
+    grow with the number of messages; later appends stay in each campaign.
+    """
+    _ensure_projected(user_id, campaign_id)
+    _ensure_migrated(user_id, target_campaign_id)
+    fork_records(user_id, HISTORY_FILE, campaign_id, target_campaign_id)
+    fork_records(user_id, DISPLAY_FILE, campaign_id, target_campaign_id)
+    _projected.add((str(user_id), target_campaign_id))
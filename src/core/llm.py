@@ -0,0 +1,134 @@
+import os
+import asyncio
+import random
+import httpx
+from openai import AsyncOpenAI, APIStatusError, APIConnectionError, APITimeoutError, RateLimitError
+from dotenv import load_dotenv
+
+# Async LLM gateway: one shared AsyncOpenAI client over a pooled httpx
+# connection, per-call timeouts and jittered retries on 429/5xx/network errors.
+# Every model call in the app goes through chat_completion().
+
+load_dotenv()
+
+DEFAULT_MODEL = "gpt-4o-mini"
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "8"))
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "50"))
+
+_client = None
+
+def get_client() -> AsyncOpenAI:
+    global _client
+    if _client is None:
+        http_client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=LLM_MAX_CONNECTIONS, max_keepalive_connections=LLM_MAX_CONNECTIONS),
+            timeout=httpx.Timeout(LLM_TIMEOUT, connect=10.0)
+        )
+        # Retries are handled here (see chat_completion), not by the SDK
+        _client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=0, http_client=http_client)
+    return _client
+
+async def warm_up():
+    """Open a pooled connection (DNS + TLS) at startup so the first player doesn't pay for it"""
+    if not os.getenv("OPENAI_API_KEY"):
+        return
+    try:
+        await get_client().models.list()
+        print("INFO: LLM connection pool warmed up")
+    except Exception as e:
+        print(f"WARN: LLM warm-up failed: {e}")
+
+async def close():
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
+
+def _is_retryable(error: Exception) -> bool:
+    if isinstance(error, (RateLimitError, APIConnectionError, APITimeoutError)):
+        return True
+    return isinstance(error, APIStatusError) and error.status_code >= 500
+
+def _retry_delay(error: Exception, attempt: int) -> float:
+    # Honour Retry-After on 429 when the provider sends it
+    if isinstance(error, APIStatusError):
+        retry_after = error.response.headers.get("retry-after")
+        if retry_after:
+            try:
+                return min(float(retry_after), LLM_BACKOFF_MAX)
+            except ValueError:
+                pass
+    # Full jitter: spreads retries from concurrent turns instead of synchronizing them
+    return random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * (2 ** attempt)))
+
+async def chat_completion(messages: list, model: str = DEFAULT_MODEL, timeout: float = None, tool_calls: list = None, **kwargs) -> str:
+    """
+    Run a chat completion and return the assistant text. When `tool_calls` is
+    given, the function calls of the reply are appended to it as
+    {"id", "name", "arguments"} dicts.
+    """
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        try:
+            response = await get_client().chat.completions.create(
+                model=model,
+                messages=messages,
+                timeout=timeout or LLM_TIMEOUT,
+                **kwargs
+            )
+            message = response.choices[0].message
+            if tool_calls is not None:
+                for call in getattr(message, "tool_calls", None) or []:
+                    tool_calls.append({"id": call.id, "name": call.function.name, "arguments": call.function.arguments})
+            return message.content or ""
+        except Exception as e:
+            if attempt >= LLM_MAX_RETRIES or not _is_retryable(e):
+                raise
+            delay = _retry_delay(e, attempt)
+            print(f"WARN: LLM call failed ({type(e).__name__}), retry {attempt + 1}/{LLM_MAX_RETRIES} in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+async def stream_chat_completion(messages: list, model: str = DEFAULT_MODEL, timeout: float = None, tool_calls: list = None, **kwargs):
+    """
+    Yield the assistant text as it is generated. Failures are retried like
+    chat_completion, but only until the first delta has been yielded. Function
+    calls arrive in fragments; they are assembled and appended to `tool_calls`
+    once the stream ends.
+    """
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        started = False
+        partial_calls = {}
+        try:
+            stream = await get_client().chat.completions.create(
+                model=model,
+                messages=messages,
+                timeout=timeout or LLM_TIMEOUT,
+                stream=True,
+                **kwargs
+            )
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                choice_delta = chunk.choices[0].delta
+                for fragment in getattr(choice_delta, "tool_calls", None) or []:
+                    call = partial_calls.setdefault(fragment.index, {"id": None, "name": "", "arguments": ""})
+                    # The id comes with the first fragment of each call
+                    call["id"] = call["id"] or getattr(fragment, "id", None)
+                    if fragment.function:
+                        call["name"] += fragment.function.name or ""
+                        call["arguments"] += fragment.function.arguments or ""
+                delta = choice_delta.content
+                if delta:
+                    started = True
+                    yield delta
+            if tool_calls is not None:
+                tool_calls.extend(partial_calls[index] for index in sorted(partial_calls))
+            return
+        except Exception as e:
+            if started or attempt >= LLM_MAX_RETRIES or not _is_retryable(e):
+                raise
+            delay = _retry_delay(e, attempt)
+            print(f"WARN: LLM stream failed ({type(e).__name__}), retry {attempt + 1}/{LLM_MAX_RETRIES} in {delay:.2f}s")
+            await asyncio.sleep(delay)
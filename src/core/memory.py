@@ -0,0 +1,163 @@
+import os
+import re
+import asyncio
+from .storage import load_json, save_json
+from .history import tail_history, count_history
+from .llm import chat_completion
+
+# Rolling campaign memory (memory.json), built off the request path:
+#   every MEMORY_POINT_EVERY player interactions -> one key-point paragraph
+#   every MEMORY_SUMMARY_EVERY key points       -> one summary of up to 5 paragraphs
+# "covered" is how many history messages are already folded into points/summaries;
+# the context builder sends the memory instead of those raw messages.
+
+MEMORY_FILE = "memory.json"
+MEMORY_MODEL = os.getenv("MEMORY_MODEL", "gpt-4o-mini")
+MEMORY_POINT_EVERY = int(os.getenv("MEMORY_POINT_EVERY", "10"))
+MEMORY_SUMMARY_EVERY = int(os.getenv("MEMORY_SUMMARY_EVERY", "20"))
+# Latest interactions that always stay raw in the context window
+MEMORY_KEEP_RECENT = int(os.getenv("MEMORY_KEEP_RECENT", "10"))
+
+_running = set()  # (user_id, campaign_id) with an update in flight
+_tasks = set()
+
+POINT_PROMPT = (
+    "Você registra a memória de uma campanha de RPG. Escreva UM parágrafo curto (até 80 palavras) "
+    "com os pontos importantes do trecho abaixo: eventos, decisões do jogador, NPCs, locais, itens "
+    "obtidos ou perdidos e ganchos em aberto. Não invente nada. Responda apenas com o parágrafo."
+)
+SUMMARY_PROMPT = (
+    "Você registra a memória de uma campanha de RPG. Condense os pontos importantes abaixo em um "
+    "resumo da história de no máximo 5 parágrafos, em ordem cronológica, preservando nomes, "
+    "objetivos e pendências. Responda apenas com o resumo."
+)
+
+def load_memory(user_id: int, campaign_id: str) -> dict:
+    data = load_json(user_id, MEMORY_FILE, default=None, campaign_id=campaign_id)
+    if isinstance(data, dict) and "covered" in data:
+        return data
+    memory = {"covered": 0, "points": [], "summaries": []}
+    if isinstance(data, str) and data.strip():
+        memory["summaries"].append(data.strip()) # Legacy free-text memory
+    return memory
+
+def render_memory(memory: dict) -> str:
+    """Memory as a system message body, or None while it is still empty"""
+    if not memory["summaries"] and not memory["points"]:
+        return None
+    parts = ["MEMÓRIA DA CAMPANHA (eventos anteriores às mensagens abaixo):"]
+    for i, summary in enumerate(memory["summaries"], 1):
+        parts.append(f"Resumo {i}:\n{summary}")
+    if memory["points"]:
+        parts.append("Pontos importantes recentes:\n" + "\n".join(f"- {p}" for p in memory["points"]))
+    return "\n\n".join(parts)
+
+def _next_chunk_end(history: list, covered: int):
+    """
+    End index of the next MEMORY_POINT_EVERY interactions after `covered`, or
+    None if that would eat into the MEMORY_KEEP_RECENT newest ones. A chunk
+    stops right before a player message so replies stay with their action.
+    """
+    user_indexes = [i for i in range(covered, len(history)) if history[i].get("role") == "user"]
+    if len(user_indexes) < MEMORY_POINT_EVERY + MEMORY_KEEP_RECENT:
+        return None
+    return user_indexes[MEMORY_POINT_EVERY]
+
+def _transcript(messages: list, pinned: str) -> str:
+    lines = []
+    for message in messages:
+        content = re.sub(r"```.*?```", "", message.get("content") or "", flags=re.DOTALL).strip()
+        if not content or content == pinned:
+            continue
+        if message.get("role") == "user":
+            lines.append(f"Jogador: {content}")
+        elif message.get("role") == "assistant":
+            lines.append(f"Narrador: {content}")
+        else:
+            lines.append(f"Sistema: {content[:500]}")
+    return "\n".join(lines)
+
+async def update_memory(user_id: int, campaign_id: str):
+    """Fold every complete chunk of old interactions into key points, and points into summaries"""
+    from .context import get_system_prompt
+    while True:
+        memory = load_memory(user_id, campaign_id)
+        start = memory["covered"]
+        total = count_history(user_id, campaign_id)
+        if total <= start:
+            return
+        # Only the messages not folded into the memory yet are read
+        uncovered = tail_history(user_id, campaign_id, total - start)
+        end = _next_chunk_end(uncovered, 0)
+        if end is None:
+            return
+
+        transcript = _transcript(uncovered[:end], get_system_prompt(user_id, campaign_id))
+        end += start
+        point = await chat_completion([
+            {"role": "system", "content": POINT_PROMPT},
+            {"role": "user", "content": transcript}
+        ], model=MEMORY_MODEL)
+
+        # The campaign may have been reset while the model was running
+        memory = load_memory(user_id, campaign_id)
+        if memory["covered"] != start or count_history(user_id, campaign_id) < end:
+            return
+        memory["points"].append(point.strip())
+        memory["covered"] = end
+        save_json(user_id, MEMORY_FILE, memory, campaign_id=campaign_id)
+        print(f"INFO: Memory of campaign {campaign_id}: key point {len(memory['points'])} covers messages {start}-{end}")
+
+        if len(memory["points"]) >= MEMORY_SUMMARY_EVERY:
+            folded = memory["points"][:MEMORY_SUMMARY_EVERY]
+            summary = await chat_completion([
+                {"role": "system", "content": SUMMARY_PROMPT},
+                {"role": "user", "content": "\n".join(f"- {p}" for p in folded)}
+            ], model=MEMORY_MODEL)
+
+            memory = load_memory(user_id, campaign_id)
+            if memory["points"][:MEMORY_SUMMARY_EVERY] != folded:
+                return
+            memory["summaries"].append(summary.strip())
+            memory["points"] = memory["points"][MEMORY_SUMMARY_EVERY:]
+            save_json(user_id, MEMORY_FILE, memory, campaign_id=campaign_id)
+            print(f"INFO: Memory of campaign {campaign_id}: {len(folded)} key points folded into summary {len(memory['summaries'])}")
+
+async def _run_update(key: tuple, user_id: int, campaign_id: str):
+    try:
+        await update_memory(user_id, campaign_id)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        print(f"ERROR: Memory update failed for campaign {campaign_id}: {e}")
+    finally:
+        _running.discard(key)
+
+def schedule_memory_update(user_id: int, campaign_id: str):
+    """
+    Start a background memory update when enough new interactions piled up.
+    Never waits on the model: the player's turn returns immediately.
+    """
+    key = (str(user_id), campaign_id)
+    if key in _running:
+        return
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return # Not called from the app's event loop (scripts, sync tests)
+
+    # Cheap pre-check on the message count; each interaction is at least a player message and a reply
+    uncovered = count_history(user_id, campaign_id) - load_memory(user_id, campaign_id)["covered"]
+    if uncovered < 2 * (MEMORY_POINT_EVERY + MEMORY_KEEP_RECENT):
+        return
+
+    _running.add(key)
+    task = loop.create_task(_run_update(key, user_id, campaign_id))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+
+async def stop_memory_worker():
+    """Cancel in-flight updates (shutdown); they resume from memory.json on the next turn"""
+    for task in list(_tasks):
+        task.cancel()
+    await asyncio.gather(*_tasks, return_exceptions=True)
@@ -1,5 +1,80 @@
-from pydantic import BaseModel
+from typing import Dict, List, Optional, Union
+from pydantic import BaseModel, Field
 
 class ChatRequest(BaseModel):
     message: str
     user_id: int
+
+# --- State updates sent by the narrator (atualizar_estado tool call) ---
+# Every field is optional: the model only sends what changed this turn.
+
+class ItemState(BaseModel):
+    nome: str
+    descricao: Optional[str] = None
+    quantidade: Optional[int] = None
+    buffs: Optional[Dict[str, Union[int, str]]] = Field(None, description="Bônus do item por atributo, ex.: {\"forca\": 1}")
+
+class InventoryUpdate(BaseModel):
+    vida_atual: Optional[int] = None
+    vida_maxima: Optional[int] = None
+    mana_atual: Optional[int] = None
+    mana_maxima: Optional[int] = None
+    ouro: Optional[int] = None
+    itens: Optional[List[ItemState]] = Field(None, description="Lista COMPLETA de itens (só no inventário inicial; depois use patch)")
+
+class SpellSlotState(BaseModel):
+    total: int
+    usado: int
+
+class SpellState(BaseModel):
+    nome: str
+    descricao: Optional[str] = None
+    custo_mana: Optional[Union[int, str]] = None
+    nivel: Optional[int] = None
+
+class ItemRef(BaseModel):
+    nome: str
+    quantidade: Optional[int] = Field(None, description="Omitido: remove todas as unidades")
+
+class EffectState(BaseModel):
+    nome: str
+    tipo: str = Field("status", description="vida, mana ou status")
+    valor: Optional[int] = Field(None, description="Por turno, com sinal: 10 cura, -4 veneno")
+    duracao: int = Field(1, description="Turnos (vida/mana: número de aplicações)")
+    intervalo: Optional[int] = Field(None, description="A cada quantos turnos aplica (padrão 1)")
+
+class EnemyState(BaseModel):
+    nome: str
+    vida: int
+    ca: Optional[int] = Field(None, description="Classe de armadura (padrão 10)")
+    quantidade: Optional[int] = None
+    iniciativa: Optional[int] = Field(None, description="Bônus de iniciativa")
+
+class CombatPatch(BaseModel):
+    iniciar: Optional[List[EnemyState]] = Field(None, description="Inimigos que entram no combate")
+    dano: Optional[Dict[str, int]] = Field(None, description="Dano por combatente, ex.: {\"Goblin 1\": 5, \"jogador\": 4}")
+    cura: Optional[Dict[str, int]] = None
+    condicoes: Optional[Dict[str, List[str]]] = Field(None, description="Condições atuais por combatente")
+    remover: Optional[List[str]] = Field(None, description="Combatentes que fugiram")
+    encerrar: Optional[bool] = None
+
+class StatePatch(BaseModel):
+    vida: Optional[int] = Field(None, description="Variação de vida, ex.: -6")
+    mana: Optional[int] = Field(None, description="Variação de mana")
+    ouro: Optional[int] = Field(None, description="Variação de ouro")
+    xp: Optional[int] = Field(None, description="XP ganho nesta ação")
+    add: Optional[List[ItemState]] = Field(None, description="Itens novos")
+    remove: Optional[List[ItemRef]] = Field(None, description="Itens usados, perdidos ou vendidos")
+    update: Optional[List[ItemState]] = Field(None, description="Campos alterados de itens existentes")
+    slots: Optional[Dict[str, int]] = Field(None, description="Slots gastos por círculo, ex.: {\"1\": 1}")
+    efeitos: Optional[List[EffectState]] = Field(None, description="Efeitos temporários iniciados agora")
+    fim_efeitos: Optional[List[str]] = Field(None, description="Nomes de efeitos encerrados antes do fim")
+    combate: Optional[CombatPatch] = None
+
+class StateUpdate(BaseModel):
+    patch: Optional[StatePatch] = Field(None, description="Mudanças compactas (preferido)")
+    inventario: Optional[InventoryUpdate] = None
+    spell_slots: Optional[Dict[str, SpellSlotState]] = Field(None, description="Círculos alterados, ex.: {\"1\": {\"total\": 4, \"usado\": 1}}")
+    experiencia: Optional[int] = Field(None, description="XP TOTAL do personagem após a ação")
+    magias: Optional[List[SpellState]] = Field(None, description="Magias novas ou alteradas")
+    status: Optional[List[str]] = Field(None, description="Lista completa de status ativos")
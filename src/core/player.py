@@ -1,62 +1,14 @@
 from .storage import load_json, save_json
+from .effects import tick_effects, add_effect, end_effect, effect_labels
+from .progression import xp_necessario_para_nivel, total_xp, level_for_xp, grow_stat, default_slots
 import re
 import json
-import math
+import copy
 
 def calculate_default_slots(classe: str, nivel: int) -> dict:
     """Calcula slots de magia padrão do D&D 5E para classes conjuradoras (Níveis 1-20)"""
-    classe = classe.lower()
-    slots = {}
-    
-    # Full spell slot table for full casters (Wizard, Sorcerer, Cleric, Druid, Bard)
-    # Format: level -> {circle: total_slots}
-    full_caster_table = {
-        1: {"1": 2},
-        2: {"1": 3},
-        3: {"1": 4, "2": 2},
-        4: {"1": 4, "2": 3},
-        5: {"1": 4, "2": 3, "3": 2},
-        6: {"1": 4, "2": 3, "3": 3},
-        7: {"1": 4, "2": 3, "3": 3, "4": 1},
-        8: {"1": 4, "2": 3, "3": 3, "4": 2},
-        9: {"1": 4, "2": 3, "3": 3, "4": 3, "5": 1},
-        10: {"1": 4, "2": 3, "3": 3, "4": 3, "5": 2},
-        11: {"1": 4, "2": 3, "3": 3, "4": 3, "5": 2, "6": 1},
-        12: {"1": 4, "2": 3, "3": 3, "4": 3, "5": 2, "6": 1},
-        13: {"1": 4, "2": 3, "3": 3, "4": 3, "5": 2, "6": 1, "7": 1},
-        14: {"1": 4, "2": 3, "3": 3, "4": 3, "5": 2, "6": 1, "7": 1},
-        15: {"1": 4, "2": 3, "3": 3, "4": 3, "5": 2, "6": 1, "7": 1, "8": 1},
-        16: {"1": 4, "2": 3, "3": 3, "4": 3, "5": 2, "6": 1, "7": 1, "8": 1},
-        17: {"1": 4, "2": 3, "3": 3, "4": 3, "5": 2, "6": 1, "7": 1, "8": 1, "9": 1},
-        18: {"1": 4, "2": 3, "3": 3, "4": 3, "5": 3, "6": 1, "7": 1, "8": 1, "9": 1},
-        19: {"1": 4, "2": 3, "3": 3, "4": 3, "5": 3, "6": 2, "7": 1, "8": 1, "9": 1},
-        20: {"1": 4, "2": 3, "3": 3, "4": 3, "5": 3, "6": 2, "7": 2, "8": 1, "9": 1},
-    }
-    
-    # Check if class is a full caster
-    if any(c in classe for c in ["mago", "feiticeiro", "clerigo", "clérigo", "druida", "bardo"]):
-        if nivel in full_caster_table:
-            for circle, total in full_caster_table[nivel].items():
-                slots[circle] = {"total": total, "usado": 0}
-        else:
-            # Fallback for invalid levels
-            slots["1"] = {"total": 2, "usado": 0}
-    
-    # Warlock uses Pact Magic (different system, simplified here)
-    elif "bruxo" in classe or "warlock" in classe:
-        pact_slots = min(4, (nivel + 1) // 2)  # Max 4 slots
-        pact_level = min(5, (nivel + 1) // 2)  # Slots up to 5th level
-        slots[str(pact_level)] = {"total": pact_slots, "usado": 0}
-    
-    # Half-casters (Paladin, Ranger) - start at level 2
-    elif any(c in classe for c in ["paladino", "ranger", "guardião", "guardi"]):
-        if nivel >= 2:
-            half_caster_level = (nivel + 1) // 2
-            if half_caster_level in full_caster_table:
-                for circle, total in full_caster_table[half_caster_level].items():
-                    slots[circle] = {"total": total, "usado": 0}
-    
-    return slots
+    # Rows come from the tables in progression.py, built once at import
+    return default_slots(classe, nivel)
 
 def inject_implicit_buffs(items: list, player_class: str):
     """
@@ -66,6 +18,8 @@ def inject_implicit_buffs(items: list, player_class: str):
     if not items: return []
     
     for item in items:
+        # Itens legados em texto puro não têm onde guardar buffs
+        if not isinstance(item, dict): continue
         # Se já tiver buffs, ignora
         if "buffs" in item and item["buffs"]: continue
         
@@ -98,32 +52,46 @@ def inject_implicit_buffs(items: list, player_class: str):
             
     return items
 
+# Stored players carry "schema_version". Older documents are migrated once,
+# on their first load; from then on loads are pure reads.
+PLAYER_SCHEMA_VERSION = 1
+
+def _apply_mode_invariants(data: dict):
+    """D&D 5E invariants: no mana, spell slots present, implicit item buffs"""
+    is_dnd = "dnd" in data.get("modo", "").lower() or "5e" in data.get("modo", "").lower()
+    if not is_dnd:
+        return
+
+    # FORCE REMOVE MANA (Cleanup)
+    if "inventario" in data:
+        data["inventario"].pop("mana_atual", None)
+        data["inventario"].pop("mana_maxima", None)
+
+    # REGENERATE SLOTS (Fix for AI Hallucinations)
+    if not data.get("spell_slots"):
+        print(f"DEBUG: Regenerating missing spell slots for {data.get('classe')} Lv {data.get('nivel', 1)}")
+        data["spell_slots"] = calculate_default_slots(data.get("classe", ""), data.get("nivel", 1))
+
+    # INJECT BUFFS
+    if "inventario" in data and "itens" in data["inventario"]:
+        data["inventario"]["itens"] = inject_implicit_buffs(data["inventario"]["itens"], data.get("classe", ""))
+
+def migrate_player(data: dict) -> bool:
+    """Bring a stored player up to PLAYER_SCHEMA_VERSION. Returns True if it changed"""
+    version = data.get("schema_version", 0)
+    if version >= PLAYER_SCHEMA_VERSION:
+        return False
+    # v1: mode invariants, which used to be re-applied (and saved) on every read
+    if version < 1:
+        _apply_mode_invariants(data)
+    data["schema_version"] = PLAYER_SCHEMA_VERSION
+    return True
+
 def load_player(user_id: int, campaign_id: str = None):
     data = load_json(user_id, "player.json", default=None, campaign_id=campaign_id)
-    
-    if data:
-        # 1. Force Spell Slots logic if missing (Fix for AI Hallucinations)
-        has_slots = "spell_slots" in data and len(data["spell_slots"]) > 0
-        is_dnd = "dnd" in data.get("modo", "").lower() or "5e" in data.get("modo", "").lower()
-        
-        if is_dnd:
-            # FORCE REMOVE MANA (Cleanup)
-            if "inventario" in data:
-                if "mana_atual" in data["inventario"]: data["inventario"].pop("mana_atual")
-                if "mana_maxima" in data["inventario"]: data["inventario"].pop("mana_maxima")
-            
-            # REGENERATE SLOTS
-            if not has_slots:
-                print(f"DEBUG: Regenerating missing spell slots for {data.get('classe')} Lv {data.get('nivel', 1)}")
-                data["spell_slots"] = calculate_default_slots(data.get("classe", ""), data.get("nivel", 1))
-                
-            # INJECT BUFFS
-            if "inventario" in data and "itens" in data["inventario"]:
-                data["inventario"]["itens"] = inject_implicit_buffs(data["inventario"]["itens"], data.get("classe", ""))
-            
-            # Save correction immediately
-            save_player(user_id, data, campaign_id)
-            
+    if data and migrate_player(data):
+        print(f"INFO: Migrated player of campaign {campaign_id} to schema v{PLAYER_SCHEMA_VERSION}")
+        save_json(user_id, "player.json", data, campaign_id=campaign_id)
     return data
 
 def normalize_text(text):
@@ -132,16 +100,61 @@ def normalize_text(text):
     return "".join(c for c in unicodedata.normalize("NFD", text) if unicodedata.category(c) != "Mn").lower()
 
 def save_player(user_id: int, player_data, campaign_id: str = None):
+    # Invariants are enforced on write (AI-sent items get their buffs here), never on read
+    if player_data:
+        _apply_mode_invariants(player_data)
+        player_data["schema_version"] = PLAYER_SCHEMA_VERSION
     save_json(user_id, "player.json", player_data, campaign_id=campaign_id)
 
-def perform_long_rest(user_id: int, campaign_id: str = None) -> str:
+class PlayerTransaction:
+    """
+    Turn-scoped player state. player.json is loaded once into a private copy
+    that every step of the turn mutates (`tx.player`); leaving the block saves
+    it once if anything changed, leaving it with an exception discards it all.
+
+        with PlayerTransaction(user_id, campaign_id) as tx:
+            perform_long_rest(user_id, campaign_id, player=tx.player)
+    """
+
+    def __init__(self, user_id: int, campaign_id: str = None):
+        self.user_id = user_id
+        self.campaign_id = campaign_id
+        self._original = load_player(user_id, campaign_id)
+        self.player = copy.deepcopy(self._original)
+
+    def commit(self) -> bool:
+        if self.player is None or self.player == self._original:
+            return False
+        save_player(self.user_id, self.player, self.campaign_id)
+        # The saved dict is now the cached one; keep working on a fresh copy
+        self._original = self.player
+        self.player = copy.deepcopy(self.player)
+        return True
+
+    def rollback(self):
+        self.player = copy.deepcopy(self._original)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        else:
+            print(f"WARN: Turn failed ({exc_type.__name__}), player changes discarded")
+            self.rollback()
+        return False
+
+def perform_long_rest(user_id: int, campaign_id: str = None, player: dict = None) -> str:
     """
     Performs a Long Rest: Resets all spell slots and restores HP to max.
     Returns a message describing what was recovered.
     """
-    player = load_player(user_id, campaign_id)
-    if not player:
-        return "Erro: Personagem não encontrado."
+    if player is None:
+        with PlayerTransaction(user_id, campaign_id) as tx:
+            if not tx.player:
+                return "Erro: Personagem não encontrado."
+            return perform_long_rest(user_id, campaign_id, player=tx.player)
     
     inventario = player.get("inventario", {})
     vida_maxima = inventario.get("vida_maxima", 100)
@@ -160,61 +173,37 @@ def perform_long_rest(user_id: int, campaign_id: str = None) -> str:
         slots_message = " Todos os espaços de magia foram restaurados."
     
     player["inventario"] = inventario
-    save_player(user_id, player, campaign_id)
     
     return f"💤 **Descanso Longo Completo!**\n❤️ Recuperou {hp_recovered} HP (agora {vida_maxima}/{vida_maxima}).{slots_message}"
 
-def xp_necessario_para_nivel(nivel_atual: int) -> int:
-    # Nível 0 = 100, e cada nível seguinte +50 XP
-    return 100 + nivel_atual * 50
-
-def adicionar_experiencia(user_id: int, quantidade: int, campaign_id: str = None):
-    player = load_player(user_id, campaign_id)
-    if not player:
-        return None
+def adicionar_experiencia(user_id: int, quantidade: int, campaign_id: str = None, player: dict = None):
+    if player is None:
+        with PlayerTransaction(user_id, campaign_id) as tx:
+            if not tx.player:
+                return None
+            return adicionar_experiencia(user_id, quantidade, campaign_id, player=tx.player)
 
-    experiencia_atual = player.get("experiencia", 0)
     nivel_atual = player.get("nivel", 0)
-
-    experiencia_atual += quantidade
+    total = total_xp(nivel_atual, player.get("experiencia", 0)) + quantidade
+    # Never levels down (negative XP just lowers the progress within the level)
+    novo_nivel = max(nivel_atual, level_for_xp(total))
     mensagem_level_up = None
 
-    # Loop para subir vários níveis caso XP alta
-    while experiencia_atual >= xp_necessario_para_nivel(nivel_atual):
-        xp_necessaria = xp_necessario_para_nivel(nivel_atual)
-        experiencia_atual -= xp_necessaria
-        nivel_atual += 1
-
-        # Bonus de 10% em vida e mana máximos
+    if novo_nivel > nivel_atual:
+        # Bonus de 10% em vida e mana máximos por nível, atuais sobem proporcionalmente
         inventario = player.get("inventario", {})
-        
         vida_maxima = inventario.get("vida_maxima", 100)
         mana_maxima = inventario.get("mana_maxima", 50)
-
-        vida_maxima = math.ceil(vida_maxima * 1.10)
-        mana_maxima = math.ceil(mana_maxima * 1.10)
-
-        inventario["vida_maxima"] = vida_maxima
-        inventario["mana_maxima"] = mana_maxima
-
-        # Aumenta vida_atual e mana_atual proporcionalmente, sem ultrapassar máximos
-        vida_atual = inventario.get("vida_atual", vida_maxima)
-        mana_atual = inventario.get("mana_atual", mana_maxima)
-
-        vida_atual = min(vida_atual + math.ceil(vida_maxima * 0.10), vida_maxima)
-        mana_atual = min(mana_atual + math.ceil(mana_maxima * 0.10), mana_maxima)
-
-        inventario["vida_atual"] = vida_atual
-        inventario["mana_atual"] = mana_atual
-
+        levels = novo_nivel - nivel_atual
+        vida_maxima, vida_atual = grow_stat(vida_maxima, inventario.get("vida_atual", vida_maxima), levels)
+        mana_maxima, mana_atual = grow_stat(mana_maxima, inventario.get("mana_atual", mana_maxima), levels)
+        inventario.update({"vida_maxima": vida_maxima, "vida_atual": vida_atual, "mana_maxima": mana_maxima, "mana_atual": mana_atual})
         player["inventario"] = inventario
 
-        mensagem_level_up = f"🎉 Parabéns! Você subiu para o nível {nivel_atual} e ganhou +10% de Vida e Mana máximas! Use !status para ver seu progresso."
-
-    player["experiencia"] = experiencia_atual
-    player["nivel"] = nivel_atual
+        mensagem_level_up = f"🎉 Parabéns! Você subiu para o nível {novo_nivel} e ganhou +10% de Vida e Mana máximas! Use !status para ver seu progresso."
 
-    save_player(user_id, player, campaign_id)
+    player["experiencia"] = total - total_xp(novo_nivel, 0)
+    player["nivel"] = novo_nivel
 
     return mensagem_level_up
 
@@ -271,216 +260,426 @@ def calculate_item_buffs(items_list: list) -> tuple:
     
     return buffs, extra_hp, extra_mp
 
-def interpretar_e_atualizar_estado(resposta: str, user_id: int, campaign_id: str = None) -> str:
-    """extracts JSON from response and updates player.json"""
-    player = load_player(user_id, campaign_id)
-    if not player:
-        # Initialize a default player if none exists
-        player = {
-            "nome": "",
-            "classe": "",
-            "tema": "",
-            "modo": "",
-            "nivel": 0,
-            "experiencia": 0,
-            "inventario": {
-                "vida_atual": 100,
-                "vida_maxima": 100,
-                "mana_atual": 50,
-                "mana_maxima": 50,
-                "ouro": 0,
-                "itens": []
-            },
-            "status": [],
-            "atributos": {
-                "forca": 10,
-                "destreza": 10,
-                "constituicao": 10,
-                "inteligencia": 10,
-                "sabedoria": 10,
-                "carisma": 10
-            },
-            "magias": []
-        }
+def _default_player() -> dict:
+    # Initialize a default player if none exists
+    return {
+        "nome": "",
+        "classe": "",
+        "tema": "",
+        "modo": "",
+        "nivel": 0,
+        "experiencia": 0,
+        "inventario": {
+            "vida_atual": 100,
+            "vida_maxima": 100,
+            "mana_atual": 50,
+            "mana_maxima": 50,
+            "ouro": 0,
+            "itens": []
+        },
+        "status": [],
+        "atributos": {
+            "forca": 10,
+            "destreza": 10,
+            "constituicao": 10,
+            "inteligencia": 10,
+            "sabedoria": 10,
+            "carisma": 10
+        },
+        "magias": []
+    }
 
-    inventario = player.get("inventario", {})
+class StatePatchError(ValueError):
+    """A state patch that cannot be applied as a whole"""
+
+PATCH_KEYS = ("vida", "mana", "ouro", "xp", "add", "remove", "update", "slots", "efeitos", "fim_efeitos", "combate")
+
+def _patch_int(data: dict, key: str, default: int = 0) -> int:
+    value = data.get(key, default)
+    if isinstance(value, bool) or not isinstance(value, int):
+        raise StatePatchError(f"'{key}' deve ser um inteiro, recebido {value!r}")
+    return value
+
+def _patch_list(patch: dict, key: str) -> list:
+    value = patch.get(key) or []
+    if not isinstance(value, list):
+        raise StatePatchError(f"'{key}' deve ser uma lista")
+    return value
+
+def _item_name(item) -> str:
+    if isinstance(item, str):
+        return item
+    if isinstance(item, dict):
+        return item.get("nome") or item.get("item") or ""
+    return ""
+
+def _find_item(itens: list, name: str) -> int:
+    """Index of the item called `name` (case and accent insensitive), -1 if absent"""
+    key = normalize_text(name).strip()
+    for i, item in enumerate(itens):
+        if normalize_text(_item_name(item)).strip() == key:
+            return i
+    return -1
+
+def _item_at(itens: list, index: int) -> dict:
+    # Legacy string items become dicts when a patch touches them
+    if isinstance(itens[index], str):
+        itens[index] = {"nome": itens[index], "quantidade": 1}
+    return itens[index]
+
+def apply_state_patch(patch: dict, user_id: int, campaign_id: str, player: dict) -> list:
+    """
+    Apply a compact state patch sent by the model: only what changed, so the
+    reply does not grow with the inventory.
+      {"vida": -5, "mana": -3, "ouro": 20, "xp": 50,
+       "add": [{"nome": "Corda", "quantidade": 1}],
+       "remove": ["Tocha", {"nome": "Poção de Cura", "quantidade": 1}],
+       "update": [{"nome": "Espada Curta", "descricao": "Afiada"}],
+       "slots": {"1": 1},
+       "efeitos": [{"nome": "Regeneração", "tipo": "vida", "valor": 10, "duracao": 3}],
+       "fim_efeitos": ["Envenenado"],
+       "combate": {"iniciar": [{"nome": "Goblin", "vida": 7, "ca": 13}], "dano": {"Goblin": 5}}}
+    vida/mana/ouro/xp and slots are deltas; items are matched by name. The
+    patch applies as a whole or not at all: an invalid op raises
+    StatePatchError and leaves `player` untouched. Returns level-up messages.
+    """
+    if not isinstance(patch, dict):
+        raise StatePatchError("patch deve ser um objeto")
+
+    draft = copy.deepcopy(player)
+    inventario = draft.setdefault("inventario", {})
+    itens = inventario.setdefault("itens", [])
+    mensagens = []
+
+    for key in patch:
+        if key not in PATCH_KEYS:
+            print(f"WARN: Unknown patch key '{key}' ignored")
+
+    # Vida/mana are clamped to [0, máxima]; ouro cannot go negative
+    for key in ("vida", "mana"):
+        if key in patch:
+            atual = inventario.get(f"{key}_atual", 0) + _patch_int(patch, key)
+            if f"{key}_maxima" in inventario:
+                atual = min(atual, inventario[f"{key}_maxima"])
+            inventario[f"{key}_atual"] = max(0, atual)
+
+    if "ouro" in patch:
+        ouro = inventario.get("ouro", 0) + _patch_int(patch, "ouro")
+        if ouro < 0:
+            raise StatePatchError(f"ouro insuficiente ({inventario.get('ouro', 0)})")
+        inventario["ouro"] = ouro
+
+    for entry in _patch_list(patch, "add"):
+        new_item = {"nome": entry} if isinstance(entry, str) else dict(entry) if isinstance(entry, dict) else {}
+        name = _item_name(new_item)
+        if not name:
+            raise StatePatchError("item sem 'nome' em add")
+        quantidade = _patch_int(new_item, "quantidade", 1)
+        if quantidade < 1:
+            raise StatePatchError(f"quantidade inválida para '{name}'")
+        index = _find_item(itens, name)
+        if index >= 0:
+            item = _item_at(itens, index)
+            item["quantidade"] = item.get("quantidade", 1) + quantidade
+        else:
+            new_item["quantidade"] = quantidade
+            itens.append(inject_implicit_buffs([new_item], draft.get("classe", ""))[0])
+
+    for entry in _patch_list(patch, "remove"):
+        name = _item_name(entry)
+        index = _find_item(itens, name) if name else -1
+        if index < 0:
+            raise StatePatchError(f"item '{name}' não está no inventário")
+        item = _item_at(itens, index)
+        possui = item.get("quantidade", 1)
+        # Without a quantity the whole stack goes
+        remover = _patch_int(entry, "quantidade", possui) if isinstance(entry, dict) else possui
+        if remover < 1 or remover > possui:
+            raise StatePatchError(f"não é possível remover {remover}x '{name}' (possui {possui})")
+        if remover == possui:
+            del itens[index]
+        else:
+            item["quantidade"] = possui - remover
+
+    for entry in _patch_list(patch, "update"):
+        name = _item_name(entry)
+        index = _find_item(itens, name) if isinstance(entry, dict) and name else -1
+        if index < 0:
+            raise StatePatchError(f"item '{name}' não está no inventário")
+        if "quantidade" in entry and _patch_int(entry, "quantidade") < 1:
+            raise StatePatchError(f"quantidade inválida para '{name}'; use remove")
+        # Fields not sent (buffs included) are kept
+        _item_at(itens, index).update({k: v for k, v in entry.items() if k not in ("nome", "item")})
+
+    slots_usados = patch.get("slots") or {}
+    if not isinstance(slots_usados, dict):
+        raise StatePatchError("'slots' deve ser um objeto {círculo: usados}")
+    for circle in slots_usados:
+        slot = draft.get("spell_slots", {}).get(str(circle))
+        if slot is None:
+            raise StatePatchError(f"círculo {circle} não existe")
+        usado = max(0, slot.get("usado", 0) + _patch_int(slots_usados, circle))
+        if usado > slot.get("total", 0):
+            raise StatePatchError(f"sem slots de círculo {circle} ({slot.get('usado', 0)}/{slot.get('total', 0)} usados)")
+        slot["usado"] = usado
+
+    for nome in _patch_list(patch, "fim_efeitos"):
+        end_effect(draft, nome)
+    for entry in _patch_list(patch, "efeitos"):
+        if not isinstance(entry, dict):
+            raise StatePatchError("efeito deve ser um objeto")
+        try:
+            add_effect(draft, entry.get("nome"), entry.get("tipo", "status"), entry.get("valor", 0),
+                       entry.get("duracao", 1), entry.get("intervalo", 1))
+        except ValueError as e:
+            raise StatePatchError(str(e))
+
+    if "combate" in patch:
+        from .combat import apply_combat_patch # combat -> dice -> player
+        try:
+            mensagens.extend(apply_combat_patch(draft, patch["combate"]))
+        except ValueError as e:
+            raise StatePatchError(str(e))
+
+    if "xp" in patch:
+        xp = _patch_int(patch, "xp")
+        if xp < 0:
+            raise StatePatchError("xp não pode ser negativo")
+        if xp:
+            msg_nivel = adicionar_experiencia(user_id, xp, campaign_id, player=draft)
+            if msg_nivel:
+                mensagens.append(msg_nivel)
+
+    # Every op succeeded: swap the result in (same dict object for the caller)
+    player.clear()
+    player.update(draft)
+    return mensagens
+
+def apply_state_update(data: dict, user_id: int, campaign_id: str, player: dict) -> list:
+    """
+    Apply one state update sent by the model (the JSON block, or a validated
+    atualizar_estado tool call) to `player`. Returns level-up messages.
+    A "patch" key carries compact deltas (apply_state_patch); the other keys
+    are the full-state format, still accepted.
+    """
+    if "patch" in data:
+        rest = {k: v for k, v in data.items() if k != "patch"}
+        mensagens = apply_state_update(rest, user_id, campaign_id, player) if rest else []
+        try:
+            mensagens.extend(apply_state_patch(data["patch"], user_id, campaign_id, player))
+        except StatePatchError as e:
+            # The patch is all-or-nothing on its own; the full-state keys next to it were already applied
+            applied = f" (applied the other keys: {', '.join(rest)})" if rest else ""
+            print(f"WARN: State patch rejected, none of its deltas applied{applied}: {e}")
+        return mensagens
+
+    inventario = player.setdefault("inventario", {})
     mensagens = []
 
-    # Regex more permissive: optional "json" after backticks
-    # Also capture content
+    # Determine source of inventory data (nested or flat)
+    source_inv = data.get("inventario", data)
+
+    # 1. Calculate Old Buffs (Before Update)
+    old_items = inventario.get("itens", [])
+    old_buffs, _, _ = calculate_item_buffs(old_items)
+
+    # --- INTELLIGENT ITEM MERGE ---
+    # Problem: AI sends complete item lists, forgetting buffs of items that stay equipped.
+    # Solution: Merge by item name, preserving buffs from old items.
+
+    old_items = inventario.get("itens", [])
+    new_items_from_ai = source_inv.get("itens", None)
+
+    if new_items_from_ai is not None:
+        # Create lookup of old items by name (preserve buffs)
+        old_items_map = {}
+        for item in old_items:
+            if isinstance(item, dict):
+                item_name = item.get("nome") or item.get("item") or str(item)
+                old_items_map[item_name] = item
+
+        # Merge new items with old data
+        merged_items = []
+        for new_item in new_items_from_ai:
+            if isinstance(new_item, str):
+                merged_items.append(new_item)
+            elif isinstance(new_item, dict):
+                item_name = new_item.get("nome") or new_item.get("item")
+
+                if item_name and item_name in old_items_map:
+                    # Item existed before - preserve old buffs if new one doesn't have them
+                    old_item = old_items_map[item_name]
+
+                    # If new item has no buffs but old one did, keep old buffs
+                    if "buffs" not in new_item and "buffs" in old_item:
+                        new_item["buffs"] = old_item["buffs"]
+                        print(f"INFO: Preserved buffs for '{item_name}' during merge")
+
+                merged_items.append(new_item)
+            else:
+                merged_items.append(new_item)
+
+        final_items = merged_items
+    else:
+        # AI didn't send items at all, keep old list
+        final_items = old_items
+
+    inventario.update({
+        "vida_atual": source_inv.get("vida_atual", source_inv.get("vida", inventario.get("vida_atual", 10))),
+        "vida_maxima": source_inv.get("vida_maxima", inventario.get("vida_maxima", 10)),
+        "mana_atual": source_inv.get("mana_atual", source_inv.get("mana", inventario.get("mana_atual", 10))),
+        "mana_maxima": source_inv.get("mana_maxima", inventario.get("mana_maxima", 10)),
+        "ouro": source_inv.get("ouro", inventario.get("ouro", 0)),
+        "itens": final_items
+    })
+
+    # Spell Slots (D&D 5E mode) - INTELLIGENT MERGE
+    if "spell_slots" in data or "spell_slots" in source_inv:
+        spell_slots_data = data.get("spell_slots") or source_inv.get("spell_slots")
+        if spell_slots_data:
+            # Get existing spell_slots, initialize if doesn't exist
+            existing_slots = player.get("spell_slots", {})
+
+            # Merge: update only the circles provided by AI, keep the rest
+            for circle, slots_info in spell_slots_data.items():
+                existing_slots[circle] = slots_info
+
+            player["spell_slots"] = existing_slots
+            print(f"INFO: Spell slots mesclados. AI enviou: {spell_slots_data}, Total agora: {existing_slots}")
+
+    # Safeguard: Ensure all expected spell slots exist for the character's level
+    is_dnd = "dnd" in player.get("modo", "").lower() or "5e" in player.get("modo", "").lower()
+    if is_dnd and "spell_slots" in player:
+        expected_slots = calculate_default_slots(player.get("classe", ""), player.get("nivel", 1))
+        current_slots = player["spell_slots"]
+
+        # Add any missing circles
+        for circle, defaults in expected_slots.items():
+            if circle not in current_slots:
+                current_slots[circle] = defaults
+                print(f"SAFEGUARD: Restored missing spell circle {circle}")
+
+        player["spell_slots"] = current_slots
+
+    # Fallback: If AI forgot slots but it's D&D, recalculate
+    is_dnd = "dnd" in player.get("modo", "").lower() or "5e" in player.get("modo", "").lower()
+    if is_dnd and "spell_slots" not in player:
+         print("WARN: AI forgot spell slots. Recalculating default.")
+         player["spell_slots"] = calculate_default_slots(player.get("classe", ""), player.get("nivel", 1))
+
+    if "nivel" in data:
+        player["nivel"] = data["nivel"]
+
+    # Aqui atualiza a experiencia com o incremental e atualiza o player local!
+    if "experiencia" in data:
+        xp_recebida = data["experiencia"] - player.get("experiencia", 0)
+        if xp_recebida > 0:
+            # Same player object: level and remaining XP are updated in place
+            msg_nivel = adicionar_experiencia(user_id, xp_recebida, campaign_id, player=player)
+            if msg_nivel:
+                mensagens.append(msg_nivel)
+    elif "xp" in data:
+        xp_recebida = data["xp"] - player.get("experiencia", 0)
+        if xp_recebida > 0:
+            # Same player object: level and remaining XP are updated in place
+            msg_nivel = adicionar_experiencia(user_id, xp_recebida, campaign_id, player=player)
+            if msg_nivel:
+                mensagens.append(msg_nivel)
+
+    # CRITICAL RULE: Base attributes are SACRED.
+    # They can ONLY be modified through:
+    # 1. Initial character creation (generate_character_setup or initialization)
+    # 2. Levelup system (handled separately)
+    # 3. Manual admin intervention
+    # 
+    # The AI should NEVER send "atributos" during normal gameplay.
+    # Item buffs are TEMPORARY and calculated on-the-fly during display.
+    # This prevents ALL corruption scenarios.
+
+    if "atributos" in data:
+        # Check if this is initial character creation or a special permanent buff
+        # For now, we COMPLETELY IGNORE atributos from AI during gameplay.
+        # The system instruction already tells AI not to send this.
+        # If it does anyway, we silently skip it to protect data integrity.
+        print(f"WARNING: AI sent 'atributos' in response. Ignoring to preserve base stats integrity.")
+        print(f"DEBUG: Received atributos: {data['atributos']}")
+        # Do NOT modify player["atributos"] here
+
+    # --- INTELLIGENT SPELL MERGE ---
+    if "magias" in data:
+        new_magias = data["magias"]
+        existing_magias = player.get("magias", [])
+
+        if not new_magias:
+             pass # Empty list? Don't wipe.
+        else:
+            # Create Map of existing names
+            existing_map = {m.get("nome", "").lower(): m for m in existing_magias}
+
+            for magia in new_magias:
+                if isinstance(magia, dict):
+                    name = magia.get("nome", "").lower()
+                    if name:
+                        existing_map[name] = magia # Update or Add
+
+            # Convert back to list
+            player["magias"] = list(existing_map.values())
+            print(f"INFO: Magias mescladas. Total: {len(player['magias'])}")
+
+    if "status" in data:
+        player["status"] = data["status"]
+
+    player["inventario"] = inventario
+    return mensagens
+
+def find_state_block(resposta: str):
+    """Raw text of the state block in a reply, or None"""
     # Regex more permissive: optional "json" after backticks, or just braces if backticks missing
     # Supports ```json {...} ```, ``` {...} ```, or just {...} if it looks like a valid root object
     json_matches = re.findall(r"```(?:json)?(.*?)```", resposta, re.DOTALL)
-    
-    if not json_matches:
-        # Fallback: Try to find a JSON block without backticks (start with { "inventario": or { "magias": )
-        # This is riskier but catches "lazy" AI
-        loose_match = re.search(r'(\{[\s\n]*"(?:inventario|magias|status|atributos|spell_slots)".*?\})', resposta, re.DOTALL)
-        if loose_match:
-            json_matches = [loose_match.group(1)]
-
     if json_matches:
+        return json_matches[0]
+
+    # Fallback: Try to find a JSON block without backticks (start with { "inventario": or { "magias": )
+    # This is riskier but catches "lazy" AI
+    loose_match = re.search(r'(\{[\s\n]*"(?:patch|inventario|magias|status|atributos|spell_slots)".*?\})', resposta, re.DOTALL)
+    if loose_match:
+        # Take the whole (nested) object, not just up to the first closing brace
         try:
-            print(f"DEBUG: Encontrado bloco JSON na resposta de tamanho {len(json_matches[0])}")
-            data = json.loads(json_matches[0].strip())
+            _, end = json.JSONDecoder().raw_decode(resposta, loose_match.start())
+            return resposta[loose_match.start():end]
+        except json.JSONDecodeError:
+            return loose_match.group(1)
+    return None
 
-            # Determine source of inventory data (nested or flat)
-            source_inv = data.get("inventario", data)
-            
-            # 1. Calculate Old Buffs (Before Update)
-            old_items = inventario.get("itens", [])
-            old_buffs, _, _ = calculate_item_buffs(old_items)
+def parse_state_block(resposta: str):
+    """The reply's state block as a dict, or None if there is none or it is not valid JSON"""
+    block = find_state_block(resposta)
+    if block is None:
+        return None
+    try:
+        print(f"DEBUG: Encontrado bloco JSON na resposta de tamanho {len(block)}")
+        data = json.loads(block.strip())
+    except json.JSONDecodeError:
+        print("Erro ao decodificar JSON do assistente.")
+        return None
+    return data if isinstance(data, dict) else None
 
-            # --- INTELLIGENT ITEM MERGE ---
-            # Problem: AI sends complete item lists, forgetting buffs of items that stay equipped.
-            # Solution: Merge by item name, preserving buffs from old items.
-            
-            old_items = inventario.get("itens", [])
-            new_items_from_ai = source_inv.get("itens", None)
-            
-            if new_items_from_ai is not None:
-                # Create lookup of old items by name (preserve buffs)
-                old_items_map = {}
-                for item in old_items:
-                    if isinstance(item, dict):
-                        item_name = item.get("nome") or item.get("item") or str(item)
-                        old_items_map[item_name] = item
-                
-                # Merge new items with old data
-                merged_items = []
-                for new_item in new_items_from_ai:
-                    if isinstance(new_item, str):
-                        merged_items.append(new_item)
-                    elif isinstance(new_item, dict):
-                        item_name = new_item.get("nome") or new_item.get("item")
-                        
-                        if item_name and item_name in old_items_map:
-                            # Item existed before - preserve old buffs if new one doesn't have them
-                            old_item = old_items_map[item_name]
-                            
-                            # If new item has no buffs but old one did, keep old buffs
-                            if "buffs" not in new_item and "buffs" in old_item:
-                                new_item["buffs"] = old_item["buffs"]
-                                print(f"INFO: Preserved buffs for '{item_name}' during merge")
-                        
-                        merged_items.append(new_item)
-                    else:
-                        merged_items.append(new_item)
-                
-                final_items = merged_items
-            else:
-                # AI didn't send items at all, keep old list
-                final_items = old_items
-            
-            inventario.update({
-                "vida_atual": source_inv.get("vida_atual", source_inv.get("vida", inventario.get("vida_atual", 10))),
-                "vida_maxima": source_inv.get("vida_maxima", inventario.get("vida_maxima", 10)),
-                "mana_atual": source_inv.get("mana_atual", source_inv.get("mana", inventario.get("mana_atual", 10))),
-                "mana_maxima": source_inv.get("mana_maxima", inventario.get("mana_maxima", 10)),
-                "ouro": source_inv.get("ouro", inventario.get("ouro", 0)),
-                "itens": final_items
-            })
-
-            # Spell Slots (D&D 5E mode) - INTELLIGENT MERGE
-            if "spell_slots" in data or "spell_slots" in source_inv:
-                spell_slots_data = data.get("spell_slots") or source_inv.get("spell_slots")
-                if spell_slots_data:
-                    # Get existing spell_slots, initialize if doesn't exist
-                    existing_slots = player.get("spell_slots", {})
-                    
-                    # Merge: update only the circles provided by AI, keep the rest
-                    for circle, slots_info in spell_slots_data.items():
-                        existing_slots[circle] = slots_info
-                    
-                    player["spell_slots"] = existing_slots
-                    print(f"INFO: Spell slots mesclados. AI enviou: {spell_slots_data}, Total agora: {existing_slots}")
-            
-            # Safeguard: Ensure all expected spell slots exist for the character's level
-            is_dnd = "dnd" in player.get("modo", "").lower() or "5e" in player.get("modo", "").lower()
-            if is_dnd and "spell_slots" in player:
-                expected_slots = calculate_default_slots(player.get("classe", ""), player.get("nivel", 1))
-                current_slots = player["spell_slots"]
-                
-                # Add any missing circles
-                for circle, defaults in expected_slots.items():
-                    if circle not in current_slots:
-                        current_slots[circle] = defaults
-                        print(f"SAFEGUARD: Restored missing spell circle {circle}")
-                
-                player["spell_slots"] = current_slots
-            
-            # Fallback: If AI forgot slots but it's D&D, recalculate
-            is_dnd = "dnd" in player.get("modo", "").lower() or "5e" in player.get("modo", "").lower()
-            if is_dnd and "spell_slots" not in player:
-                 print("WARN: AI forgot spell slots. Recalculating default.")
-                 player["spell_slots"] = calculate_default_slots(player.get("classe", ""), player.get("nivel", 1))
-
-            if "nivel" in data:
-                player["nivel"] = data["nivel"]
-
-            # Aqui atualiza a experiencia com o incremental e atualiza o player local!
-            if "experiencia" in data:
-                xp_recebida = data["experiencia"] - player.get("experiencia", 0)
-                if xp_recebida > 0:
-                    msg_nivel = adicionar_experiencia(user_id, xp_recebida)
-                    if msg_nivel:
-                        mensagens.append(msg_nivel)
-                    # Atualiza o player local com o XP novo depois de adicionar
-                    player["experiencia"] = player.get("experiencia", 0) + xp_recebida
-            elif "xp" in data:
-                xp_recebida = data["xp"] - player.get("experiencia", 0)
-                if xp_recebida > 0:
-                    msg_nivel = adicionar_experiencia(user_id, xp_recebida)
-                    if msg_nivel:
-                        mensagens.append(msg_nivel)
-                    # Atualiza o player local com o XP novo depois de adicionar
-                    player["experiencia"] = player.get("experiencia", 0) + xp_recebida
-
-            # CRITICAL RULE: Base attributes are SACRED.
-            # They can ONLY be modified through:
-            # 1. Initial character creation (generate_character_setup or initialization)
-            # 2. Levelup system (handled separately)
-            # 3. Manual admin intervention
-            # 
-            # The AI should NEVER send "atributos" during normal gameplay.
-            # Item buffs are TEMPORARY and calculated on-the-fly during display.
-            # This prevents ALL corruption scenarios.
-            
-            if "atributos" in data:
-                # Check if this is initial character creation or a special permanent buff
-                # For now, we COMPLETELY IGNORE atributos from AI during gameplay.
-                # The system instruction already tells AI not to send this.
-                # If it does anyway, we silently skip it to protect data integrity.
-                print(f"WARNING: AI sent 'atributos' in response. Ignoring to preserve base stats integrity.")
-                print(f"DEBUG: Received atributos: {data['atributos']}")
-                # Do NOT modify player["atributos"] here
-
-            # --- INTELLIGENT SPELL MERGE ---
-            if "magias" in data:
-                new_magias = data["magias"]
-                existing_magias = player.get("magias", [])
-                
-                if not new_magias:
-                     pass # Empty list? Don't wipe.
-                else:
-                    # Create Map of existing names
-                    existing_map = {m.get("nome", "").lower(): m for m in existing_magias}
-                    
-                    for magia in new_magias:
-                        if isinstance(magia, dict):
-                            name = magia.get("nome", "").lower()
-                            if name:
-                                existing_map[name] = magia # Update or Add
-                    
-                    # Convert back to list
-                    player["magias"] = list(existing_map.values())
-                    print(f"INFO: Magias mescladas. Total: {len(player['magias'])}")
+def interpretar_e_atualizar_estado(resposta: str, user_id: int, campaign_id: str = None, player: dict = None) -> str:
+    """extracts JSON from response and updates the player (player.json, or `player` inside a PlayerTransaction)"""
+    if player is None:
+        with PlayerTransaction(user_id, campaign_id) as tx:
+            if not tx.player:
+                tx.player = _default_player()
+            return interpretar_e_atualizar_estado(resposta, user_id, campaign_id, player=tx.player)
 
-            if "status" in data:
-                player["status"] = data["status"]
+    inventario = player.setdefault("inventario", {})
+    mensagens = []
 
-        except json.JSONDecodeError:
-            print("Erro ao decodificar JSON do assistente.")
+    if find_state_block(resposta) is not None:
+        data = parse_state_block(resposta)
+        if data is not None:
+            mensagens.extend(apply_state_update(data, user_id, campaign_id, player))
     else:
         texto = resposta.lower()
         if "perdeu" in texto and "vida" in texto:
@@ -489,7 +688,6 @@ def interpretar_e_atualizar_estado(resposta: str, user_id: int, campaign_id: str
             inventario["ouro"] = inventario.get("ouro", 0) + 10
 
     player["inventario"] = inventario
-    save_player(user_id, player, campaign_id)
 
     if mensagens:
         return "\n\n".join(mensagens)
@@ -554,8 +752,9 @@ def get_full_status_text(user_id: int, campaign_id: str = None):
 
     texto += "\n🧪 Status:\n"
     if status:
+        labels = effect_labels(player)
         for s in status:
-            texto += f"- {s}\n"
+            texto += f"- {labels.get(s, s)}\n"
     else:
         texto += "- Nenhum status ativo\n"
 
@@ -582,34 +781,17 @@ def get_full_status_text(user_id: int, campaign_id: str = None):
 
     return texto
 
-def process_passive_effects(user_id: int, campaign_id: str = None) -> str:
-    """Check and apply passive effects from status"""
-    player = load_player(user_id, campaign_id)
-    if not player: return None
-    
-    status_list = player.get("status", [])
-    if not status_list: return None
-    
-    effects_applied = []
-    inventory = player.get("inventario", {})
-    
-    # Logic for "Recuperação de Vida Extrema"
-    if "Recuperação de Vida Extrema" in status_list:
-        current_hp = inventory.get("vida_atual", 0)
-        max_hp = inventory.get("vida_maxima", 100)
-        
-        if current_hp < max_hp:
-            heal_amount = 15
-            new_hp = min(current_hp + heal_amount, max_hp)
-            inventory["vida_atual"] = new_hp
-            effects_applied.append(f"❤️ Recuperação Extrema: +{new_hp - current_hp} PV")
-            
-    # Save if changes happened
+def process_passive_effects(user_id: int, campaign_id: str = None, player: dict = None) -> str:
+    """Advance the turn of the timed effects (see effects.py) and the status passives"""
+    if player is None:
+        with PlayerTransaction(user_id, campaign_id) as tx:
+            if not tx.player: return None
+            return process_passive_effects(user_id, campaign_id, player=tx.player)
+
+    effects_applied = tick_effects(player)
     if effects_applied:
-        player["inventario"] = inventory
-        save_player(user_id, player, campaign_id)
         return "\n".join(effects_applied)
-        
+
     return None
 
 def generate_initial_stats(classe: str, raca: str, tema: str) -> dict:
@@ -0,0 +1,149 @@
+import math
+from bisect import bisect_right
+from functools import lru_cache
+
+try:
+    import numpy as np
+except ImportError: # Only the balancing simulator needs it
+    np = None
+
+# Progression tables, built once at import: cumulative XP per level (level
+# from XP is a binary search), the per-level HP/mana growth and D&D 5E spell
+# slots per caster type. simulate_progression() runs whole populations of
+# characters through XP streams with NumPy to tune rewards per game mode.
+
+LEVEL_GROWTH = 1.10 # +10% vida/mana máximas per level
+LEVEL_HEAL = 0.10   # and the current values recover 10% of the new maximum
+TABLE_LEVELS = 200  # Precomputed; higher levels extend the table on demand
+
+def xp_necessario_para_nivel(nivel_atual: int) -> int:
+    # Nível 0 = 100, e cada nível seguinte +50 XP
+    return 100 + nivel_atual * 50
+
+# CUMULATIVE_XP[n]: total XP from level 0 to reach level n
+CUMULATIVE_XP = [0]
+
+def _extend_cumulative(levels: int = 0, total_xp: int = 0):
+    while len(CUMULATIVE_XP) <= levels or CUMULATIVE_XP[-1] <= total_xp:
+        nivel = len(CUMULATIVE_XP) - 1
+        CUMULATIVE_XP.append(CUMULATIVE_XP[-1] + xp_necessario_para_nivel(nivel))
+
+_extend_cumulative(TABLE_LEVELS)
+
+def total_xp(nivel: int, experiencia: int) -> int:
+    """Total XP of a character stored as (level, XP within the level)"""
+    _extend_cumulative(levels=nivel)
+    return CUMULATIVE_XP[nivel] + experiencia
+
+def level_for_xp(total: int) -> int:
+    """Level reached with `total` XP: binary search over the cumulative table"""
+    _extend_cumulative(total_xp=total)
+    return bisect_right(CUMULATIVE_XP, total) - 1
+
+def grow_stat(maxima: int, atual: int, levels: int) -> tuple:
+    """(maxima, atual) after `levels` level-ups; rounds up at every level like the game always has"""
+    for _ in range(levels):
+        maxima = math.ceil(maxima * LEVEL_GROWTH)
+        atual = min(atual + math.ceil(maxima * LEVEL_HEAL), maxima)
+    return maxima, atual
+
+@lru_cache(maxsize=256)
+def stat_table(base: int, levels: int) -> tuple:
+    """Maximum vida/mana after 0..levels level-ups, starting from `base`"""
+    table = [base]
+    for _ in range(levels):
+        table.append(math.ceil(table[-1] * LEVEL_GROWTH))
+    return tuple(table)
+
+# --- Spell slots (D&D 5E), per caster type ---
+
+FULL_CASTERS = ("mago", "feiticeiro", "clerigo", "clérigo", "druida", "bardo")
+PACT_CASTERS = ("bruxo", "warlock")
+HALF_CASTERS = ("paladino", "ranger", "guardião", "guardi")
+
+# Full caster slots per level (1-20): totals of circles 1, 2, 3...
+FULL_CASTER_SLOTS = (
+    None,
+    (2,), (3,), (4, 2), (4, 3), (4, 3, 2), (4, 3, 3), (4, 3, 3, 1), (4, 3, 3, 2), (4, 3, 3, 3, 1), (4, 3, 3, 3, 2),
+    (4, 3, 3, 3, 2, 1), (4, 3, 3, 3, 2, 1), (4, 3, 3, 3, 2, 1, 1), (4, 3, 3, 3, 2, 1, 1),
+    (4, 3, 3, 3, 2, 1, 1, 1), (4, 3, 3, 3, 2, 1, 1, 1), (4, 3, 3, 3, 2, 1, 1, 1, 1),
+    (4, 3, 3, 3, 3, 1, 1, 1, 1), (4, 3, 3, 3, 3, 2, 1, 1, 1), (4, 3, 3, 3, 3, 2, 2, 1, 1),
+)
+MAX_CASTER_LEVEL = len(FULL_CASTER_SLOTS) - 1
+
+def caster_type(classe: str):
+    """"full", "pact", "half" or None"""
+    classe = classe.lower()
+    if any(c in classe for c in FULL_CASTERS):
+        return "full"
+    if any(c in classe for c in PACT_CASTERS):
+        return "pact"
+    if any(c in classe for c in HALF_CASTERS):
+        return "half"
+    return None
+
+def _full_row(nivel: int) -> tuple:
+    return tuple((str(circle), total) for circle, total in enumerate(FULL_CASTER_SLOTS[nivel], start=1))
+
+def _slot_row(kind: str, nivel: int) -> tuple:
+    """((circle, total), ...) for a caster type and level"""
+    if kind == "full":
+        # Fallback for invalid levels
+        return _full_row(nivel) if 1 <= nivel <= MAX_CASTER_LEVEL else (("1", 2),)
+    if kind == "pact":
+        # Warlock uses Pact Magic (simplified): up to 4 slots, all of one circle up to the 5th
+        return ((str(min(5, (nivel + 1) // 2)), min(4, (nivel + 1) // 2)),)
+    if kind == "half":
+        # Half-casters (Paladin, Ranger) start at level 2 and progress at half speed
+        half_level = (nivel + 1) // 2
+        return _full_row(half_level) if nivel >= 2 and 1 <= half_level <= MAX_CASTER_LEVEL else ()
+    return ()
+
+SLOT_TABLES = {kind: tuple(_slot_row(kind, nivel) for nivel in range(MAX_CASTER_LEVEL + 1)) for kind in ("full", "pact", "half")}
+
+def default_slots(classe: str, nivel: int) -> dict:
+    kind = caster_type(classe)
+    if kind is None:
+        return {}
+    table = SLOT_TABLES[kind]
+    row = table[nivel] if 0 <= nivel < len(table) else _slot_row(kind, nivel)
+    # Fresh dicts: callers mutate "usado"
+    return {circle: {"total": total, "usado": 0} for circle, total in row}
+
+# --- Balancing simulator ---
+
+def simulate_progression(xp_rewards, nivel_inicial: int = 0, vida_maxima: int = 100, mana_maxima: int = 50) -> dict:
+    """
+    Advance a population of characters through XP streams at once.
+    `xp_rewards` is a (personagens, turnos) array of XP gained per turn.
+    Returns {"nivel": (personagens, turnos) level after each turn,
+             "vida_maxima" / "mana_maxima": (personagens,) at the end}.
+    Requires NumPy.
+    """
+    if np is None:
+        raise RuntimeError("simulate_progression requer NumPy (pip install numpy)")
+    rewards = np.asarray(xp_rewards, dtype=np.int64)
+    if rewards.ndim == 1:
+        rewards = rewards[np.newaxis, :]
+
+    totals = total_xp(nivel_inicial, 0) + np.cumsum(rewards, axis=1)
+    _extend_cumulative(total_xp=int(totals.max(initial=0)))
+    niveis = np.searchsorted(np.asarray(CUMULATIVE_XP), totals, side="right") - 1
+    niveis = np.maximum(niveis, nivel_inicial)
+
+    gained = niveis[:, -1] - nivel_inicial if niveis.shape[1] else np.zeros(len(niveis), dtype=np.int64)
+    top = int(gained.max(initial=0))
+    return {
+        "nivel": niveis,
+        "vida_maxima": np.asarray(stat_table(vida_maxima, top))[gained],
+        "mana_maxima": np.asarray(stat_table(mana_maxima, top))[gained]
+    }
+
+def turns_to_level(niveis, nivel: int):
+    """First turn (1-based) each character reaches `nivel`; -1 if it never does"""
+    if np is None:
+        raise RuntimeError("turns_to_level requer NumPy (pip install numpy)")
+    reached = np.asarray(niveis) >= nivel
+    turns = reached.argmax(axis=1) + 1
+    turns[~reached.any(axis=1)] = -1
+    return turns
@@ -1,71 +1,177 @@
-import json
+import os
+import time
 import uuid
-from pathlib import Path
+import threading
 from datetime import datetime, timedelta
+from .storage import load_collection, get_record, put_record, delete_records
 
-# Base directory for session data
-BASE_DIR = Path(__file__).resolve().parent.parent.parent
-SESSIONS_FILE = BASE_DIR / "data" / "sessions.json"
+SESSIONS_COLLECTION = "sessions"
 
-def ensure_sessions_file():
-    """Ensure sessions.json exists"""
-    SESSIONS_FILE.parent.mkdir(parents=True, exist_ok=True)
-    if not SESSIONS_FILE.exists():
-        SESSIONS_FILE.write_text("{}")
+# In-process token -> (user_id, expires_at, revalidate_at) cache.
+# Loaded once, kept in sync by create/delete/sweep under _session_lock.
+# Entries are re-checked against storage after SESSION_CACHE_TTL seconds.
+# With the SQLite backend that read goes to the shared database, so a logout
+# done by another worker process is eventually seen here too. The JSON
+# backend keeps collections in process memory and supports a single worker.
+SESSION_CACHE_TTL = float(os.getenv("SESSION_CACHE_TTL", "60"))
+# Live sessions allowed per user; the oldest are evicted on login beyond this
+SESSION_MAX_PER_USER = int(os.getenv("SESSION_MAX_PER_USER", "10"))
+# Seconds between background sweeps of expired tokens
+SESSION_SWEEP_INTERVAL = float(os.getenv("SESSION_SWEEP_INTERVAL", "3600"))
 
-def load_sessions():
-    """Load all sessions from sessions.json"""
-    ensure_sessions_file()
-    with open(SESSIONS_FILE, 'r', encoding='utf-8') as f:
-        return json.load(f)
+_session_cache = None
+_user_tokens = {}  # user_id -> tokens ordered oldest first
+_session_lock = threading.RLock()
+_sweeper_thread = None
+_sweeper_stop = threading.Event()
+_sweep_stats = {"runs": 0, "last_removed": 0, "total_removed": 0, "live": 0, "last_duration_ms": 0.0}
 
-def save_sessions(sessions):
-    """Save sessions to sessions.json"""
-    ensure_sessions_file()
-    with open(SESSIONS_FILE, 'w', encoding='utf-8') as f:
-        json.dump(sessions, f, indent=2)
+def _cache_entry(session: dict):
+    try:
+        return (session["user_id"], datetime.fromisoformat(session["expires_at"]), time.monotonic() + SESSION_CACHE_TTL)
+    except (KeyError, TypeError, ValueError):
+        return None
+
+def _get_session_cache() -> dict:
+    global _session_cache
+    if _session_cache is None:
+        with _session_lock:
+            if _session_cache is None:
+                cache = {}
+                for token, session in load_collection(SESSIONS_COLLECTION).items():
+                    entry = _cache_entry(session)
+                    if entry:
+                        cache[token] = entry
+                _user_tokens.clear()
+                # expires_at = created_at + 30 days, so sorting by it gives creation order
+                for token, entry in sorted(cache.items(), key=lambda item: item[1][1]):
+                    _user_tokens.setdefault(entry[0], []).append(token)
+                _session_cache = cache
+    return _session_cache
+
+def _forget_token(token: str):
+    """Drop a token from the cache; call with _session_lock held"""
+    entry = _get_session_cache().pop(token, None)
+    if entry:
+        tokens = _user_tokens.get(entry[0], [])
+        if token in tokens:
+            tokens.remove(token)
+        if not tokens:
+            _user_tokens.pop(entry[0], None)
 
 def create_session(user_id: str) -> str:
     """Create a new session and return token"""
-    sessions = load_sessions()
-    
     # Generate unique token
     token = str(uuid.uuid4())
-    
+
     # Create session with expiration (30 days)
     session = {
         "user_id": user_id,
         "created_at": datetime.now().isoformat(),
         "expires_at": (datetime.now() + timedelta(days=30)).isoformat()
     }
-    
-    sessions[token] = session
-    save_sessions(sessions)
-    
+
+    with _session_lock:
+        # Load the cache first: loaded after the write it would already list the new token
+        cache = _get_session_cache()
+        put_record(SESSIONS_COLLECTION, token, session)
+        cache[token] = _cache_entry(session)
+
+        # Bound live sessions per user: evict the oldest logins first
+        tokens = _user_tokens.setdefault(user_id, [])
+        tokens.append(token)
+        evicted = []
+        if SESSION_MAX_PER_USER > 0 and len(tokens) > SESSION_MAX_PER_USER:
+            evicted = tokens[:len(tokens) - SESSION_MAX_PER_USER]
+            for old_token in evicted:
+                _forget_token(old_token)
+    if evicted:
+        delete_records(SESSIONS_COLLECTION, evicted)
+        print(f"INFO: Evicted {len(evicted)} oldest session(s) of user {user_id}")
+
     return token
 
 def validate_session(token: str) -> str:
     """Validate session token and return user_id, or None if invalid"""
-    sessions = load_sessions()
-    
-    if token not in sessions:
-        return None
-    
-    session = sessions[token]
-    
+    cache = _get_session_cache()
+    entry = cache.get(token)
+
+    if entry is None or time.monotonic() > entry[2]:
+        # Unknown here or stale: ask storage (another worker may have created/deleted it)
+        session = get_record(SESSIONS_COLLECTION, token)
+        entry = _cache_entry(session) if session else None
+        with _session_lock:
+            if entry is None:
+                _forget_token(token)
+                return None
+            if token not in cache:
+                _user_tokens.setdefault(entry[0], []).append(token)
+            cache[token] = entry
+
+    user_id, expires_at, _ = entry
+
     # Check if expired
-    expires_at = datetime.fromisoformat(session['expires_at'])
     if datetime.now() > expires_at:
         # Clean up expired session
         delete_session(token)
         return None
-    
-    return session['user_id']
+
+    return user_id
 
 def delete_session(token: str):
     """Delete a session (logout)"""
-    sessions = load_sessions()
-    
-    if token in sessions:
-        del sessions[token]
-        save_sessions(sessions)
+    with _session_lock:
+        _forget_token(token)
+    delete_records(SESSIONS_COLLECTION, [token])
+
+def sweep_expired_sessions() -> dict:
+    """Drop every expired token in one bulk delete and return sweep stats"""
+    started = time.perf_counter()
+    now = datetime.now()
+
+    sessions = list(load_collection(SESSIONS_COLLECTION).items())
+    expired = []
+    for token, session in sessions:
+        entry = _cache_entry(session)
+        if entry is None or now > entry[1]:
+            expired.append(token)
+
+    with _session_lock:
+        for token in expired:
+            _forget_token(token)
+    delete_records(SESSIONS_COLLECTION, expired)
+
+    duration_ms = (time.perf_counter() - started) * 1000
+    _sweep_stats["runs"] += 1
+    _sweep_stats["last_removed"] = len(expired)
+    _sweep_stats["total_removed"] += len(expired)
+    _sweep_stats["live"] = len(sessions) - len(expired)
+    _sweep_stats["last_duration_ms"] = round(duration_ms, 2)
+    print(f"INFO: Session sweep removed {len(expired)} expired token(s), {_sweep_stats['live']} live, in {duration_ms:.1f} ms")
+    return dict(_sweep_stats)
+
+def get_session_stats() -> dict:
+    return dict(_sweep_stats)
+
+def _sweeper_loop():
+    while True:
+        try:
+            sweep_expired_sessions()
+        except Exception as e:
+            print(f"ERROR: Session sweep failed: {e}")
+        if _sweeper_stop.wait(SESSION_SWEEP_INTERVAL):
+            break
+
+def start_session_sweeper():
+    """Start the background thread that sweeps expired sessions (first sweep runs immediately)"""
+    global _sweeper_thread
+    if _sweeper_thread and _sweeper_thread.is_alive():
+        return
+    _sweeper_stop.clear()
+    _sweeper_thread = threading.Thread(target=_sweeper_loop, name="session-sweeper", daemon=True)
+    _sweeper_thread.start()
+
+def stop_session_sweeper():
+    _sweeper_stop.set()
+    if _sweeper_thread:
+        _sweeper_thread.join(timeout=5)
@@ -0,0 +1,274 @@
+import json
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+
+# SQLite storage backend (STORAGE_BACKEND=sqlite).
+# Mirrors the three kinds of data handled by storage.py:
+#   documents   -> player.json, campaigns.json, memory.json... (one row per file)
+#   log_records -> append-only logs such as history.jsonl (one row per line)
+#   records     -> shared keyed collections such as users and sessions
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    user_id     TEXT NOT NULL,
+    campaign_id TEXT NOT NULL,
+    name        TEXT NOT NULL,
+    data        TEXT NOT NULL,
+    updated_at  TEXT NOT NULL,
+    PRIMARY KEY (user_id, campaign_id, name)
+);
+CREATE TABLE IF NOT EXISTS log_records (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id     TEXT NOT NULL,
+    campaign_id TEXT NOT NULL,
+    name        TEXT NOT NULL,
+    data        TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_log_records_stream ON log_records (user_id, campaign_id, name, id);
+CREATE TABLE IF NOT EXISTS records (
+    collection  TEXT NOT NULL,
+    key         TEXT NOT NULL,
+    data        TEXT NOT NULL,
+    PRIMARY KEY (collection, key)
+);
+"""
+
+def _scope(user_id, campaign_id):
+    # NULL never matches in a composite primary key, so "no user/campaign" is stored as ''
+    return ("" if user_id is None else str(user_id), campaign_id or "")
+
+class SqliteBackend:
+    """One database file, one connection per thread, WAL so readers never block the writer"""
+
+    def __init__(self, db_path):
+        self.db_path = str(db_path)
+        Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.executescript(SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # --- Documents ---
+
+    def read_document(self, user_id, filename, campaign_id=None, default=None):
+        row = self._conn().execute(
+            "SELECT data FROM documents WHERE user_id = ? AND campaign_id = ? AND name = ?",
+            (*_scope(user_id, campaign_id), filename)
+        ).fetchone()
+        if row is None:
+            return default
+        try:
+            return json.loads(row[0])
+        except ValueError:
+            return default
+
+    def write_document(self, user_id, filename, payload: str, campaign_id=None):
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO documents (user_id, campaign_id, name, data, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (*_scope(user_id, campaign_id), filename, payload, datetime.now().isoformat())
+            )
+
+    def delete_document(self, user_id, filename, campaign_id=None):
+        with self._conn() as conn:
+            conn.execute(
+                "DELETE FROM documents WHERE user_id = ? AND campaign_id = ? AND name = ?",
+                (*_scope(user_id, campaign_id), filename)
+            )
+
+    def delete_campaign(self, user_id, campaign_id):
+        scope = _scope(user_id, campaign_id)
+        with self._conn() as conn:
+            conn.execute("DELETE FROM documents WHERE user_id = ? AND campaign_id = ?", scope)
+            conn.execute("DELETE FROM log_records WHERE user_id = ? AND campaign_id = ?", scope)
+
+    # --- Append-only logs ---
+
+    def append_records(self, user_id, filename, records: list, campaign_id=None):
+        scope = _scope(user_id, campaign_id)
+        with self._conn() as conn:
+            conn.executemany(
+                "INSERT INTO log_records (user_id, campaign_id, name, data) VALUES (?, ?, ?, ?)",
+                [(*scope, filename, json.dumps(r, ensure_ascii=False)) for r in records]
+            )
+
+    def read_records(self, user_id, filename, campaign_id=None) -> list:
+        rows = self._conn().execute(
+            "SELECT data FROM log_records WHERE user_id = ? AND campaign_id = ? AND name = ? ORDER BY id",
+            (*_scope(user_id, campaign_id), filename)
+        ).fetchall()
+        return [json.loads(r[0]) for r in rows]
+
+    def tail_records(self, user_id, filename, limit: int, campaign_id=None, skip: int = 0) -> list:
+        rows = self._conn().execute(
+            "SELECT data FROM log_records WHERE user_id = ? AND campaign_id = ? AND name = ? ORDER BY id DESC LIMIT ? OFFSET ?",
+            (*_scope(user_id, campaign_id), filename, limit, max(skip, 0))
+        ).fetchall()
+        return [json.loads(r[0]) for r in reversed(rows)]
+
+    def count_records(self, user_id, filename, campaign_id=None) -> int:
+        row = self._conn().execute(
+            "SELECT COUNT(*) FROM log_records WHERE user_id = ? AND campaign_id = ? AND name = ?",
+            (*_scope(user_id, campaign_id), filename)
+        ).fetchone()
+        return row[0]
+
+    def has_records(self, user_id, filename, campaign_id=None) -> bool:
+        row = self._conn().execute(
+            "SELECT 1 FROM log_records WHERE user_id = ? AND campaign_id = ? AND name = ? LIMIT 1",
+            (*_scope(user_id, campaign_id), filename)
+        ).fetchone()
+        return row is not None
+
+    def clear_records(self, user_id, filename, campaign_id=None):
+        with self._conn() as conn:
+            conn.execute(
+                "DELETE FROM log_records WHERE user_id = ? AND campaign_id = ? AND name = ?",
+                (*_scope(user_id, campaign_id), filename)
+            )
+
+    def copy_records(self, user_id, filename, campaign_id, target_campaign_id):
+        """Replace the target's log with a copy of the source's (rows are copied inside the database)"""
+        source, target = _scope(user_id, campaign_id), _scope(user_id, target_campaign_id)
+        with self._conn() as conn:
+            conn.execute("DELETE FROM log_records WHERE user_id = ? AND campaign_id = ? AND name = ?", (*target, filename))
+            conn.execute(
+                "INSERT INTO log_records (user_id, campaign_id, name, data) "
+                "SELECT user_id, ?, name, data FROM log_records WHERE user_id = ? AND campaign_id = ? AND name = ? ORDER BY id",
+                (target[1], *source, filename)
+            )
+
+    # --- Keyed collections ---
+
+    def load_collection(self, collection: str) -> dict:
+        rows = self._conn().execute("SELECT key, data FROM records WHERE collection = ?", (collection,)).fetchall()
+        return {key: json.loads(data) for key, data in rows}
+
+    def get_record(self, collection: str, key: str):
+        row = self._conn().execute(
+            "SELECT data FROM records WHERE collection = ? AND key = ?", (collection, str(key))
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put_records(self, collection: str, items: dict):
+        with self._conn() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO records (collection, key, data) VALUES (?, ?, ?)",
+                [(collection, str(k), json.dumps(v, ensure_ascii=False)) for k, v in items.items()]
+            )
+
+    def delete_records(self, collection: str, keys: list):
+        with self._conn() as conn:
+            conn.executemany(
+                "DELETE FROM records WHERE collection = ? AND key = ?",
+                [(collection, str(k)) for k in keys]
+            )
+
+def migrate_json_tree(data_dir, db_path) -> dict:
+    """
+    One-shot import of the JSON directory layout into SQLite:
+      data/users.json, data/sessions.json (+ journal) -> records
+      data/<user_id>/*.json                         -> documents (user level)
+      data/<user_id>/campaigns/<id>/*.json          -> documents
+      data/<user_id>/campaigns/<id>/history.json(l) -> log_records
+    Safe to re-run: documents/records are replaced and logs are re-imported.
+    """
+    data_dir = Path(data_dir)
+    backend = SqliteBackend(db_path)
+    counts = {"records": 0, "documents": 0, "log_records": 0}
+
+    def read_json(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"WARN: Skipping unreadable file {path}: {e}")
+            return None
+
+    def import_log(user_id, campaign_id, messages):
+        backend.clear_records(user_id, "history.jsonl", campaign_id)
+        backend.append_records(user_id, "history.jsonl", messages, campaign_id)
+        counts["log_records"] += len(messages)
+
+    def read_lines(path):
+        records = []
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    continue # Blank or torn line
+        return records
+
+    for collection in ("users", "sessions"):
+        data = read_json(data_dir / f"{collection}.json") if (data_dir / f"{collection}.json").exists() else None
+        data = data if isinstance(data, dict) else {}
+        # Replay the JSON backend's pending put/delete journal on top of the snapshot
+        journal_path = data_dir / f"{collection}.journal.jsonl"
+        if journal_path.exists():
+            for op in read_lines(journal_path):
+                if op.get("op") == "put":
+                    data[op["key"]] = op["value"]
+                elif op.get("op") == "delete":
+                    data.pop(op["key"], None)
+        if data:
+            backend.put_records(collection, data)
+            counts["records"] += len(data)
+
+    for user_dir in sorted(p for p in data_dir.iterdir() if p.is_dir()):
+        user_id = user_dir.name
+        for path in sorted(user_dir.glob("*.json")):
+            data = read_json(path)
+            if data is not None:
+                backend.write_document(user_id, path.name, json.dumps(data, indent=4))
+                counts["documents"] += 1
+
+        campaigns_dir = user_dir / "campaigns"
+        if not campaigns_dir.is_dir():
+            continue
+        for campaign_dir in sorted(p for p in campaigns_dir.iterdir() if p.is_dir()):
+            campaign_id = campaign_dir.name
+            jsonl_path = campaign_dir / "history.jsonl"
+            segments_path = campaign_dir / "history.segments.json"
+            if jsonl_path.exists() or segments_path.exists():
+                # Sealed segments (forked campaigns) hold the older messages
+                segments = read_json(segments_path) if segments_path.exists() else None
+                messages = []
+                for segment in segments or []:
+                    if (campaign_dir / segment["file"]).exists():
+                        messages.extend(read_lines(campaign_dir / segment["file"]))
+                if jsonl_path.exists():
+                    messages.extend(read_lines(jsonl_path))
+                import_log(user_id, campaign_id, messages)
+            elif (campaign_dir / "history.json").exists():
+                messages = read_json(campaign_dir / "history.json")
+                if isinstance(messages, list):
+                    import_log(user_id, campaign_id, messages)
+
+            for path in sorted(campaign_dir.glob("*.json")):
+                if path.name == "history.json" or path.name.endswith(".segments.json"):
+                    continue
+                data = read_json(path)
+                if data is not None:
+                    backend.write_document(user_id, path.name, json.dumps(data, indent=4), campaign_id)
+                    counts["documents"] += 1
+
+    return counts
+
+if __name__ == "__main__":
+    # Usage: python -m src.core.sqlite_backend [db_path]
+    import sys
+    from .storage import DATA_DIR, SQLITE_PATH
+    target = sys.argv[1] if len(sys.argv) > 1 else SQLITE_PATH
+    result = migrate_json_tree(DATA_DIR, target)
+    print(f"Migração concluída em {target}: {result}")
@@ -0,0 +1,92 @@
+import os
+from pydantic import ValidationError
+from .models import StateUpdate
+
+# Optional structured state updates (STATE_UPDATE_MODE=tools): instead of a
+# fenced JSON block in the narrative, the narrator calls the atualizar_estado
+# function. Arguments are validated against StateUpdate, so no regex parsing
+# and no malformed JSON. The JSON block parser stays as the fallback for turns
+# where the model does not call the tool. With tool_choice="auto" a reply that
+# calls the tool usually has no text; the narration is then asked for in a
+# second call that acknowledges the tool call (narration_request).
+
+STATE_UPDATE_MODE = os.getenv("STATE_UPDATE_MODE", "json").lower()
+STATE_TOOL_NAME = "atualizar_estado"
+
+def tools_enabled() -> bool:
+    return STATE_UPDATE_MODE == "tools"
+
+def _compact_schema(schema: dict) -> dict:
+    """
+    Pydantic's schema as one self-contained object ($refs inlined) without
+    titles, null defaults and Optional's anyOf-null wrapper: the schema is
+    sent as input tokens on every narrator call.
+    """
+    defs = schema.pop("$defs", {})
+
+    def resolve(node):
+        if isinstance(node, dict):
+            if "$ref" in node:
+                return resolve(defs[node["$ref"].split("/")[-1]])
+            options = [o for o in node.get("anyOf", []) if o != {"type": "null"}]
+            if "anyOf" in node and len(options) == 1:
+                merged = {k: v for k, v in node.items() if k != "anyOf"}
+                merged.update(options[0])
+                return resolve(merged)
+            return {k: resolve(v) for k, v in node.items() if k != "title" and not (k == "default" and v is None)}
+        if isinstance(node, list):
+            return [resolve(v) for v in node]
+        return node
+
+    return resolve(schema)
+
+STATE_TOOL = {
+    "type": "function",
+    "function": {
+        "name": STATE_TOOL_NAME,
+        "description": (
+            "Registra mudanças no estado do personagem causadas por esta resposta "
+            "(vida, mana, ouro, itens, spell slots, XP, magias, status). Envie apenas o que mudou."
+        ),
+        "parameters": _compact_schema(StateUpdate.model_json_schema())
+    }
+}
+
+def tool_request_kwargs() -> dict:
+    """Extra chat completion arguments for the narrator call in the current mode"""
+    if not tools_enabled():
+        return {}
+    return {"tools": [STATE_TOOL], "tool_choice": "auto"}
+
+def needs_narration(reply: str, tool_calls: list) -> bool:
+    """True when the reply only called the state tool and has no narration for the player"""
+    return not (reply or "").strip() and any(call.get("name") == STATE_TOOL_NAME for call in tool_calls)
+
+def narration_request(messages: list, tool_calls: list) -> tuple:
+    """
+    (messages, kwargs) of the follow-up narrator call: the turn's messages plus
+    the tool calls and their results, with tool use turned off so the reply is text.
+    """
+    calls = [dict(call, id=call.get("id") or f"call_{i}") for i, call in enumerate(tool_calls)]
+    followup = list(messages)
+    followup.append({"role": "assistant", "content": None, "tool_calls": [
+        {"id": call["id"], "type": "function", "function": {"name": call["name"], "arguments": call["arguments"]}}
+        for call in calls
+    ]})
+    for call in calls:
+        followup.append({"role": "tool", "tool_call_id": call["id"], "content": "Estado registrado. Agora narre a cena para o jogador, sem JSON."})
+    return followup, {"tools": [STATE_TOOL], "tool_choice": "none"}
+
+def parse_state_updates(tool_calls: list) -> list:
+    """Validated state updates (plain dicts, only the fields sent) from collected tool calls"""
+    updates = []
+    for call in tool_calls:
+        if call.get("name") != STATE_TOOL_NAME:
+            continue
+        try:
+            update = StateUpdate.model_validate_json(call.get("arguments") or "{}")
+        except ValidationError as e:
+            print(f"WARN: Invalid {STATE_TOOL_NAME} arguments ignored: {e.error_count()} error(s)")
+            continue
+        updates.append(update.model_dump(exclude_none=True))
+    return updates
@@ -1,6 +1,11 @@
 import json
-from pathlib import Path
+import os
+import uuid
 import shutil
+import atexit
+import threading
+from collections import OrderedDict
+from pathlib import Path
 
 # Adjust path since this file is now in src/core/
 # src/core/storage.py -> parent=src/core -> parent=src -> parent=root
@@ -8,6 +13,35 @@ BASE_DIR = Path(__file__).resolve().parent.parent.parent
 DATA_DIR = BASE_DIR / "data"
 DATA_DIR.mkdir(exist_ok=True)
 
+# Backend selection: "json" (default, files under data/) or "sqlite" (single WAL database).
+# Callers (auth, sessions, campaigns, player, history) only use the functions below.
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "json").lower()
+SQLITE_PATH = os.getenv("STORAGE_SQLITE_PATH", str(DATA_DIR / "infinity.db"))
+_sqlite = None
+
+def _use_sqlite() -> bool:
+    return STORAGE_BACKEND == "sqlite"
+
+def _get_sqlite():
+    global _sqlite
+    if _sqlite is None:
+        from .sqlite_backend import SqliteBackend
+        _sqlite = SqliteBackend(SQLITE_PATH)
+    return _sqlite
+
+# Write-behind cache: load_json/save_json hit memory, dirty entries are
+# written back by flush_cache() (timer thread, eviction or shutdown).
+CACHE_ENABLED = os.getenv("STORAGE_CACHE_ENABLED", "1") != "0"
+CACHE_MAX_ENTRIES = int(os.getenv("STORAGE_CACHE_MAX_ENTRIES", "256"))
+CACHE_FLUSH_INTERVAL = float(os.getenv("STORAGE_CACHE_FLUSH_INTERVAL", "2.0"))
+
+_cache = OrderedDict()  # (user_id, campaign_id, filename) -> data, in LRU order
+_dirty = set()
+_cache_lock = threading.RLock()
+_flush_lock = threading.Lock()  # Serializes disk writes (flush vs. delete)
+_flusher_thread = None
+_flusher_stop = threading.Event()
+
 def get_user_dir(user_id: int) -> Path:
     user_path = DATA_DIR / str(user_id)
     user_path.mkdir(exist_ok=True)
@@ -23,8 +57,22 @@ def get_file_path(user_id: int, filename: str, campaign_id: str = None) -> Path:
         return get_campaign_dir(user_id, campaign_id) / filename
     return get_user_dir(user_id) / filename
 
-def load_json(user_id: int, filename: str, default=None, campaign_id: str = None):
-    path = get_file_path(user_id, filename, campaign_id)
+def _cache_key(user_id, filename: str, campaign_id: str = None) -> tuple:
+    # user_id None = shared file directly under data/ (users, sessions)
+    return (None if user_id is None else str(user_id), campaign_id or None, filename)
+
+def _document_path(key: tuple) -> Path:
+    user_id, campaign_id, filename = key
+    if user_id is None:
+        return DATA_DIR / filename
+    return get_file_path(user_id, filename, campaign_id)
+
+def _read_file(key: tuple, default=None):
+    if _use_sqlite():
+        user_id, campaign_id, filename = key
+        return _get_sqlite().read_document(user_id, filename, campaign_id, default)
+
+    path = _document_path(key)
     if path.exists():
         try:
             with open(path, "r") as f:
@@ -33,19 +81,470 @@ def load_json(user_id: int, filename: str, default=None, campaign_id: str = None
             return default
     return default
 
+def _write_file(key: tuple, payload: str):
+    """Atomically replace the file so readers never see a half-written JSON"""
+    if _use_sqlite():
+        user_id, campaign_id, filename = key
+        _get_sqlite().write_document(user_id, filename, payload, campaign_id)
+        return
+
+    path = _document_path(key)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w") as f:
+        f.write(payload)
+    os.replace(tmp_path, path)
+
+def _evict_overflow():
+    """
+    Drop least recently used clean entries beyond CACHE_MAX_ENTRIES.
+    Dirty entries stay until the next flush makes them evictable.
+    """
+    overflow = len(_cache) - CACHE_MAX_ENTRIES
+    if overflow <= 0:
+        return
+    for key in [k for k in _cache if k not in _dirty][:overflow]:
+        del _cache[key]
+
+def load_json(user_id: int, filename: str, default=None, campaign_id: str = None):
+    """
+    Returns the cached object when available. The same object is shared by
+    every caller, so anyone mutating it must call save_json afterwards.
+    """
+    key = _cache_key(user_id, filename, campaign_id)
+    if not CACHE_ENABLED:
+        return _read_file(key, default)
+
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+
+        missing = object()
+        data = _read_file(key, missing)
+        if data is missing:
+            return default
+
+        _cache[key] = data
+        _evict_overflow()
+        return data
+
 def save_json(user_id: int, filename: str, data, campaign_id: str = None):
-    with open(get_file_path(user_id, filename, campaign_id), "w") as f:
-        json.dump(data, f, indent=4)
+    key = _cache_key(user_id, filename, campaign_id)
+    if not CACHE_ENABLED:
+        _write_file(key, json.dumps(data, indent=4))
+        return
+
+    with _cache_lock:
+        _cache[key] = data
+        _cache.move_to_end(key)
+        _dirty.add(key)
+        _evict_overflow()
+
+def flush_cache():
+    """Write every dirty cache entry to disk. Returns how many files were written."""
+    with _flush_lock:
+        with _cache_lock:
+            pending = []
+            for key in list(_dirty):
+                if key not in _cache:
+                    _dirty.discard(key)
+                    continue
+                # Callers mutate the shared objects without this lock, so one entry
+                # may fail mid-dump; it must not stop the others from being written
+                try:
+                    pending.append((key, json.dumps(_cache[key], indent=4)))
+                except RuntimeError as e:
+                    print(f"WARN: {key} changed while flushing, retrying next flush: {e}")
+                    continue
+                except (TypeError, ValueError) as e:
+                    print(f"ERROR: Dropping unserializable cache entry {key}: {e}")
+                    _cache.pop(key, None)
+                _dirty.discard(key)
+
+        for key, payload in pending:
+            try:
+                _write_file(key, payload)
+            except Exception as e:
+                print(f"ERROR: Failed to flush {key}: {e}")
+                with _cache_lock:
+                    _dirty.add(key)
+        with _cache_lock:
+            _evict_overflow()
+        return len(pending)
+
+def _flusher_loop():
+    while not _flusher_stop.wait(CACHE_FLUSH_INTERVAL):
+        try:
+            flush_cache()
+        except Exception as e:
+            print(f"ERROR: Cache flush failed: {e}")
+
+def start_cache_flusher():
+    """Start the background thread that periodically flushes dirty entries"""
+    global _flusher_thread
+    if not CACHE_ENABLED or (_flusher_thread and _flusher_thread.is_alive()):
+        return
+    _flusher_stop.clear()
+    _flusher_thread = threading.Thread(target=_flusher_loop, name="storage-flusher", daemon=True)
+    _flusher_thread.start()
+
+def stop_cache_flusher():
+    """Stop the flusher thread and write any pending changes"""
+    _flusher_stop.set()
+    if _flusher_thread:
+        _flusher_thread.join(timeout=CACHE_FLUSH_INTERVAL + 1)
+    flush_cache()
+
+atexit.register(flush_cache)
 
 def delete_file(user_id: int, filename: str, campaign_id: str = None):
-    path = get_file_path(user_id, filename, campaign_id)
-    if path.exists():
-        path.unlink()
-        
+    key = _cache_key(user_id, filename, campaign_id)
+    with _flush_lock:
+        with _cache_lock:
+            _cache.pop(key, None)
+            _dirty.discard(key)
+        if _use_sqlite():
+            _get_sqlite().delete_document(key[0], filename, campaign_id)
+            return
+        path = _document_path(key)
+        if path.exists():
+            path.unlink()
+
 def reset_history(user_id: int, campaign_id: str = None):
-    save_json(user_id, "history.json", [], campaign_id)
+    from .history import clear_history
+    clear_history(user_id, campaign_id)
+
+# --- Append-only record logs (JSONL) ---
+# One JSON document per line: appends never rewrite old data and the tail
+# can be read without parsing the whole file.
+# A log may also have sealed segments (listed in <stem>.segments.json):
+# earlier parts of the log frozen by seal_records. Segments are never written
+# again, so forked campaigns share them as hardlinks instead of copies; only
+# the live file (the newest records) is appended to.
+
+TAIL_BLOCK_SIZE = 8192
+
+# Records in each live log file (path -> count): counted once per process,
+# then kept up to date by append_records, so counting a log does not read it
+_record_counts = {}
+
+def _parse_lines(lines) -> list:
+    records = []
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            records.append(json.loads(line))
+        except ValueError:
+            # Torn line from an interrupted append, skip it
+            print(f"WARN: Skipping corrupted log line ({len(line)} bytes)")
+    return records
+
+def _segments_key(key: tuple) -> tuple:
+    user_id, campaign_id, filename = key
+    return (user_id, campaign_id, Path(filename).stem + ".segments.json")
+
+def _load_segments(key: tuple) -> list:
+    """[{"file": name, "count": records or None}, ...] oldest first"""
+    user_id, campaign_id, filename = _segments_key(key)
+    return load_json(user_id, filename, default=[], campaign_id=campaign_id)
+
+def _save_segments(key: tuple, segments: list):
+    # Written through, not behind: the list must match the files on disk
+    skey = _segments_key(key)
+    with _flush_lock:
+        with _cache_lock:
+            _cache[skey] = segments
+            _dirty.discard(skey)
+        _write_file(skey, json.dumps(segments, indent=4))
+
+def _segment_paths(key: tuple) -> list:
+    folder = _document_path(key).parent
+    return [folder / segment["file"] for segment in _load_segments(key)]
+
+def append_records(user_id: int, filename: str, records: list, campaign_id: str = None):
+    if not records:
+        return
+    if _use_sqlite():
+        return _get_sqlite().append_records(user_id, filename, records, campaign_id)
+    payload = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records).encode("utf-8")
+    path = _document_path(_cache_key(user_id, filename, campaign_id))
+    with open(path, "a+b") as f:
+        # Terminate a torn last line so it doesn't swallow the new record
+        if f.seek(0, os.SEEK_END) > 0:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                payload = b"\n" + payload
+        f.write(payload)
+    with _cache_lock:
+        if path in _record_counts:
+            _record_counts[path] += len(records)
+
+def _live_count(path: Path) -> int:
+    with _cache_lock:
+        if path not in _record_counts:
+            _record_counts[path] = _count_file(path)
+        return _record_counts[path]
+
+def _forget_count(path: Path):
+    with _cache_lock:
+        _record_counts.pop(path, None)
+
+def read_records(user_id: int, filename: str, campaign_id: str = None) -> list:
+    if _use_sqlite():
+        return _get_sqlite().read_records(user_id, filename, campaign_id)
+    key = _cache_key(user_id, filename, campaign_id)
+    records = []
+    for path in _segment_paths(key) + [_document_path(key)]:
+        if path.exists():
+            with open(path, "rb") as f:
+                records.extend(_parse_lines(f.read().splitlines()))
+    return records
+
+def _tail_file(path: Path, limit: int, skip: int = 0) -> list:
+    if limit <= 0 or not path.exists():
+        return []
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        pos = f.tell()
+        buffer = b""
+        # Stop once we hold more than `limit + skip` newlines: those last lines are then complete
+        while pos > 0 and buffer.count(b"\n") <= limit + skip:
+            step = min(TAIL_BLOCK_SIZE, pos)
+            pos -= step
+            f.seek(pos)
+            buffer = f.read(step) + buffer
+
+    lines = buffer.splitlines()
+    end = max(len(lines) - skip, 0)
+    return _parse_lines(lines[max(end - limit, 0):end])
+
+def tail_records(user_id: int, filename: str, limit: int, campaign_id: str = None, skip: int = 0) -> list:
+    """
+    Return the last `limit` records before the `skip` newest ones, reading the
+    file backwards block by block (only the records returned are parsed)
+    """
+    if _use_sqlite():
+        return _get_sqlite().tail_records(user_id, filename, limit, campaign_id, skip) if limit > 0 else []
+    key = _cache_key(user_id, filename, campaign_id)
+    if skip <= 0:
+        records = _tail_file(_document_path(key), limit)
+        # Older records continue in the sealed segments, newest segment first
+        for path in reversed(_segment_paths(key)):
+            if len(records) >= limit:
+                break
+            records = _tail_file(path, limit - len(records)) + records
+        return records
+
+    # Skip whole files by their record counts, then read from the one the page starts in
+    folder = _document_path(key).parent
+    files = [(folder / s["file"], s["count"]) for s in _counted_segments(key)]
+    files.append((_document_path(key), _live_count(_document_path(key))))
+    records = []
+    for path, count in reversed(files):
+        if len(records) >= limit:
+            break
+        if skip >= count:
+            skip -= count
+            continue
+        records = _tail_file(path, min(limit - len(records), count - skip), skip) + records
+        skip = 0
+    return records
+
+def _count_file(path: Path) -> int:
+    if not path.exists():
+        return 0
+    count = 0
+    last = b"\n"
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(1 << 20)
+            if not block:
+                break
+            count += block.count(b"\n")
+            last = block[-1:]
+    # A last line without its newline is still a record
+    return count + (last != b"\n")
+
+def _counted_segments(key: tuple) -> list:
+    segments = _load_segments(key)
+    # Segment sizes never change: counted once, then kept in the segment list
+    if any(segment["count"] is None for segment in segments):
+        folder = _document_path(key).parent
+        segments = [dict(s, count=_count_file(folder / s["file"]) if s["count"] is None else s["count"]) for s in segments]
+        _save_segments(key, segments)
+    return segments
+
+def count_records(user_id: int, filename: str, campaign_id: str = None) -> int:
+    """Number of records in the log, counted without parsing them"""
+    if _use_sqlite():
+        return _get_sqlite().count_records(user_id, filename, campaign_id)
+    key = _cache_key(user_id, filename, campaign_id)
+    return sum(segment["count"] for segment in _counted_segments(key)) + _live_count(_document_path(key))
+
+def has_records(user_id: int, filename: str, campaign_id: str = None) -> bool:
+    if _use_sqlite():
+        return _get_sqlite().has_records(user_id, filename, campaign_id)
+    key = _cache_key(user_id, filename, campaign_id)
+    path = _document_path(key)
+    return bool(_load_segments(key)) or (path.exists() and path.stat().st_size > 0)
+
+def clear_records(user_id: int, filename: str, campaign_id: str = None):
+    if _use_sqlite():
+        return _get_sqlite().clear_records(user_id, filename, campaign_id)
+    key = _cache_key(user_id, filename, campaign_id)
+    segment_paths = _segment_paths(key)
+    # Only this log's links go away; forks sharing a segment keep theirs
+    for path in segment_paths + [_document_path(key)]:
+        if path.exists():
+            path.unlink()
+    _forget_count(_document_path(key))
+    if segment_paths:
+        # Not delete_file: compaction clears its journal while holding _flush_lock
+        skey = _segments_key(key)
+        with _cache_lock:
+            _cache.pop(skey, None)
+        _document_path(skey).unlink(missing_ok=True)
+
+def seal_records(user_id: int, filename: str, campaign_id: str = None) -> list:
+    """
+    Freeze the live log into an immutable segment (a rename, whatever its
+    size) and return the segment list. New records go to a fresh live file.
+    """
+    key = _cache_key(user_id, filename, campaign_id)
+    path = _document_path(key)
+    segments = list(_load_segments(key))
+    if path.exists() and path.stat().st_size > 0:
+        # Unique names: segments of different campaigns meet in one folder after a fork
+        name = f"{path.stem}.{uuid.uuid4().hex[:12]}.seg{path.suffix}"
+        segments.append({"file": name, "count": None})
+        # The list is written first: after a crash in between the records are still in the live file
+        _save_segments(key, segments)
+        os.replace(path, path.with_name(name))
+        _forget_count(path)
+    return segments
+
+def _link_or_copy(source: Path, target: Path):
+    try:
+        os.link(source, target)
+    except OSError:
+        # No hardlinks here (other filesystem, FAT...): fall back to a copy
+        shutil.copyfile(source, target)
+
+def fork_records(user_id: int, filename: str, campaign_id: str, target_campaign_id: str):
+    """
+    Give `target_campaign_id` the same log as `campaign_id`, replacing its own.
+    The source is sealed and its segments are hardlinked into the target, so
+    the cost does not depend on the length of the log.
+    """
+    if _use_sqlite():
+        return _get_sqlite().copy_records(user_id, filename, campaign_id, target_campaign_id)
+    segments = seal_records(user_id, filename, campaign_id)
+    clear_records(user_id, filename, target_campaign_id)
+    key = _cache_key(user_id, filename, campaign_id)
+    target_key = _cache_key(user_id, filename, target_campaign_id)
+    source_dir, target_dir = _document_path(key).parent, _document_path(target_key).parent
+    shared = []
+    for segment in segments:
+        if (source_dir / segment["file"]).exists():
+            _link_or_copy(source_dir / segment["file"], target_dir / segment["file"])
+            shared.append(dict(segment))
+    _save_segments(target_key, shared)
 
 def delete_campaign_folder(user_id: int, campaign_id: str):
-    path = get_campaign_dir(user_id, campaign_id)
-    if path.exists():
-        shutil.rmtree(path)
+    with _flush_lock:
+        with _cache_lock:
+            for key in [k for k in _cache if k[0] == str(user_id) and k[1] == campaign_id]:
+                _cache.pop(key, None)
+                _dirty.discard(key)
+        if _use_sqlite():
+            _get_sqlite().delete_campaign(user_id, campaign_id)
+        path = get_user_dir(user_id) / "campaigns" / campaign_id
+        with _cache_lock:
+            for counted in [p for p in _record_counts if p.parent == path]:
+                del _record_counts[counted]
+        if path.exists():
+            shutil.rmtree(path)
+
+# --- Shared keyed collections (users, sessions) ---
+# JSON backend: data/<collection>.json snapshot plus an append-only
+# data/<collection>.journal.jsonl of put/delete operations, so a write is one
+# small append. The journal is folded back into the snapshot every
+# COLLECTION_COMPACT_EVERY operations.
+# SQLite backend: one row per key, so a put/delete only touches that row.
+
+COLLECTION_COMPACT_EVERY = int(os.getenv("STORAGE_COLLECTION_COMPACT_EVERY", "500"))
+
+_collections = {}  # collection -> dict with the journal already replayed
+_journal_sizes = {}
+
+def _journal_name(collection: str) -> str:
+    return f"{collection}.journal.jsonl"
+
+def _load_collection_locked(collection: str) -> dict:
+    if collection not in _collections:
+        records = _read_file((None, None, f"{collection}.json"), default={})
+        if not isinstance(records, dict):
+            records = {}
+        ops = read_records(None, _journal_name(collection))
+        for op in ops:
+            if op.get("op") == "put":
+                records[op["key"]] = op["value"]
+            elif op.get("op") == "delete":
+                records.pop(op["key"], None)
+        _collections[collection] = records
+        _journal_sizes[collection] = len(ops)
+    return _collections[collection]
+
+def _append_journal(collection: str, ops: list):
+    with _flush_lock:
+        append_records(None, _journal_name(collection), ops)
+        _journal_sizes[collection] = _journal_sizes.get(collection, 0) + len(ops)
+        if _journal_sizes[collection] >= COLLECTION_COMPACT_EVERY:
+            compact_collection(collection)
+
+def compact_collection(collection: str):
+    """Rewrite the snapshot from memory and truncate the journal (JSON backend only)"""
+    if _use_sqlite():
+        return
+    with _cache_lock:
+        payload = json.dumps(_load_collection_locked(collection), indent=2, ensure_ascii=False)
+        _write_file((None, None, f"{collection}.json"), payload)
+        clear_records(None, _journal_name(collection))
+        _journal_sizes[collection] = 0
+
+def load_collection(collection: str) -> dict:
+    """All records of a collection. Treat the result as read-only; write through put_record."""
+    if _use_sqlite():
+        return _get_sqlite().load_collection(collection)
+    with _cache_lock:
+        return _load_collection_locked(collection)
+
+def get_record(collection: str, key: str):
+    if _use_sqlite():
+        return _get_sqlite().get_record(collection, key)
+    return load_collection(collection).get(str(key))
+
+def put_record(collection: str, key: str, value):
+    put_records(collection, {key: value})
+
+def put_records(collection: str, items: dict):
+    if not items:
+        return
+    if _use_sqlite():
+        return _get_sqlite().put_records(collection, items)
+    with _cache_lock:
+        _load_collection_locked(collection).update({str(k): v for k, v in items.items()})
+    _append_journal(collection, [{"op": "put", "key": str(k), "value": v} for k, v in items.items()])
+
+def delete_records(collection: str, keys: list):
+    if not keys:
+        return
+    if _use_sqlite():
+        return _get_sqlite().delete_records(collection, keys)
+    with _cache_lock:
+        records = _load_collection_locked(collection)
+        for key in keys:
+            records.pop(str(key), None)
+    _append_journal(collection, [{"op": "delete", "key": str(k)} for k in keys])
@@ -0,0 +1,73 @@
+
+# Microbenchmark: narrative event extraction + reply cleanup, previous regex
+# backups vs. core.events, on replies of growing length.
+# Usage: python tests/bench_event_extractor.py
+
+import sys
+import os
+import re
+import timeit
+
+# Add src to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from core.events import extract_events, clean_reply
+
+EVENTS = (
+    "Você derrota o goblin e encontra uma Espada Curta. Ele revida e você levou 4 pontos de dano. "
+    "Gasta 1 slot de Nível 1 para conjurar Mísseis Mágicos. Você aprende a magia Bola de Fogo.\n"
+)
+FILLER = (
+    "O vento sopra entre as árvores enquanto sombras se movem ao longe, e o silêncio pesa sobre a trilha "
+    "que leva às ruínas da antiga fortaleza. "
+)
+TAIL = '\nSegue o JSON atualizado:\n```json\n{"inventario": {"ouro": 15, "vida_atual": 20}}\n```'
+
+def legacy(user_message: str, assistant_message: str):
+    """The per-turn passes of the previous _finish_turn, reduced to what they found"""
+    resposta_limpa = re.sub(r"```(?:json)?\s*\{.*?\}\s*```", "", assistant_message, flags=re.DOTALL)
+    resposta_limpa = re.sub(r"```.*?```", "", resposta_limpa, flags=re.DOTALL)
+    resposta_limpa = re.sub(r"(?i)\n*(O JSON .*|Segue o JSON .*|Status atualizado.*|JSON de inventário.*|Atualização de estado:.*):?.*", "", resposta_limpa)
+
+    found = []
+    rest_keywords = ["descanso longo", "long rest", "fazer um descanso", "vou descansar", "descansou", "acampou"]
+    if any(k in user_message.lower() for k in rest_keywords) or any(k in assistant_message.lower() for k in rest_keywords):
+        found.append(("rest",))
+    spell_cast_match = re.search(r"gasta\s+(\d+)\s+slot.*?n[ií]vel\s+(\d+)", assistant_message.lower())
+    if spell_cast_match:
+        found.append(("slot_used", int(spell_cast_match.group(1)), spell_cast_match.group(2)))
+    damage_match = re.search(r"levou?\s+(\d+)\s+pontos?\s+de\s+dano", assistant_message.lower())
+    hp_match = re.search(r"vida\s+atual.*?(\d+)", assistant_message.lower())
+    if damage_match:
+        found.append(("damage", int(damage_match.group(1))))
+    elif hp_match and "agora" in assistant_message.lower():
+        found.append(("hp_set", int(hp_match.group(1))))
+    for name in re.findall(r"(?:recebe|adquire|ganha|pega|encontra)\s+(?:um|uma|o|a)?\s*([A-ZÀ-Ú][a-zA-ZÀ-Ú\s]+?)(?:[\.,]|$)", assistant_message):
+        found.append(("item_gained", name.strip()))
+    for name in re.findall(r"(?:aprende|recebe|descobre)\s+(?:a magia|o feitiço)\s*([A-ZÀ-Ú][a-zA-ZÀ-Ú\s]+?)(?:[\.,]|$)", assistant_message):
+        found.append(("spell_learned", name.strip()))
+    return resposta_limpa, found
+
+def current(user_message: str, assistant_message: str):
+    found = []
+    for event in extract_events(assistant_message, user_message):
+        if event["type"] == "slot_used":
+            found.append((event["type"], event["amount"], event["level"]))
+        elif event["type"] in ("damage", "hp_set"):
+            found.append((event["type"], event.get("amount", event.get("value"))))
+        elif event["type"] in ("item_gained", "spell_learned"):
+            found.append((event["type"], event["name"]))
+        else:
+            found.append((event["type"],))
+    return clean_reply(assistant_message), found
+
+if __name__ == "__main__":
+    print(f"{'reply chars':>12} {'legacy (us)':>12} {'events (us)':>12} {'speedup':>8}")
+    for paragraphs in (2, 10, 40, 160):
+        reply = FILLER * paragraphs + EVENTS + FILLER * paragraphs + TAIL
+        assert legacy("Ataco", reply) == current("Ataco", reply), "Extractors disagree"
+
+        runs = 200
+        old = timeit.timeit(lambda: legacy("Ataco", reply), number=runs) / runs * 1e6
+        new = timeit.timeit(lambda: current("Ataco", reply), number=runs) / runs * 1e6
+        print(f"{len(reply):>12} {old:>12.1f} {new:>12.1f} {old / new:>7.1f}x")
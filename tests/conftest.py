@@ -0,0 +1,54 @@
+import sys
+import os
+import tempfile
+import contextlib
+from pathlib import Path
+
+import pytest
+
+# Add src to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from core import storage, history, campaigns, sessions, auth, context
+
+def reset_state(data_dir: Path):
+    """
+    Write what the storage cache still holds, drop every in-process cache
+    built from storage (documents, collections, indexes) and point storage
+    at `data_dir`.
+    """
+    storage.flush_cache()
+    storage._cache.clear()
+    storage._dirty.clear()
+    storage._collections.clear()
+    storage._journal_sizes.clear()
+    storage._record_counts.clear()
+    history._migrated.clear()
+    history._projected.clear()
+    campaigns._indexes.clear()
+    campaigns._pending_activity.clear()
+    sessions._session_cache = None
+    sessions._user_tokens.clear()
+    auth._indexes_ready = False
+    auth._by_username.clear()
+    auth._by_email.clear()
+    auth._profiles.clear()
+    auth._max_user_id = 0
+    context._last_stats.clear()
+    storage.DATA_DIR = Path(data_dir)
+
+@contextlib.contextmanager
+def temp_data_dir(path: Path = None):
+    """Run with storage in an empty directory (a new temp dir by default), then restore the previous one"""
+    previous = storage.DATA_DIR
+    reset_state(path or Path(tempfile.mkdtemp()))
+    try:
+        yield storage.DATA_DIR
+    finally:
+        reset_state(previous)
+
+@pytest.fixture(autouse=True)
+def data_dir(tmp_path):
+    """Every test starts from its own empty data directory; the real one is never touched"""
+    with temp_data_dir(tmp_path) as path:
+        yield path
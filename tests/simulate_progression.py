@@ -0,0 +1,44 @@
+
+# XP balancing: run a population of characters per game mode through random
+# reward streams and report how fast they level. Edit MODES to try rewards.
+# Usage: python tests/simulate_progression.py   (needs numpy)
+
+import sys
+import os
+
+# Add src to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from core import progression
+from core.progression import simulate_progression, turns_to_level
+
+CHARACTERS = 5000
+TURNS = 300
+
+# mode -> (chance a turn gives XP, min XP, max XP)
+MODES = {
+    "narrativo": (0.30, 20, 60),
+    "dados": (0.40, 20, 80),
+    "dnd5e": (0.35, 25, 100),
+}
+
+if __name__ == "__main__":
+    np = progression.np
+    if np is None:
+        print("NumPy not installed: pip install numpy")
+        sys.exit(1)
+
+    rng = np.random.default_rng(0)
+    print(f"{'mode':>10} {'lvl@50':>7} {'lvl@150':>8} {'lvl@300':>8} {'turns->5':>9} {'turns->10':>10} {'max PV':>7}")
+    for mode, (chance, low, high) in MODES.items():
+        rewards = rng.integers(low, high + 1, size=(CHARACTERS, TURNS)) * (rng.random((CHARACTERS, TURNS)) < chance)
+        result = simulate_progression(rewards)
+        niveis = result["nivel"]
+
+        def median_turns(level):
+            turns = turns_to_level(niveis, level)
+            turns = turns[turns > 0]
+            return f"{int(np.median(turns))}" if len(turns) else "-"
+
+        print(f"{mode:>10} {niveis[:, 49].mean():>7.1f} {niveis[:, 149].mean():>8.1f} {niveis[:, -1].mean():>8.1f} "
+              f"{median_turns(5):>9} {median_turns(10):>10} {int(result['vida_maxima'].mean()):>7}")
@@ -0,0 +1,109 @@
+
+import sys
+import os
+import io
+import contextlib
+
+# Add src to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from core import storage
+from core import auth
+
+auth.BCRYPT_ROUNDS = 4 # Keep tests fast
+
+def test_register_and_login():
+    print("--- Test 1: Register / login via indexes ---")
+    user = auth.create_user("Aria", "aria@example.com", "segredo")
+    assert user == {"user_id": "1", "username": "Aria", "email": "aria@example.com"}
+
+    assert auth.authenticate_user("ARIA", "segredo")["user_id"] == "1"
+    try:
+        auth.authenticate_user("aria", "errada")
+        assert False, "Wrong password accepted"
+    except ValueError as e:
+        assert str(e) == "Invalid password"
+
+    hashed = []
+    original_hash = auth.hash_password
+    auth.hash_password = lambda password: hashed.append(password) or original_hash(password)
+    try:
+        for username, email in [("aRiA", "outro@example.com"), ("Bran", "ARIA@example.com")]:
+            try:
+                auth.create_user(username, email, "x")
+                assert False, "Duplicate accepted"
+            except ValueError:
+                pass
+    finally:
+        auth.hash_password = original_hash
+    assert hashed == [], "Duplicates must be rejected before hashing"
+
+    profile = auth.get_user_by_id("1")
+    assert "password_hash" not in profile
+    print("Test 1 Passed: Case-insensitive lookups, no hash in profile")
+
+def test_id_allocator_skips_gaps():
+    print("\n--- Test 2: IDs never collide after deletions ---")
+    # Legacy data where user "2" was deleted: len(users) + 1 would return "3" again
+    storage.put_records("users", {
+        "1": {"username": "a", "email": "a@x.com", "password_hash": "-"},
+        "3": {"username": "c", "email": "c@x.com", "password_hash": "-"},
+    })
+    assert auth.create_user("d", "d@x.com", "x")["user_id"] == "4"
+    print("Test 2 Passed: Allocated 4")
+
+def test_pool_and_rehash():
+    print("\n--- Test 3: Pool execution and rehash on cost change ---")
+    auth.create_user("Aria", "aria@example.com", "segredo")
+    assert auth._hash_rounds(storage.get_record("users", "1")["password_hash"]) == 4
+
+    auth.BCRYPT_ROUNDS = 5
+    old_every = auth.PASSWORD_HASH_STATS_LOG_EVERY
+    auth.PASSWORD_HASH_STATS_LOG_EVERY = 1
+    logged = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(logged):
+            future = auth.run_password_task(auth.authenticate_user, "aria", "segredo")
+            assert future.result(timeout=10)["user_id"] == "1"
+    finally:
+        auth.PASSWORD_HASH_STATS_LOG_EVERY = old_every
+        auth.BCRYPT_ROUNDS = 4
+    assert "INFO: Password pool:" in logged.getvalue() and "rehashed" in logged.getvalue()
+    assert auth._hash_rounds(storage.get_record("users", "1")["password_hash"]) == 5
+
+    stats = auth.get_password_hash_stats()
+    assert stats["tasks"] >= 1 and stats["rehashed"] >= 1
+    print(f"Test 3 Passed: {stats}")
+
+def test_users_from_other_workers():
+    print("\n--- Test 4: Users registered by another worker can log in and keep their name ---")
+    auth.create_user("Aria", "aria@example.com", "segredo")
+    # Written straight to storage, as another worker process would
+    storage.put_record("users", "2", {
+        "username": "Bran", "email": "bran@example.com",
+        "password_hash": auth.hash_password("corvo"), "created_at": "2024-01-01T00:00:00"
+    })
+
+    assert auth.authenticate_user("bran", "corvo")["user_id"] == "2"
+    storage.put_record("users", "3", {
+        "username": "Cora", "email": "cora@example.com",
+        "password_hash": auth.hash_password("x"), "created_at": "2024-01-01T00:00:00"
+    })
+    try:
+        auth.create_user("CORA", "outra@example.com", "y")
+        assert False, "Duplicate from another worker accepted"
+    except ValueError as e:
+        assert str(e) == "Username already exists"
+    assert auth.create_user("Dara", "dara@example.com", "z")["user_id"] == "4"
+    print("Test 4 Passed: Index misses fall back to storage")
+
+if __name__ == "__main__":
+    from conftest import temp_data_dir
+    try:
+        for test in (test_register_and_login, test_id_allocator_skips_gaps, test_pool_and_rehash, test_users_from_other_workers):
+            with temp_data_dir():
+                test()
+        print("\n[OK] All Tests Passed!")
+    except AssertionError as e:
+        print(f"\n[FAIL] Test Failed: {e}")
+        sys.exit(1)
@@ -0,0 +1,91 @@
+import sys
+import os
+import json
+
+# Add src to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from core import storage
+from core import campaigns
+
+def manifest_on_disk(user_id: int) -> list:
+    storage.flush_cache()
+    return json.loads((storage.DATA_DIR / str(user_id) / campaigns.MANIFEST_FILE).read_text(encoding="utf-8"))
+
+def test_activity_is_batched():
+    print("--- Test 1: Activity stays in memory until the flush ---")
+    cid = campaigns.create_campaign(1, "Aria - Fantasia", "Fantasia", "Mago", "dnd")
+    before = manifest_on_disk(1)[0]["last_played"]
+
+    saves = []
+    original = campaigns.save_json
+    campaigns.save_json = lambda *args, **kwargs: (saves.append(args[1]), original(*args, **kwargs))
+    try:
+        for _ in range(50):
+            campaigns.update_campaign_activity(1, cid)
+        assert saves == []
+        assert manifest_on_disk(1)[0]["last_played"] == before
+        # Reads already see the new timestamp
+        assert campaigns.get_campaign_details(1, cid)["last_played"] > before
+
+        assert campaigns.flush_campaign_activity() == 1
+        assert saves == [campaigns.MANIFEST_FILE]
+    finally:
+        campaigns.save_json = original
+    assert manifest_on_disk(1)[0]["last_played"] == campaigns.get_campaign_details(1, cid)["last_played"]
+    assert campaigns.flush_campaign_activity() == 0
+    print("Test 1 Passed: 50 turns, one manifest save")
+
+def test_pending_activity_survives_reload():
+    print("\n--- Test 2: Pending timestamps reapplied to a reloaded manifest ---")
+    cid = campaigns.create_campaign(2, "Bram - Horror", "Horror", "Ladino", "narrativo")
+    storage.flush_cache()
+    campaigns.update_campaign_activity(2, cid)
+    expected = campaigns.get_campaign_details(2, cid)["last_played"]
+
+    # Cache entry dropped (LRU eviction / restart of the cache): the reload lacks the timestamp
+    storage._cache.clear()
+    assert campaigns.get_campaign_details(2, cid)["last_played"] == expected
+    campaigns.flush_campaign_activity()
+    assert manifest_on_disk(2)[0]["last_played"] == expected
+    print("Test 2 Passed: Nothing lost when the manifest is reloaded")
+
+def test_index_follows_create_and_delete():
+    print("\n--- Test 3: Index kept in sync with create/delete ---")
+    ids = [campaigns.create_campaign(3, f"Camp {n}", "Tema", "Guerreiro", "narrativo") for n in range(20)]
+    assert [c["id"] for c in campaigns.get_campaigns(3)] == ids
+    assert campaigns.get_campaign_details(3, ids[7])["name"] == "Camp 7"
+
+    campaigns.update_campaign_activity(3, ids[5])
+    assert campaigns.delete_campaign(3, ids[5])
+    assert not campaigns.delete_campaign(3, ids[5])
+    assert campaigns.get_campaign_details(3, ids[5]) is None
+    assert ids[5] not in campaigns._pending_activity.get(3, {})
+    # Activity for a deleted or unknown campaign is ignored
+    campaigns.update_campaign_activity(3, ids[5])
+    campaigns.update_campaign_activity(3, "nope")
+    campaigns.flush_campaign_activity()
+    on_disk = [c["id"] for c in manifest_on_disk(3)]
+    assert on_disk == ids[:5] + ids[6:]
+    print("Test 3 Passed: O(1) lookups stay consistent")
+
+def test_flusher_thread_writes_on_stop():
+    print("\n--- Test 4: Stopping the flusher writes pending activity ---")
+    cid = campaigns.create_campaign(4, "Dara - Sci-fi", "Sci-fi", "Piloto", "narrativo")
+    campaigns.start_activity_flusher()
+    campaigns.update_campaign_activity(4, cid)
+    campaigns.stop_activity_flusher()
+    assert campaigns._pending_activity == {}
+    assert manifest_on_disk(4)[0]["last_played"] == campaigns.get_campaign_details(4, cid)["last_played"]
+    print("Test 4 Passed: Shutdown flush")
+
+if __name__ == "__main__":
+    from conftest import temp_data_dir
+    try:
+        for test in (test_activity_is_batched, test_pending_activity_survives_reload, test_index_follows_create_and_delete, test_flusher_thread_writes_on_stop):
+            with temp_data_dir():
+                test()
+        print("\n[OK] All Tests Passed!")
+    except AssertionError as e:
+        print(f"\n[FAIL] Test Failed: {e}")
+        sys.exit(1)
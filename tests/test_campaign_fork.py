@@ -0,0 +1,101 @@
+import sys
+import os
+
+# Add src to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from core import storage
+from core import history
+from core import campaigns
+from core.player import load_player, save_player
+
+def new_campaign(user_id: int, messages: int) -> str:
+    cid = campaigns.create_campaign(user_id, "Aria - Fantasia", "Fantasia", "Mago", "dnd")
+    save_player(user_id, {"nome": "Aria", "nivel": 2, "inventario": {"ouro": 10, "itens": []}}, campaign_id=cid)
+    history.append_messages(user_id, cid, [{"role": "user", "content": f"Mensagem {i}"} for i in range(messages)])
+    return cid
+
+def test_fork_shares_segments_and_diverges():
+    print("--- Test 1: Fork shares the sealed log, then both histories diverge ---")
+    cid = new_campaign(1, 200)
+    fork_id = campaigns.fork_campaign(1, cid)
+    assert fork_id and fork_id != cid
+    assert campaigns.get_campaign_details(1, fork_id)["forked_from"] == cid
+
+    # The sealed segment is the same file (hardlink) in both folders, nothing was copied
+    source_dir = storage.get_campaign_dir(1, cid)
+    fork_dir = storage.get_campaign_dir(1, fork_id)
+    segments = list(source_dir.glob("history.*.seg.jsonl"))
+    assert len(segments) == 1
+    shared = fork_dir / segments[0].name
+    assert shared.exists() and os.path.samefile(segments[0], shared)
+
+    history.append_messages(1, cid, [{"role": "user", "content": "Porta da esquerda"}])
+    history.append_messages(1, fork_id, [{"role": "user", "content": "Porta da direita"}])
+    assert history.count_history(1, cid) == history.count_history(1, fork_id) == 201
+    assert history.tail_history(1, cid, 2)[-1]["content"] == "Porta da esquerda"
+    assert history.tail_history(1, fork_id, 2)[-1]["content"] == "Porta da direita"
+    assert [m["content"] for m in history.tail_history(1, fork_id, 3)[:2]] == ["Mensagem 198", "Mensagem 199"]
+    assert history.load_history(1, fork_id)[0]["content"] == "Mensagem 0"
+    assert history.page_display_history(1, fork_id, 1)["messages"][0]["content"] == "Porta da direita"
+    assert history.page_display_history(1, cid, 1)["total"] == 201
+    print("Test 1 Passed: One shared segment, separate live logs")
+
+def test_fork_copies_player():
+    print("\n--- Test 2: The fork gets its own player ---")
+    cid = new_campaign(2, 5)
+    fork_id = campaigns.fork_campaign(2, cid, name="E se...")
+    assert campaigns.get_campaign_details(2, fork_id)["name"] == "E se..."
+
+    player = load_player(2, fork_id)
+    assert player["nivel"] == 2
+    player["inventario"]["ouro"] = 999
+    save_player(2, player, campaign_id=fork_id)
+    assert load_player(2, cid)["inventario"]["ouro"] == 10
+    print("Test 2 Passed: Changing the fork leaves the original alone")
+
+def test_fork_after_fork_and_delete():
+    print("\n--- Test 3: Forks of forks; deleting one keeps the others readable ---")
+    cid = new_campaign(3, 50)
+    first = campaigns.fork_campaign(3, cid)
+    history.append_messages(3, first, [{"role": "user", "content": "Ramo 1"}])
+    second = campaigns.fork_campaign(3, first)
+    assert history.count_history(3, second) == 51
+
+    assert campaigns.delete_campaign(3, cid)
+    assert campaigns.delete_campaign(3, first)
+    assert len(history.load_history(3, second)) == 51
+    assert history.tail_history(3, second, 1)[0]["content"] == "Ramo 1"
+    print("Test 3 Passed: Segments live as long as one campaign links them")
+
+def test_save_point_restore():
+    print("\n--- Test 4: Save point restores history and player ---")
+    cid = new_campaign(4, 10)
+    save_point = campaigns.fork_campaign(4, cid, save_point=True)
+    assert [c["id"] for c in campaigns.list_campaigns(4)["campaigns"]] == [cid]
+    assert [c["id"] for c in campaigns.list_save_points(4, cid)] == [save_point]
+
+    history.append_messages(4, cid, [{"role": "user", "content": "Erro fatal"}])
+    player = load_player(4, cid)
+    player["nivel"] = 9
+    save_player(4, player, campaign_id=cid)
+
+    assert campaigns.restore_save_point(4, cid, save_point)
+    assert history.count_history(4, cid) == 10
+    assert load_player(4, cid)["nivel"] == 2
+    assert not campaigns.restore_save_point(4, cid, "nope")
+
+    campaigns.delete_campaign(4, cid)
+    assert campaigns.get_campaign_details(4, save_point) is None
+    print("Test 4 Passed: Back to the save point")
+
+if __name__ == "__main__":
+    from conftest import temp_data_dir
+    try:
+        for test in (test_fork_shares_segments_and_diverges, test_fork_copies_player, test_fork_after_fork_and_delete, test_save_point_restore):
+            with temp_data_dir():
+                test()
+        print("\n[OK] All Tests Passed!")
+    except AssertionError as e:
+        print(f"\n[FAIL] Test Failed: {e}")
+        sys.exit(1)
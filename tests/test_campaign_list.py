@@ -0,0 +1,86 @@
+import sys
+import os
+
+# Add src to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from core import storage
+from core import campaigns
+
+def test_summary_updated_per_turn():
+    print("--- Test 1: Summary updated incrementally at the end of a turn ---")
+    cid = campaigns.create_campaign(1, "Aria - Fantasia", "Fantasia", "Mago", "dnd")
+    player = {"nivel": 3, "inventario": {"vida_atual": 18, "vida_maxima": 24}}
+    campaigns.record_campaign_turn(1, cid, player, "Você entra na taverna.\n\nO taverneiro acena.", tokens=900)
+    player["inventario"]["vida_atual"] = 12
+    campaigns.record_campaign_turn(1, cid, player, "x" * 500, tokens=1100)
+
+    summary = campaigns.get_campaign_details(1, cid)["summary"]
+    assert summary["turnos"] == 2
+    assert summary["tokens"] == 2000
+    assert summary["nivel"] == 3
+    assert (summary["vida_atual"], summary["vida_maxima"]) == (12, 24)
+    assert len(summary["ultima_mensagem"]) == campaigns.PREVIEW_LENGTH
+    assert summary["ultima_mensagem"].endswith("…")
+
+    # Batched with the activity: one flush writes it
+    assert campaigns.flush_campaign_activity() == 1
+    storage.flush_cache()
+    storage._cache.clear()
+    campaigns._indexes.clear()
+    assert campaigns.get_campaign_details(1, cid)["summary"]["turnos"] == 2
+    print("Test 1 Passed: Level, HP, turns, tokens and preview kept in the manifest")
+
+def test_sort_and_cursor_pages():
+    print("\n--- Test 2: Server-side sort and cursor pagination ---")
+    ids = []
+    for n in range(7):
+        cid = campaigns.create_campaign(2, f"Camp {n}", "Tema", "Guerreiro", "narrativo")
+        campaigns.record_campaign_turn(2, cid, {"nivel": n % 3}, "ok")
+        ids.append(cid)
+
+    by_recent = campaigns.list_campaigns(2)
+    assert by_recent["total"] == 7 and by_recent["next_cursor"] is None
+    assert [c["id"] for c in by_recent["campaigns"]] == ids[::-1]
+
+    seen = []
+    cursor = None
+    while True:
+        page = campaigns.list_campaigns(2, sort="nivel", order="asc", limit=3, cursor=cursor)
+        assert len(page["campaigns"]) <= 3
+        seen.extend(page["campaigns"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert sorted(c["id"] for c in seen) == sorted(ids)
+    niveis = [c["summary"]["nivel"] for c in seen]
+    assert niveis == sorted(niveis)
+
+    # A campaign created mid-pagination does not shift the pages already read
+    first = campaigns.list_campaigns(2, sort="name", order="asc", limit=4)
+    campaigns.create_campaign(2, "Aaa", "Tema", "Guerreiro", "narrativo")
+    rest = campaigns.list_campaigns(2, sort="name", order="asc", limit=10, cursor=first["next_cursor"])
+    assert [c["name"] for c in rest["campaigns"]] == ["Camp 4", "Camp 5", "Camp 6"]
+    print("Test 2 Passed: Every campaign exactly once, in order")
+
+def test_invalid_arguments():
+    print("\n--- Test 3: Invalid sort / cursor rejected ---")
+    campaigns.create_campaign(3, "Camp", "Tema", "Guerreiro", "narrativo")
+    for kwargs in ({"sort": "senha"}, {"order": "up"}, {"limit": 0}, {"cursor": "%%%"}):
+        try:
+            campaigns.list_campaigns(3, **kwargs)
+            assert False, f"{kwargs} should fail"
+        except ValueError:
+            pass
+    print("Test 3 Passed: ValueError for bad input")
+
+if __name__ == "__main__":
+    from conftest import temp_data_dir
+    try:
+        for test in (test_summary_updated_per_turn, test_sort_and_cursor_pages, test_invalid_arguments):
+            with temp_data_dir():
+                test()
+        print("\n[OK] All Tests Passed!")
+    except AssertionError as e:
+        print(f"\n[FAIL] Test Failed: {e}")
+        sys.exit(1)
@@ -0,0 +1,65 @@
+
+import sys
+import os
+import asyncio
+
+# Add src to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from core import chat
+
+REPLY = 'Você entra na taverna.\n```json\n{"hp_atual": 10}\n```'
+
+def run_stream(deltas):
+    async def fake_stream(messages, model=None, **kwargs):
+        for delta in deltas:
+            yield delta
+
+    finished = {}
+    def fake_finish(user_message, assistant_message, user_id, campaign_id, passive_msg=None, player=None, state_updates=None):
+        finished["raw"] = assistant_message
+        return "Você entra na taverna."
+
+    old = chat.stream_chat_completion, chat._prepare_turn, chat._finish_turn
+    chat.stream_chat_completion = fake_stream
+    chat._prepare_turn = lambda *args: (None, {"llm_messages": [], "passive_msg": None})
+    chat._finish_turn = fake_finish
+    try:
+        async def collect():
+            return [event async for event in chat.process_message_stream("olho ao redor", 1, "c1")]
+        return asyncio.run(collect()), finished
+    finally:
+        chat.stream_chat_completion, chat._prepare_turn, chat._finish_turn = old
+
+def test_state_block_not_streamed():
+    print("--- Test 1: The JSON state block never reaches the player ---")
+    # Split the reply so the fence arrives one backtick at a time
+    deltas = [REPLY[i:i + 3] for i in range(0, len(REPLY), 3)]
+    events, finished = run_stream(deltas)
+
+    streamed = "".join(data["text"] for name, data in events if name == "token")
+    assert streamed.strip() == "Você entra na taverna.", streamed
+    assert "`" not in streamed and "{" not in streamed
+    assert events[-1] == ("done", {"response": "Você entra na taverna."})
+    assert finished["raw"] == REPLY, "The full reply (with state block) must still be applied"
+    print("Test 1 Passed: Narrative streamed, state block held back")
+
+def test_bare_json_line_held_back():
+    print("\n--- Test 2: A bare JSON object on its own line is also held back ---")
+    end, held_back = chat._streamable_end('Você ganhou ouro.\n{"ouro": 5}', 0)
+    assert held_back and end == len("Você ganhou ouro.")
+
+    end, held_back = chat._streamable_end("Você ganhou ouro.\n", 0)
+    assert not held_back and end == len("Você ganhou ouro.")
+    print("Test 2 Passed: Trailing newline waits for the next delta")
+
+if __name__ == "__main__":
+    from conftest import temp_data_dir
+    try:
+        for test in (test_state_block_not_streamed, test_bare_json_line_held_back):
+            with temp_data_dir():
+                test()
+        print("\n[OK] All Tests Passed!")
+    except AssertionError as e:
+        print(f"\n[FAIL] Test Failed: {e}")
+        sys.exit(1)
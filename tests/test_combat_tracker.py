@@ -0,0 +1,84 @@
+
+import sys
+import os
+import copy
+import random
+
+# Add src to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from core import chat, dice
+from core.combat import apply_combat_patch, encounter_table, find_target, get_encounter
+from core.player import PlayerTransaction, apply_state_update, load_player, save_player
+
+def make_player():
+    return {
+        "nome": "Aria", "classe": "Guerreiro", "modo": "dnd5e", "nivel": 1,
+        "atributos": {"forca": 14, "destreza": 14},
+        "inventario": {"vida_atual": 20, "vida_maxima": 20, "itens": []},
+        "spell_slots": {}, "magias": [], "status": []
+    }
+
+def test_encounter_bookkeeping():
+    print("--- Test 1: Initiative order, HP and automatic end ---")
+    player = make_player()
+    messages = apply_combat_patch(player, {"iniciar": [{"nome": "Goblin", "vida": 7, "ca": 13, "quantidade": 2, "iniciativa": 2}]}, random.Random(5))
+    assert messages == ["⚔️ Combate iniciado!"]
+    combatants = get_encounter(player)["combatentes"]
+    assert sorted(c["nome"] for c in combatants) == ["Aria", "Goblin 1", "Goblin 2"]
+    assert [c["iniciativa"] for c in combatants] == sorted((c["iniciativa"] for c in combatants), reverse=True)
+
+    apply_combat_patch(player, {"dano": {"goblin 1": 5, "jogador": 4}, "condicoes": {"Goblin 2": ["caído"]}})
+    assert player["inventario"]["vida_atual"] == 16
+    table = encounter_table(player)
+    assert "Goblin 1 ini" in table and "PV 2/7 CA 13" in table and "[caído]" in table and "PV 16/20" in table
+
+    assert find_target(player, "Ataco o goblin 2 de novo")["nome"] == "Goblin 2"
+    messages = apply_combat_patch(player, {"dano": {"Goblin 1": 9, "Goblin 2": 7}})
+    assert messages[:2] == ["💀 Goblin 1 foi derrotado", "💀 Goblin 2 foi derrotado"]
+    assert messages[2].startswith("🏁 Combate encerrado") and get_encounter(player) is None
+    print("Test 1 Passed")
+
+def test_invalid_combat_patch_changes_nothing():
+    print("\n--- Test 2: Unknown combatant rejects the whole patch ---")
+    player = make_player()
+    apply_state_update({"patch": {"combate": {"iniciar": [{"nome": "Orc", "vida": 15}]}}}, 1, "c1", player)
+    before = copy.deepcopy(player)
+    apply_state_update({"patch": {"ouro": 5, "combate": {"dano": {"Dragão": 10}}}}, 1, "c1", player)
+    assert player == before
+    print("Test 2 Passed")
+
+def test_turn_uses_encounter():
+    print("\n--- Test 3: Turns advance rounds, attack rolls use the target CA ---")
+    save_player(1, make_player(), campaign_id="c1")
+
+    reply = ('Dois goblins saltam dos arbustos!\n'
+             '```json\n{"patch": {"combate": {"iniciar": [{"nome": "Goblin", "vida": 7, "ca": 13, "quantidade": 2}]}}}\n```')
+    with PlayerTransaction(1, "c1") as state:
+        assert "⚔️ Combate iniciado!" in chat._finish_turn("Sigo pela trilha", reply, 1, "c1", player=state.player)
+
+    dice._rng.seed(2)
+    with PlayerTransaction(1, "c1") as state:
+        _, turn = chat._prepare_turn("Ataco o Goblin 1", 1, "c1", state.player)
+    assert "vs CD 13" in turn["passive_msg"] and "(alvo: Goblin 1)" in turn["passive_msg"]
+    assert "Combate, rodada 2" in turn["llm_messages"][-1]["content"]
+
+    # Enemy damage in the patch is not mistaken for player damage by the narrative backup
+    reply = 'O Goblin 1 levou 5 pontos de dano.\n```json\n{"patch": {"combate": {"dano": {"Goblin 1": 5}}}}\n```'
+    with PlayerTransaction(1, "c1") as state:
+        chat._finish_turn("Ataco o Goblin 1", reply, 1, "c1", player=state.player)
+    saved = load_player(1, "c1")
+    assert saved["inventario"]["vida_atual"] == 20
+    assert "PV 2/7" in encounter_table(saved)
+    print("Test 3 Passed")
+
+if __name__ == "__main__":
+    from conftest import temp_data_dir
+    try:
+        for test in (test_encounter_bookkeeping, test_invalid_combat_patch_changes_nothing, test_turn_uses_encounter):
+            with temp_data_dir():
+                test()
+        print("\n[OK] All Tests Passed!")
+    except AssertionError as e:
+        print(f"\n[FAIL] Test Failed: {e}")
+        sys.exit(1)
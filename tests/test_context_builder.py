@@ -0,0 +1,82 @@
+
+import sys
+import os
+
+# Add src to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from core import context, chat
+from core.history import append_messages
+
+def message(role, size):
+    return {"role": role, "content": "x" * size}
+
+def test_system_prompt_pinned():
+    print("--- Test 1: The system instruction survives a long campaign ---")
+    instruction = "Você é um narrador de RPG." + " Regras." * 50
+    context.save_system_prompt(1, "c1", instruction)
+    append_messages(1, "c1", [{"role": "system", "content": instruction}])
+    for i in range(100):
+        append_messages(1, "c1", [message("user", 200), message("assistant", 400)])
+
+    trailing = [{"role": "system", "content": "Reforço"}]
+    messages = context.build_context(1, "c1", trailing=trailing, budget=2000)
+
+    assert messages[0] == {"role": "system", "content": instruction}
+    assert messages[-1] == trailing[0]
+    assert sum(1 for m in messages if m["content"] == instruction) == 1, "Pinned prompt must not be sent twice"
+
+    stats = context.get_context_stats(1, "c1")
+    assert stats["tokens"] <= stats["budget"] == 2000
+    assert stats["history_messages"] == len(messages) - 2
+    assert stats["history_dropped"] > 0
+    print(f"Test 1 Passed: {stats}")
+
+def test_stable_prefix_and_newest_kept():
+    print("\n--- Test 2: Prefix is byte-identical across turns; newest message always sent ---")
+    context.save_system_prompt(1, "c1", "Instrução fixa")
+    append_messages(1, "c1", [message("user", 100), message("assistant", 100)])
+    first = context.build_context(1, "c1")
+
+    # A huge message (e.g. a setup dump) larger than the whole budget
+    append_messages(1, "c1", [message("user", 40000)])
+    second = context.build_context(1, "c1", budget=1000)
+
+    assert first[0] == second[0]
+    assert second[-1]["content"] == "x" * 40000, "The player's action is always included"
+    assert len(second) == 2, "Nothing older fits once the budget is exhausted"
+    print("Test 2 Passed: Pinned prefix unchanged, oversized newest message kept alone")
+
+def test_existing_campaign_adopts_its_instruction():
+    print("\n--- Test 3: Campaigns from before pinning keep the instruction they started with ---")
+    player = {"nome": "Aria", "classe": "Maga", "modo": "narrativo"}
+    setup = [{"role": "system", "content": "AJA COMO UM MESTRE DE RPG."}, {"role": "system", "content": "Setup Output: {}"}]
+    append_messages(1, "old", setup + [
+        {"role": "system", "content": "Instrução original"},
+        {"role": "user", "content": "Olho ao redor"},
+        {"role": "assistant", "content": "Você está numa taverna."},
+        {"role": "system", "content": "⚠️ MODO DESENVOLVEDOR ATIVADO ⚠️"},
+    ])
+    assert chat._pin_system_prompt(1, "old", player) is None, "Nothing is appended mid-campaign"
+    assert context.get_system_prompt(1, "old") == "Instrução original"
+
+    append_messages(1, "bare", setup + [{"role": "user", "content": "Oi"}, {"role": "assistant", "content": "Olá"}])
+    assert chat._pin_system_prompt(1, "bare", player) is None
+    assert "Na sua primeira resposta" not in context.get_system_prompt(1, "bare")
+
+    append_messages(1, "new", setup)
+    pinned = chat._pin_system_prompt(1, "new", player)
+    assert "Na sua primeira resposta" in pinned and context.get_system_prompt(1, "new") == pinned
+    assert chat._pin_system_prompt(1, "new", player) is None
+    print("Test 3 Passed: Adopted, never rebuilt mid-campaign")
+
+if __name__ == "__main__":
+    from conftest import temp_data_dir
+    try:
+        for test in (test_system_prompt_pinned, test_stable_prefix_and_newest_kept, test_existing_campaign_adopts_its_instruction):
+            with temp_data_dir():
+                test()
+        print("\n[OK] All Tests Passed!")
+    except AssertionError as e:
+        print(f"\n[FAIL] Test Failed: {e}")
+        sys.exit(1)
@@ -0,0 +1,82 @@
+
+import sys
+import os
+import random
+
+# Add src to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from core import chat, dice
+from core.dice import parse_dice, roll, detect_check, resolve_check, attribute_modifier
+from core.player import PlayerTransaction, save_player
+from core.history import load_history
+
+PLAYER = {
+    "nome": "Aria", "classe": "Guerreiro", "modo": "dnd5e", "nivel": 5, "experiencia": 0,
+    "atributos": {"forca": 15, "destreza": 12, "carisma": 8},
+    "inventario": {"vida_atual": 30, "vida_maxima": 30, "itens": [{"nome": "Manoplas", "buffs": {"forca": 1}}]},
+    "spell_slots": {}, "magias": [], "status": []
+}
+
+def test_dice_expressions():
+    print("--- Test 1: Parse and roll with a seeded RNG ---")
+    assert parse_dice("2d6 + 1d4 - 1") == ([(2, 6, 1), (1, 4, 1)], -1)
+    assert parse_dice("d20") == ([(1, 20, 1)], 0)
+    for bad in ("2x6", "d", "1000d6", "1d1", "2d6+"):
+        try:
+            parse_dice(bad)
+            assert False, f"Should reject {bad}"
+        except ValueError:
+            pass
+
+    first = roll("4d6+2", random.Random(7))
+    assert first == roll("4d6+2", random.Random(7)), "Same seed, same roll"
+    assert first["total"] == sum(first["rolagens"]) + 2 and all(1 <= r <= 6 for r in first["rolagens"])
+    print("Test 1 Passed")
+
+def test_check_modifiers():
+    print("\n--- Test 2: Checks use attributes + item buffs (+ proficiency on attacks) ---")
+    assert attribute_modifier(PLAYER, "forca") == 3 # 15 + 1 buff = 16
+    result = resolve_check(PLAYER, "Ataque", "forca", 15, random.Random(1))
+    assert result["modificador"] == 3 + 3 # level 5 proficiency
+    assert result["total"] == result["d20"] + 6
+    assert result["sucesso"] == (result["d20"] == 20 or (result["d20"] != 1 and result["total"] >= 15))
+    assert resolve_check(PLAYER, "Persuasão", "carisma", None, random.Random(1))["modificador"] == -1
+
+    assert detect_check("Ataco o orc com o machado")["atributo"] == "forca"
+    assert detect_check("Tento convencer o guarda, CD 12") == {"tipo": "Persuasão", "atributo": "carisma", "cd": 12}
+    assert detect_check("Rolei 17 no d20") is None
+    assert detect_check("Estou animado com a viagem") is None
+    print("Test 2 Passed")
+
+def test_turn_injects_roll():
+    print("\n--- Test 3: The roll goes into the same model call ---")
+    save_player(1, dict(PLAYER), campaign_id="c1")
+
+    dice._rng.seed(3)
+    with PlayerTransaction(1, "c1") as state:
+        direct, turn = chat._prepare_turn("Ataco o goblin", 1, "c1", state.player)
+    assert direct is None
+    assert turn["passive_msg"].startswith("🎲 Ataque (Força): d20 ")
+    assert "NÃO peça outra rolagem" in turn["llm_messages"][-1]["content"]
+    assert load_history(1, "c1")[-1]["content"].startswith("Rolagem do sistema: Ataque")
+
+    with PlayerTransaction(1, "c1") as state:
+        state.player["modo"] = "narrativo"
+        _, turn = chat._prepare_turn("Ataco o goblin", 1, "c1", state.player)
+    assert not turn["passive_msg"], "No dice in narrative mode"
+
+    reply, _ = chat._prepare_turn("!rolar 2d6+3", 1, "c1", dict(PLAYER))
+    assert reply.startswith("🎲 2d6+3: [") and load_history(1, "c1")[-1]["content"].startswith("Rolagem do jogador")
+    print("Test 3 Passed")
+
+if __name__ == "__main__":
+    from conftest import temp_data_dir
+    try:
+        for test in (test_dice_expressions, test_check_modifiers, test_turn_injects_roll):
+            with temp_data_dir():
+                test()
+        print("\n[OK] All Tests Passed!")
+    except AssertionError as e:
+        print(f"\n[FAIL] Test Failed: {e}")
+        sys.exit(1)
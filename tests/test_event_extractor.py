@@ -0,0 +1,63 @@
+
+import sys
+import os
+import re
+
+# Add src to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from core import events
+from core.events import extract_events, apply_events, clean_reply, NameIndex
+
+REPLY = (
+    "Você derrota o goblin e encontra uma Espada Curta. Ele revida e você levou 4 pontos de dano.\n"
+    "Gasta 1 slot de Nível 1 para conjurar Mísseis Mágicos. Você aprende a magia Bola de Fogo.\n"
+    "Depois de tudo, você acampou perto do rio.\n\n"
+    "Segue o JSON atualizado:\n"
+    '```json\n{"inventario": {"ouro": 15}}\n```'
+)
+
+def test_single_sweep_events():
+    print("--- Test 1: All event types found in one sweep ---")
+    found = extract_events(REPLY, "Ataco o goblin")
+    types = [e["type"] for e in found]
+    assert types == [events.REST, events.SLOT_USED, events.DAMAGE, events.ITEM_GAINED, events.SPELL_LEARNED], types
+    assert found[1] == {"type": events.SLOT_USED, "amount": 1, "level": "1"}
+    assert found[2]["amount"] == 4
+    assert found[3]["name"] == "Espada Curta" and found[4]["name"] == "Bola de Fogo"
+
+    # Heals come from passives/effects or the model's state update; the narration must not re-apply them
+    assert extract_events("Você recupera 15 pontos de vida.") == []
+    assert extract_events("Sua vida atual agora é 12.") == [{"type": events.HP_SET, "value": 12}]
+    print("Test 1 Passed")
+
+def test_matches_legacy_cleanup():
+    print("\n--- Test 2: Cleanup matches the previous regex pipeline ---")
+    legacy = re.sub(r"```(?:json)?\s*\{.*?\}\s*```", "", REPLY, flags=re.DOTALL)
+    legacy = re.sub(r"```.*?```", "", legacy, flags=re.DOTALL)
+    legacy = re.sub(r"(?i)\n*(O JSON .*|Segue o JSON .*|Status atualizado.*|JSON de inventário.*|Atualização de estado:.*):?.*", "", legacy)
+    assert clean_reply(REPLY) == legacy
+    assert "JSON" not in clean_reply(REPLY)
+    print("Test 2 Passed")
+
+def test_dedupe_index():
+    print("\n--- Test 3: Items dedupe on normalized names, also within one reply ---")
+    index = NameIndex(["Espada Longa", "Poção de Cura"])
+    assert index.overlaps("espada") and index.overlaps("POCAO DE CURA")
+    assert not index.overlaps("Escudo")
+
+    player = {"classe": "Guerreiro", "inventario": {"vida_atual": 10, "itens": [{"nome": "Espada Longa"}]}, "magias": []}
+    found = extract_events("Você pega o Escudo. Depois recebe um Escudo, e encontra a Espada.")
+    apply_events(found, 1, "c1", player)
+    assert [i["nome"] for i in player["inventario"]["itens"]] == ["Espada Longa", "Escudo"]
+    print("Test 3 Passed")
+
+if __name__ == "__main__":
+    try:
+        test_single_sweep_events()
+        test_matches_legacy_cleanup()
+        test_dedupe_index()
+        print("\n[OK] All Tests Passed!")
+    except AssertionError as e:
+        print(f"\n[FAIL] Test Failed: {e}")
+        sys.exit(1)
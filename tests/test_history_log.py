@@ -0,0 +1,153 @@
+
+import sys
+import os
+import json
+
+# Add src to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from core import storage
+from core import history
+
+def test_append_and_tail():
+    print("--- Test 1: Tail reads only the last messages ---")
+    old_block = storage.TAIL_BLOCK_SIZE
+    storage.TAIL_BLOCK_SIZE = 64 # Force several backwards reads
+    try:
+        for i in range(50):
+            history.append_messages(1, "c1", [{"role": "user", "content": f"Mensagem número {i}"}])
+
+        tail = history.tail_history(1, "c1", 20)
+        assert [m["content"] for m in tail] == [f"Mensagem número {i}" for i in range(30, 50)]
+        assert len(history.load_history(1, "c1")) == 50
+        assert len(history.tail_history(1, "c1", 500)) == 50
+    finally:
+        storage.TAIL_BLOCK_SIZE = old_block
+    print("Test 1 Passed: Tail matches history[-20:]")
+
+def test_legacy_migration():
+    print("\n--- Test 2: Legacy history.json is migrated once ---")
+    legacy = [{"role": "system", "content": "setup"}, {"role": "assistant", "content": "Olá"}]
+    legacy_path = storage.get_file_path(1, "history.json", "old")
+    legacy_path.write_text(json.dumps(legacy))
+
+    assert history.has_history(1, "old")
+    history.append_messages(1, "old", [{"role": "user", "content": "Oi"}])
+    assert history.load_history(1, "old") == legacy + [{"role": "user", "content": "Oi"}]
+    assert not legacy_path.exists()
+    print("Test 2 Passed: Legacy messages preserved")
+
+def test_torn_line_is_skipped():
+    print("\n--- Test 3: Interrupted append does not break reads ---")
+    history.append_messages(1, "c1", [{"role": "user", "content": "ok"}])
+    with open(storage.get_file_path(1, history.HISTORY_FILE, "c1"), "a") as f:
+        f.write('{"role": "assis')
+
+    assert history.load_history(1, "c1") == [{"role": "user", "content": "ok"}]
+    history.append_messages(1, "c1", [{"role": "assistant", "content": "depois"}])
+    assert history.tail_history(1, "c1", 1) == [{"role": "assistant", "content": "depois"}]
+    print("Test 3 Passed: Corrupted tail ignored")
+
+def test_history_pages():
+    print("\n--- Test 4: Cursor pages cover the log exactly once ---")
+    old_block = storage.TAIL_BLOCK_SIZE
+    storage.TAIL_BLOCK_SIZE = 64
+    try:
+        history.append_messages(1, "c1", [{"role": "user", "content": f"m{i}"} for i in range(25)])
+        # Older part sealed into a segment (as after a fork), newer part in the live file
+        storage.seal_records(1, history.HISTORY_FILE, "c1")
+        history.append_messages(1, "c1", [{"role": "user", "content": f"m{i}"} for i in range(25, 47)])
+
+        page = history.page_history(1, "c1", 10)
+        assert (page["start"], page["end"], page["total"]) == (37, 47, 47)
+        assert [m["content"] for m in page["messages"]] == [f"m{i}" for i in range(37, 47)]
+
+        # Scrolling up with ?before= until the start, across the segment boundary
+        seen = page["messages"]
+        while page["start"] > 0:
+            page = history.page_history(1, "c1", 10, before=page["start"])
+            seen = page["messages"] + seen
+        assert [m["content"] for m in seen] == [f"m{i}" for i in range(47)]
+        assert page["start"] == 0 and len(page["messages"]) == 7
+
+        # ?after= reads forward; past the end is empty
+        page = history.page_history(1, "c1", 5, after=22)
+        assert [m["content"] for m in page["messages"]] == ["m22", "m23", "m24", "m25", "m26"]
+        assert history.page_history(1, "c1", 5, after=47)["messages"] == []
+        assert history.page_history(1, "c1", 5, before=0)["messages"] == []
+        for kwargs in ({"limit": 0}, {"limit": 5, "before": -1}, {"limit": 5, "before": 3, "after": 1}):
+            try:
+                history.page_history(1, "c1", **kwargs)
+                assert False, f"{kwargs} should fail"
+            except ValueError:
+                pass
+    finally:
+        storage.TAIL_BLOCK_SIZE = old_block
+    print("Test 4 Passed: before/after/limit pages")
+
+def test_display_projection():
+    print("\n--- Test 5: Display projection holds only cleaned player/narrator turns ---")
+    reply = 'Você encontra 10 moedas.\n\n```json\n{"patch": {"ouro": 10}}\n```'
+    history.append_messages(1, "c1", [
+        {"role": "system", "content": "Instrução do sistema"},
+        {"role": "system", "content": "Efeitos passivos ativados: +15 PV"},
+        {"role": "user", "content": "Procuro no baú"},
+        {"role": "assistant", "content": reply},
+    ])
+    display = history.load_display_history(1, "c1")
+    assert display == [
+        {"role": "user", "content": "Procuro no baú"},
+        {"role": "assistant", "content": "Você encontra 10 moedas."},
+    ]
+
+    # Maintained per append, and pages count display entries
+    history.append_messages(1, "c1", [{"role": "system", "content": "Rolagem do sistema: d20 15"}, {"role": "user", "content": "Abro a porta"}])
+    page = history.page_display_history(1, "c1", 2)
+    assert (page["start"], page["total"]) == (1, 3)
+    assert [m["content"] for m in page["messages"]] == ["Você encontra 10 moedas.", "Abro a porta"]
+    print("Test 5 Passed: No system messages, no JSON")
+
+def test_display_projection_backfill():
+    print("\n--- Test 6: Campaigns from before the projection get it built once ---")
+    storage.append_records(1, history.HISTORY_FILE, [
+        {"role": "system", "content": "Setup Output: {...}"},
+        {"role": "assistant", "content": "Olá, aventureiro."},
+    ], "old")
+    assert history.page_display_history(1, "old", 10)["messages"] == [{"role": "assistant", "content": "Olá, aventureiro."}]
+    history.append_messages(1, "old", [{"role": "user", "content": "Oi"}])
+    assert len(history.load_display_history(1, "old")) == 2
+
+    history.clear_history(1, "old")
+    assert history.load_display_history(1, "old") == []
+    print("Test 6 Passed: Backfilled, then appended")
+
+def test_count_does_not_rescan():
+    print("\n--- Test 7: The message count is kept, not recounted every turn ---")
+    scans = []
+    original = storage._count_file
+    storage._count_file = lambda path: scans.append(path) or original(path)
+    try:
+        history.append_messages(1, "c1", [{"role": "user", "content": "a"}, {"role": "assistant", "content": "b"}])
+        assert history.count_history(1, "c1") == 2
+        for i in range(5):
+            history.append_messages(1, "c1", [{"role": "user", "content": str(i)}])
+            assert history.count_history(1, "c1") == 3 + i
+        assert len(scans) == 1
+        assert [m["content"] for m in history.page_history(1, "c1", 2, before=5)["messages"]] == ["1", "2"]
+
+        history.clear_history(1, "c1")
+        assert history.count_history(1, "c1") == 0
+    finally:
+        storage._count_file = original
+    print("Test 7 Passed: One scan, then counted on append")
+
+if __name__ == "__main__":
+    from conftest import temp_data_dir
+    try:
+        for test in (test_append_and_tail, test_legacy_migration, test_torn_line_is_skipped, test_history_pages, test_display_projection, test_display_projection_backfill, test_count_does_not_rescan):
+            with temp_data_dir():
+                test()
+        print("\n[OK] All Tests Passed!")
+    except AssertionError as e:
+        print(f"\n[FAIL] Test Failed: {e}")
+        sys.exit(1)
@@ -0,0 +1,68 @@
+
+import sys
+import os
+import asyncio
+import httpx
+
+# Add src to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from openai import RateLimitError, BadRequestError
+from core import llm
+
+class FakeCompletions:
+    def __init__(self, failures):
+        self.failures = list(failures)
+        self.calls = 0
+
+    async def create(self, **kwargs):
+        self.calls += 1
+        if self.failures:
+            raise self.failures.pop(0)
+        message = type("Message", (), {"content": "Olá, aventureiro."})
+        choice = type("Choice", (), {"message": message})
+        return type("Response", (), {"choices": [choice]})
+
+class FakeClient:
+    def __init__(self, failures):
+        self.chat = type("Chat", (), {})()
+        self.chat.completions = FakeCompletions(failures)
+
+def api_error(cls, status):
+    request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+    return cls("erro", response=httpx.Response(status, request=request), body=None)
+
+def run_with(client):
+    old_client, old_base = llm._client, llm.LLM_BACKOFF_BASE
+    llm._client, llm.LLM_BACKOFF_BASE = client, 0.001
+    try:
+        return asyncio.run(llm.chat_completion([{"role": "user", "content": "oi"}]))
+    finally:
+        llm._client, llm.LLM_BACKOFF_BASE = old_client, old_base
+
+def test_retries_rate_limit():
+    print("--- Test 1: 429 is retried with backoff ---")
+    client = FakeClient([api_error(RateLimitError, 429), api_error(RateLimitError, 429)])
+    assert run_with(client) == "Olá, aventureiro."
+    assert client.chat.completions.calls == 3
+    print("Test 1 Passed: Succeeded on third attempt")
+
+def test_does_not_retry_bad_request():
+    print("\n--- Test 2: 400 fails immediately ---")
+    client = FakeClient([api_error(BadRequestError, 400)])
+    try:
+        run_with(client)
+        assert False, "BadRequestError should propagate"
+    except BadRequestError:
+        pass
+    assert client.chat.completions.calls == 1
+    print("Test 2 Passed: No retry")
+
+if __name__ == "__main__":
+    try:
+        test_retries_rate_limit()
+        test_does_not_retry_bad_request()
+        print("\n[OK] All Tests Passed!")
+    except AssertionError as e:
+        print(f"\n[FAIL] Test Failed: {e}")
+        sys.exit(1)
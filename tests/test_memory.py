@@ -0,0 +1,76 @@
+
+import sys
+import os
+import asyncio
+
+# Add src to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from core import memory, context
+from core.history import append_messages, count_history
+
+def play(turns, start=0):
+    for i in range(start, start + turns):
+        append_messages(1, "c1", [
+            {"role": "user", "content": f"ação {i}"},
+            {"role": "assistant", "content": f"narrativa {i} " + "x" * 400}
+        ])
+
+def run_update():
+    calls = []
+    async def fake_completion(messages, model=None):
+        calls.append(messages)
+        return f"resumo {len(calls)}"
+
+    old = memory.chat_completion
+    memory.chat_completion = fake_completion
+    try:
+        asyncio.run(memory.update_memory(1, "c1"))
+    finally:
+        memory.chat_completion = old
+    return calls
+
+def test_key_points_keep_recent_raw():
+    print("--- Test 1: Old interactions are folded into key points ---")
+    play(25)
+    assert count_history(1, "c1") == 50
+
+    calls = run_update()
+    state = memory.load_memory(1, "c1")
+    # 25 interactions: one chunk of 10 folded, the 15 newest stay raw (>= MEMORY_KEEP_RECENT)
+    assert len(calls) == 1
+    assert "Jogador: ação 0" in calls[0][1]["content"] and "ação 10" not in calls[0][1]["content"]
+    assert state["covered"] == 20 and state["points"] == ["resumo 1"]
+
+    messages = context.build_context(1, "c1")
+    assert "resumo 1" in messages[0]["content"]
+    assert messages[1]["content"] == "ação 10", "Covered messages must not be sent raw"
+    print("Test 1 Passed: Key point replaces the first 10 interactions")
+
+def test_points_fold_into_summary():
+    print("\n--- Test 2: Key points are folded into a summary ---")
+    old_every = memory.MEMORY_SUMMARY_EVERY
+    memory.MEMORY_SUMMARY_EVERY = 2
+    try:
+        play(40)
+        calls = run_update()
+    finally:
+        memory.MEMORY_SUMMARY_EVERY = old_every
+
+    state = memory.load_memory(1, "c1")
+    # 3 chunks of 10 (the 10 newest stay raw) -> 3 points, the first 2 folded into one summary
+    assert state["covered"] == 60
+    assert len(state["summaries"]) == 1 and len(state["points"]) == 1
+    assert len(calls) == 4
+    print("Test 2 Passed: Summary written and points trimmed")
+
+if __name__ == "__main__":
+    from conftest import temp_data_dir
+    try:
+        for test in (test_key_points_keep_recent_raw, test_points_fold_into_summary):
+            with temp_data_dir():
+                test()
+        print("\n[OK] All Tests Passed!")
+    except AssertionError as e:
+        print(f"\n[FAIL] Test Failed: {e}")
+        sys.exit(1)
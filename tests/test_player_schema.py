@@ -0,0 +1,61 @@
+
+import sys
+import os
+import json
+
+# Add src to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from core import storage
+from core.player import load_player, save_player, PLAYER_SCHEMA_VERSION
+
+def write_legacy_player():
+    path = storage.DATA_DIR / "1" / "campaigns" / "c1" / "player.json"
+    path.parent.mkdir(parents=True)
+    path.write_text(json.dumps({
+        "nome": "Aria", "classe": "Mago", "modo": "dnd5e", "nivel": 1,
+        "inventario": {"vida_atual": 20, "vida_maxima": 20, "mana_atual": 50, "mana_maxima": 50,
+                       "itens": [{"nome": "Cajado de Carvalho"}]}
+    }))
+
+def test_legacy_player_migrated_once():
+    print("--- Test 1: A legacy D&D player is migrated on its first load only ---")
+    write_legacy_player()
+
+    player = load_player(1, "c1")
+    assert player["schema_version"] == PLAYER_SCHEMA_VERSION
+    assert "mana_atual" not in player["inventario"]
+    assert player["spell_slots"] == {"1": {"total": 2, "usado": 0}}
+    assert player["inventario"]["itens"][0]["buffs"] == {"inteligencia": 1}
+    storage.flush_cache()
+
+    # Later reads (GET /player, !status) must not write anything
+    load_player(1, "c1")
+    load_player(1, "c1")
+    assert not storage._dirty, "load_player must be a pure read once migrated"
+    print("Test 1 Passed: Migrated and saved once")
+
+def test_invariants_enforced_on_write():
+    print("\n--- Test 2: Mode invariants are applied when saving ---")
+    write_legacy_player()
+    player = load_player(1, "c1")
+
+    player["inventario"]["mana_atual"] = 10
+    player["inventario"]["itens"].append({"nome": "Espada Curta"})
+    save_player(1, player, campaign_id="c1")
+
+    saved = load_player(1, "c1")
+    assert "mana_atual" not in saved["inventario"]
+    assert saved["inventario"]["itens"][-1]["buffs"] == {"forca": 1}
+    print("Test 2 Passed: No mana, buffs injected")
+
+if __name__ == "__main__":
+    from conftest import temp_data_dir
+    try:
+        for test in (test_legacy_player_migrated_once, test_invariants_enforced_on_write):
+            with temp_data_dir():
+                test()
+        print("\n[OK] All Tests Passed!")
+    except AssertionError as e:
+        print(f"\n[FAIL] Test Failed: {e}")
+        sys.exit(1)
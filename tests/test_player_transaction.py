@@ -0,0 +1,65 @@
+
+import sys
+import os
+
+# Add src to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from core import player as player_module, chat
+from core.player import PlayerTransaction, load_player, save_player
+
+def new_player():
+    save_player(1, {
+        "nome": "Aria", "classe": "Guerreiro", "modo": "narrativo", "nivel": 1, "experiencia": 0,
+        "inventario": {"vida_atual": 30, "vida_maxima": 30, "ouro": 0, "itens": []},
+        "magias": [], "status": []
+    }, campaign_id="c1")
+
+def test_turn_saves_once():
+    print("--- Test 1: All post-reply steps share one state and one save ---")
+    new_player()
+    reply = (
+        "Você derrota o ogro e recebe uma Espada Longa.\nLevou 5 pontos de dano.\n"
+        '```json\n{"inventario": {"ouro": 40}, "experiencia": 200}\n```'
+    )
+
+    saves = []
+    original_save = player_module.save_player
+    player_module.save_player = lambda *args, **kwargs: saves.append(args) or original_save(*args, **kwargs)
+    try:
+        with PlayerTransaction(1, "c1") as state:
+            chat._finish_turn("Ataco o ogro", reply, 1, "c1", player=state.player)
+    finally:
+        player_module.save_player = original_save
+
+    assert len(saves) == 1, f"Expected one save, got {len(saves)}"
+    saved = load_player(1, "c1")
+    assert saved["inventario"]["ouro"] == 40
+    assert saved["inventario"]["vida_atual"] < 30, "Damage backup applied on the same state"
+    assert any(i.get("nome") == "Espada Longa" for i in saved["inventario"]["itens"])
+    # 200 XP at level 1 (150 needed): level 2 with 50 left, no longer lost to a second save
+    assert saved["nivel"] == 2 and saved["experiencia"] == 50
+    print("Test 1 Passed: One save, level-up kept")
+
+def test_rollback_on_failure():
+    print("\n--- Test 2: A failed turn leaves the player untouched ---")
+    new_player()
+    try:
+        with PlayerTransaction(1, "c1") as state:
+            state.player["inventario"]["ouro"] = 999
+            raise RuntimeError("LLM timeout")
+    except RuntimeError:
+        pass
+    assert load_player(1, "c1")["inventario"]["ouro"] == 0
+    print("Test 2 Passed: Changes discarded")
+
+if __name__ == "__main__":
+    from conftest import temp_data_dir
+    try:
+        for test in (test_turn_saves_once, test_rollback_on_failure):
+            with temp_data_dir():
+                test()
+        print("\n[OK] All Tests Passed!")
+    except AssertionError as e:
+        print(f"\n[FAIL] Test Failed: {e}")
+        sys.exit(1)
@@ -0,0 +1,89 @@
+
+import sys
+import os
+import math
+import random
+
+import pytest
+
+# Add src to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from core import progression
+from core.progression import level_for_xp, total_xp, simulate_progression, turns_to_level
+from core.player import adicionar_experiencia, calculate_default_slots
+
+def legacy_add_xp(player: dict, quantidade: int):
+    """The previous level-by-level loop of adicionar_experiencia"""
+    experiencia, nivel = player.get("experiencia", 0) + quantidade, player.get("nivel", 0)
+    inventario = player.setdefault("inventario", {})
+    while experiencia >= 100 + nivel * 50:
+        experiencia -= 100 + nivel * 50
+        nivel += 1
+        vida_maxima = math.ceil(inventario.get("vida_maxima", 100) * 1.10)
+        mana_maxima = math.ceil(inventario.get("mana_maxima", 50) * 1.10)
+        inventario["vida_maxima"], inventario["mana_maxima"] = vida_maxima, mana_maxima
+        inventario["vida_atual"] = min(inventario.get("vida_atual", vida_maxima) + math.ceil(vida_maxima * 0.10), vida_maxima)
+        inventario["mana_atual"] = min(inventario.get("mana_atual", mana_maxima) + math.ceil(mana_maxima * 0.10), mana_maxima)
+    player["experiencia"], player["nivel"] = experiencia, nivel
+
+def test_matches_legacy_loop():
+    print("--- Test 1: Table-driven XP gives the same players as the old loop ---")
+    rng = random.Random(42)
+    for _ in range(500):
+        inventario = {"vida_maxima": rng.randint(5, 300), "mana_maxima": rng.randint(0, 200)}
+        inventario["vida_atual"] = rng.randint(0, inventario["vida_maxima"])
+        if rng.random() < 0.5:
+            inventario["mana_atual"] = rng.randint(0, max(inventario["mana_maxima"], 1))
+        nivel = rng.randint(0, 30)
+        base = {"nivel": nivel, "experiencia": rng.randint(0, 99 + nivel * 50), "inventario": inventario}
+        quantidade = rng.choice([0, 10, 150, rng.randint(0, 50000)])
+
+        old, new = {**base, "inventario": dict(inventario)}, {**base, "inventario": dict(inventario)}
+        legacy_add_xp(old, quantidade)
+        adicionar_experiencia(1, quantidade, "c1", player=new)
+        assert old == new, (base, quantidade, old, new)
+    print("Test 1 Passed")
+
+def test_level_lookup():
+    print("\n--- Test 2: Level from XP by binary search, beyond the table too ---")
+    assert [level_for_xp(x) for x in (0, 99, 100, 249, 250)] == [0, 0, 1, 1, 2]
+    huge = total_xp(progression.TABLE_LEVELS + 50, 7)
+    assert level_for_xp(huge) == progression.TABLE_LEVELS + 50
+
+    assert calculate_default_slots("Mago", 5) == {"1": {"total": 4, "usado": 0}, "2": {"total": 3, "usado": 0}, "3": {"total": 2, "usado": 0}}
+    assert calculate_default_slots("Paladino", 1) == {} and calculate_default_slots("Paladino", 5) == calculate_default_slots("Mago", 3)
+    assert calculate_default_slots("Bruxo", 9) == {"5": {"total": 4, "usado": 0}}
+    assert calculate_default_slots("Mago", 30) == {"1": {"total": 2, "usado": 0}}
+    slots = calculate_default_slots("Mago", 1)
+    slots["1"]["usado"] = 2
+    assert calculate_default_slots("Mago", 1)["1"]["usado"] == 0, "Rows are fresh dicts"
+    print("Test 2 Passed")
+
+def test_simulator():
+    print("\n--- Test 3: Vectorized simulator agrees with the per-character path ---")
+    np = pytest.importorskip("numpy")
+    rewards = np.random.default_rng(0).integers(0, 120, size=(200, 60))
+    result = simulate_progression(rewards)
+    for i in (0, 57, 199):
+        player = {"nivel": 0, "experiencia": 0, "inventario": {"vida_maxima": 100, "vida_atual": 100, "mana_maxima": 50, "mana_atual": 50}}
+        for reward in rewards[i]:
+            adicionar_experiencia(1, int(reward), "c1", player=player)
+        assert result["nivel"][i, -1] == player["nivel"]
+        assert result["vida_maxima"][i] == player["inventario"]["vida_maxima"]
+    turns = turns_to_level(result["nivel"], 3)
+    assert ((turns == -1) | (result["nivel"][np.arange(200), np.maximum(turns, 1) - 1] >= 3)).all()
+    print("Test 3 Passed")
+
+if __name__ == "__main__":
+    try:
+        test_matches_legacy_loop()
+        test_level_lookup()
+        if progression.np is not None:
+            test_simulator()
+        else:
+            print("\nTest 3 Skipped: NumPy not installed")
+        print("\n[OK] All Tests Passed!")
+    except AssertionError as e:
+        print(f"\n[FAIL] Test Failed: {e}")
+        sys.exit(1)
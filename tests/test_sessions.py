@@ -0,0 +1,110 @@
+
+import sys
+import os
+import threading
+from datetime import datetime, timedelta
+
+# Add src to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from core import storage
+from core import sessions
+
+def test_session_lifecycle():
+    print("--- Test 1: Create / validate / delete ---")
+    token = sessions.create_session("7")
+    assert sessions.validate_session(token) == "7"
+    assert sessions.validate_session("nao-existe") is None
+
+    sessions.delete_session(token)
+    assert sessions.validate_session(token) is None
+    print("Test 1 Passed: Cache follows create/delete")
+
+def test_journal_survives_restart():
+    print("\n--- Test 2: Writes are journal appends, reload replays them ---")
+    keep = sessions.create_session("1")
+    gone = sessions.create_session("2")
+    sessions.delete_session(gone)
+
+    assert not (storage.DATA_DIR / "sessions.json").exists(), "No full-file rewrite expected"
+    journal = (storage.DATA_DIR / "sessions.journal.jsonl").read_text().splitlines()
+    assert len(journal) == 3
+
+    # Simulate a new process
+    storage._collections.clear()
+    sessions._session_cache = None
+    assert sessions.validate_session(keep) == "1"
+    assert sessions.validate_session(gone) is None
+    print("Test 2 Passed: Journal replayed")
+
+def test_expired_and_compaction():
+    print("\n--- Test 3: Expired tokens and journal compaction ---")
+    old_compact = storage.COLLECTION_COMPACT_EVERY
+    storage.COLLECTION_COMPACT_EVERY = 3
+    try:
+        storage.put_record("sessions", "old", {
+            "user_id": "1",
+            "created_at": datetime.now().isoformat(),
+            "expires_at": (datetime.now() - timedelta(days=1)).isoformat()
+        })
+        assert sessions.validate_session("old") is None
+        sessions.create_session("1")
+        # put + delete + put = 3 ops -> compacted into sessions.json
+        assert (storage.DATA_DIR / "sessions.json").exists()
+        assert not (storage.DATA_DIR / "sessions.journal.jsonl").exists()
+        assert "old" not in storage.load_collection("sessions")
+    finally:
+        storage.COLLECTION_COMPACT_EVERY = old_compact
+    print("Test 3 Passed: Expired token removed, journal folded")
+
+def test_sweeper_and_user_cap():
+    print("\n--- Test 4: Bulk sweep and per-user session cap ---")
+    old_cap = sessions.SESSION_MAX_PER_USER
+    sessions.SESSION_MAX_PER_USER = 2
+    try:
+        expired_at = (datetime.now() - timedelta(minutes=1)).isoformat()
+        storage.put_records("sessions", {
+            f"velho{i}": {"user_id": "9", "created_at": expired_at, "expires_at": expired_at} for i in range(5)
+        })
+        first = sessions.create_session("1")
+        second = sessions.create_session("1")
+        third = sessions.create_session("1")
+        assert sessions.validate_session(first) is None, "Oldest session should be evicted"
+        assert sessions.validate_session(second) == "1"
+        assert sessions.validate_session(third) == "1"
+
+        stats = sessions.sweep_expired_sessions()
+        assert stats["last_removed"] == 5
+        assert stats["live"] == 2
+        assert len(storage.load_collection("sessions")) == 2
+    finally:
+        sessions.SESSION_MAX_PER_USER = old_cap
+    print("Test 4 Passed: Store size bounded")
+
+def test_sweep_waits_for_session_lock():
+    print("\n--- Test 5: The sweeper doesn't touch the token cache behind a login's back ---")
+    token = sessions.create_session("1")
+    expired_at = (datetime.now() - timedelta(minutes=1)).isoformat()
+    storage.put_record("sessions", token, {"user_id": "1", "created_at": expired_at, "expires_at": expired_at})
+
+    with sessions._session_lock:
+        sweeper = threading.Thread(target=sessions.sweep_expired_sessions)
+        sweeper.start()
+        sweeper.join(timeout=0.2)
+        assert sweeper.is_alive(), "Sweep must wait for the session lock"
+        assert token in sessions._get_session_cache()
+    sweeper.join(timeout=5)
+    assert token not in sessions._get_session_cache()
+    assert "1" not in sessions._user_tokens
+    print("Test 5 Passed: Sweep serialized with the cache")
+
+if __name__ == "__main__":
+    from conftest import temp_data_dir
+    try:
+        for test in (test_session_lifecycle, test_journal_survives_restart, test_expired_and_compaction, test_sweeper_and_user_cap, test_sweep_waits_for_session_lock):
+            with temp_data_dir():
+                test()
+        print("\n[OK] All Tests Passed!")
+    except AssertionError as e:
+        print(f"\n[FAIL] Test Failed: {e}")
+        sys.exit(1)
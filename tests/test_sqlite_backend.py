@@ -0,0 +1,124 @@
+
+import sys
+import os
+import json
+import tempfile
+from pathlib import Path
+
+# Add src to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from core import storage
+from core import history
+from core.sqlite_backend import migrate_json_tree
+
+def use_sqlite_backend():
+    storage.flush_cache()
+    storage._cache.clear()
+    storage._dirty.clear()
+    storage._collections.clear()
+    storage._journal_sizes.clear()
+    history._migrated.clear()
+    history._projected.clear()
+    tmp = Path(tempfile.mkdtemp())
+    storage.DATA_DIR = tmp
+    storage.STORAGE_BACKEND = "sqlite"
+    storage.SQLITE_PATH = str(tmp / "infinity.db")
+    storage._sqlite = None
+    return tmp
+
+def restore_json_backend():
+    storage.flush_cache()
+    storage._cache.clear()
+    storage.STORAGE_BACKEND = "json"
+    storage._sqlite = None
+
+def test_storage_api_on_sqlite():
+    print("--- Test 1: storage.py API on the SQLite backend ---")
+    use_sqlite_backend()
+    try:
+        storage.save_json(1, "player.json", {"nome": "Aria"}, campaign_id="c1")
+        storage.flush_cache()
+        storage._cache.clear()
+        assert storage.load_json(1, "player.json", campaign_id="c1") == {"nome": "Aria"}
+
+        history.append_messages(1, "c1", [{"role": "user", "content": str(i)} for i in range(5)])
+        assert [m["content"] for m in history.tail_history(1, "c1", 2)] == ["3", "4"]
+
+        history.fork_history(1, "c1", "c2")
+        history.append_messages(1, "c2", [{"role": "user", "content": "ramo"}])
+        assert history.count_history(1, "c1") == 5
+        assert [m["content"] for m in history.tail_history(1, "c2", 2)] == ["4", "ramo"]
+        assert [m["content"] for m in history.page_history(1, "c1", 2, before=3)["messages"]] == ["1", "2"]
+
+        storage.put_record("sessions", "tok", {"user_id": "1"})
+        assert storage.get_record("sessions", "tok") == {"user_id": "1"}
+        storage.delete_records("sessions", ["tok"])
+        assert storage.get_record("sessions", "tok") is None
+
+        storage.delete_campaign_folder(1, "c1")
+        assert not history.has_history(1, "c1")
+        assert storage.load_json(1, "player.json", campaign_id="c1") is None
+    finally:
+        restore_json_backend()
+    print("Test 1 Passed: Documents, logs and records round-trip")
+
+def test_migrate_json_tree():
+    print("\n--- Test 2: One-shot migration from the directory tree ---")
+    data_dir = Path(tempfile.mkdtemp())
+    (data_dir / "users.json").write_text(json.dumps({"1": {"username": "aria"}}))
+    (data_dir / "sessions.json").write_text(json.dumps({"tok": {"user_id": "1"}}))
+    camp = data_dir / "1" / "campaigns" / "abc"
+    camp.mkdir(parents=True)
+    (data_dir / "1" / "campaigns.json").write_text(json.dumps([{"id": "abc"}]))
+    (camp / "player.json").write_text(json.dumps({"nome": "Aria"}))
+    (camp / "history.json").write_text(json.dumps([{"role": "user", "content": "oi"}]))
+
+    db_path = data_dir / "migrated.db"
+    counts = migrate_json_tree(data_dir, db_path)
+    assert counts == {"records": 2, "documents": 2, "log_records": 1}, counts
+    # Re-running must not duplicate history
+    assert migrate_json_tree(data_dir, db_path)["log_records"] == 1
+
+    from core.sqlite_backend import SqliteBackend
+    backend = SqliteBackend(db_path)
+    assert backend.read_records("1", "history.jsonl", "abc") == [{"role": "user", "content": "oi"}]
+    assert backend.read_document("1", "player.json", "abc") == {"nome": "Aria"}
+    assert backend.get_record("users", "1") == {"username": "aria"}
+    print("Test 2 Passed: Tree imported")
+
+def test_migrate_forked_history():
+    print("\n--- Test 3: Migration reads the sealed segments of a forked log ---")
+    data_dir = Path(tempfile.mkdtemp())
+    old_dir = storage.DATA_DIR
+    storage.flush_cache()
+    storage._cache.clear()
+    history._migrated.clear()
+    history._projected.clear()
+    storage.DATA_DIR = data_dir
+    try:
+        history.append_messages(1, "abc", [{"role": "user", "content": "antes"}])
+        history.fork_history(1, "abc", "def")
+        history.append_messages(1, "def", [{"role": "user", "content": "depois"}])
+        storage.flush_cache()
+    finally:
+        storage.DATA_DIR = old_dir
+
+    db_path = data_dir / "migrated.db"
+    migrate_json_tree(data_dir, db_path)
+    from core.sqlite_backend import SqliteBackend
+    backend = SqliteBackend(db_path)
+    assert [m["content"] for m in backend.read_records("1", "history.jsonl", "def")] == ["antes", "depois"]
+    assert [m["content"] for m in backend.read_records("1", "history.jsonl", "abc")] == ["antes"]
+    assert backend.read_document("1", "history.segments.json", "def") is None
+    print("Test 3 Passed: Segments + live log imported in order")
+
+if __name__ == "__main__":
+    try:
+        test_storage_api_on_sqlite()
+        test_migrate_json_tree()
+        test_migrate_forked_history()
+        print("\n[OK] All Tests Passed!")
+    except AssertionError as e:
+        print(f"\n[FAIL] Test Failed: {e}")
+        sys.exit(1)
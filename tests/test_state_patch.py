@@ -0,0 +1,118 @@
+
+import sys
+import os
+import copy
+import json
+
+# Add src to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from core import chat
+from core.player import (
+    PlayerTransaction, StatePatchError, apply_state_patch, apply_state_update,
+    load_player, save_player, parse_state_block
+)
+
+def make_player():
+    return {
+        "nome": "Aria", "classe": "Mago", "modo": "dnd5e", "nivel": 1, "experiencia": 0,
+        "inventario": {
+            "vida_atual": 20, "vida_maxima": 30, "mana_atual": 0, "mana_maxima": 0, "ouro": 10,
+            "itens": [
+                {"nome": "Cajado", "quantidade": 1, "buffs": {"inteligencia": 1}},
+                {"nome": "Poção de Cura", "quantidade": 3},
+                "Tocha"
+            ]
+        },
+        "spell_slots": {"1": {"total": 2, "usado": 0}},
+        "magias": [], "status": []
+    }
+
+def test_patch_ops():
+    print("--- Test 1: Deltas and item ops by name ---")
+    player = make_player()
+    apply_state_patch({
+        "vida": 15, "ouro": -4, "xp": 20,
+        "add": [{"nome": "Corda", "descricao": "10 metros"}, {"nome": "pocao de cura", "quantidade": 2}],
+        "remove": [{"nome": "Poção de Cura", "quantidade": 1}, "tocha"],
+        "update": [{"nome": "cajado", "descricao": "Brilha"}],
+        "slots": {"1": 1}
+    }, 1, "c1", player)
+
+    inv = player["inventario"]
+    assert inv["vida_atual"] == 30, "Healing is clamped to vida_maxima"
+    assert inv["ouro"] == 6 and player["experiencia"] == 20
+    itens = {i["nome"]: i for i in inv["itens"]}
+    assert set(itens) == {"Cajado", "Poção de Cura", "Corda"}
+    assert itens["Poção de Cura"]["quantidade"] == 4
+    assert itens["Cajado"]["descricao"] == "Brilha" and itens["Cajado"]["buffs"] == {"inteligencia": 1}
+    assert player["spell_slots"]["1"]["usado"] == 1
+    print("Test 1 Passed")
+
+def test_patch_is_atomic():
+    print("\n--- Test 2: An invalid op rejects the whole patch ---")
+    for bad in ({"vida": -5, "ouro": -50},
+                {"add": [{"nome": "Corda"}], "remove": ["Espada Mágica"]},
+                {"vida": -5, "slots": {"1": 3}},
+                {"vida": "-5"}):
+        player = make_player()
+        before = copy.deepcopy(player)
+        try:
+            apply_state_patch(bad, 1, "c1", player)
+            assert False, f"Patch should be rejected: {bad}"
+        except StatePatchError:
+            pass
+        assert player == before, f"Rejected patch changed the player: {bad}"
+
+    # Through apply_state_update the rejection is logged, never raised
+    player = make_player()
+    assert apply_state_update({"patch": {"ouro": -50}}, 1, "c1", player) == []
+    assert player == make_player()
+    print("Test 2 Passed")
+
+def test_full_lists_still_accepted():
+    print("\n--- Test 3: Full-state replies keep working, also next to a patch ---")
+    player = make_player()
+    apply_state_update({"inventario": {"ouro": 99, "itens": [{"nome": "Cajado"}]}, "patch": {"vida": -5}}, 1, "c1", player)
+    assert player["inventario"]["ouro"] == 99 and player["inventario"]["vida_atual"] == 15
+    assert player["inventario"]["itens"] == [{"nome": "Cajado", "buffs": {"inteligencia": 1}}]
+
+    # Unfenced nested block is read whole
+    assert parse_state_block('Você vence.\n{"patch": {"ouro": 5, "slots": {"1": 1}}}') == {"patch": {"ouro": 5, "slots": {"1": 1}}}
+    print("Test 3 Passed")
+
+def test_narrated_damage_not_counted_twice():
+    print("\n--- Test 4: Damage reported in the patch is not applied again by the backup ---")
+    save_player(1, make_player(), campaign_id="c1")
+
+    reply = 'O goblin acerta e você levou 6 pontos de dano.\n```json\n{"patch": {"vida": -6}}\n```'
+    with PlayerTransaction(1, "c1") as state:
+        chat._finish_turn("Ataco", reply, 1, "c1", player=state.player)
+    assert load_player(1, "c1")["inventario"]["vida_atual"] == 14
+
+    # Without a reported HP change the narrative backup still applies
+    with PlayerTransaction(1, "c1") as state:
+        chat._finish_turn("Ataco", 'Você levou 4 pontos de dano.\n```json\n{"patch": {"ouro": 1}}\n```', 1, "c1", player=state.player)
+    saved = load_player(1, "c1")
+    assert saved["inventario"]["vida_atual"] == 10 and saved["inventario"]["ouro"] == 11
+    print("Test 4 Passed")
+
+def test_patch_is_smaller():
+    print("\n--- Test 5: A patch does not grow with the inventory ---")
+    player = make_player()
+    player["inventario"]["itens"] = [{"nome": f"Item {n}", "descricao": "Um item qualquer do inventário"} for n in range(40)]
+    full = {"inventario": {"vida_atual": 14, "itens": player["inventario"]["itens"] + [{"nome": "Corda"}]}}
+    patch = {"patch": {"vida": -6, "add": [{"nome": "Corda"}]}}
+    assert len(json.dumps(patch)) * 20 < len(json.dumps(full))
+    print(f"Test 5 Passed: {len(json.dumps(patch))} vs {len(json.dumps(full))} chars")
+
+if __name__ == "__main__":
+    from conftest import temp_data_dir
+    try:
+        for test in (test_patch_ops, test_patch_is_atomic, test_full_lists_still_accepted, test_narrated_damage_not_counted_twice, test_patch_is_smaller):
+            with temp_data_dir():
+                test()
+        print("\n[OK] All Tests Passed!")
+    except AssertionError as e:
+        print(f"\n[FAIL] Test Failed: {e}")
+        sys.exit(1)
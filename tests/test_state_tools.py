@@ -0,0 +1,136 @@
+
+import sys
+import os
+import json
+import asyncio
+from types import SimpleNamespace
+
+# Add src to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from core import llm, chat
+from core.player import PlayerTransaction, load_player, save_player
+from core.history import load_history
+from core.state_tools import STATE_TOOL, parse_state_updates
+
+def test_tool_schema_is_compact():
+    print("--- Test 1: Tool schema is self-contained, no null wrappers ---")
+    dumped = json.dumps(STATE_TOOL)
+    assert "$ref" not in dumped and "$defs" not in dumped and '"title"' not in dumped
+    assert '{"type": "null"}' not in dumped.replace('{"type": "string"}, {"type": "null"}', "")
+    inventory = STATE_TOOL["function"]["parameters"]["properties"]["inventario"]
+    assert inventory["properties"]["ouro"] == {"type": "integer"}
+    print("Test 1 Passed")
+
+def test_parse_state_updates():
+    print("\n--- Test 2: Tool arguments are validated, bad calls skipped ---")
+    calls = [
+        {"name": "atualizar_estado", "arguments": '{"inventario": {"ouro": 40}, "experiencia": 200}'},
+        {"name": "atualizar_estado", "arguments": '{"inventario": {"ouro": "muito"}}'},
+        {"name": "atualizar_estado", "arguments": '{"inventario": '},
+        {"name": "outra_funcao", "arguments": "{}"},
+    ]
+    assert parse_state_updates(calls) == [{"inventario": {"ouro": 40}, "experiencia": 200}]
+    print("Test 2 Passed")
+
+def test_stream_assembles_tool_calls():
+    print("\n--- Test 3: Streamed tool call fragments are assembled ---")
+    def chunk(content=None, fragments=None):
+        delta = SimpleNamespace(content=content, tool_calls=fragments)
+        return SimpleNamespace(choices=[SimpleNamespace(delta=delta)])
+
+    def fragment(name=None, arguments=None, id=None):
+        return SimpleNamespace(index=0, id=id, function=SimpleNamespace(name=name, arguments=arguments))
+
+    async def stream():
+        for item in (chunk("Você vence."), chunk(fragments=[fragment("atualizar_estado", '{"inventario"', id="call_1")]),
+                     chunk(fragments=[fragment(arguments=': {"ouro": 5}}')])):
+            yield item
+
+    class FakeCompletions:
+        async def create(self, **kwargs):
+            assert kwargs["tools"] and kwargs["stream"]
+            return stream()
+
+    async def run():
+        calls = []
+        text = ""
+        async for delta in llm.stream_chat_completion([], tool_calls=calls, tools=[STATE_TOOL]):
+            text += delta
+        return text, calls
+
+    old_client = llm._client
+    llm._client = SimpleNamespace(chat=SimpleNamespace(completions=FakeCompletions()))
+    try:
+        text, calls = asyncio.run(run())
+    finally:
+        llm._client = old_client
+    assert text == "Você vence."
+    assert calls == [{"id": "call_1", "name": "atualizar_estado", "arguments": '{"inventario": {"ouro": 5}}'}]
+    print("Test 3 Passed")
+
+def test_finish_turn_applies_tool_updates():
+    print("\n--- Test 4: Tool updates replace the JSON block and stay in history ---")
+    save_player(1, {
+        "nome": "Aria", "classe": "Guerreiro", "modo": "narrativo", "nivel": 1, "experiencia": 0,
+        "inventario": {"vida_atual": 30, "vida_maxima": 30, "ouro": 0, "itens": []},
+        "magias": [], "status": []
+    }, campaign_id="c1")
+
+    updates = parse_state_updates([{"name": "atualizar_estado", "arguments": '{"inventario": {"ouro": 40}, "experiencia": 200}'}])
+    with PlayerTransaction(1, "c1") as state:
+        reply = chat._finish_turn("Ataco o ogro", "O ogro cai.", 1, "c1", player=state.player, state_updates=updates)
+
+    saved = load_player(1, "c1")
+    assert saved["inventario"]["ouro"] == 40
+    assert saved["nivel"] == 2 and saved["experiencia"] == 50
+    assert "O ogro cai." in reply
+    notes = [m["content"] for m in load_history(1, "c1") if m["role"] == "system"]
+    assert any("atualizar_estado" in n and '"ouro": 40' in n for n in notes), notes
+    print("Test 4 Passed")
+
+def test_tool_only_reply_gets_narration():
+    print("\n--- Test 5: A reply with only the tool call is followed by a narration call ---")
+    save_player(1, {
+        "nome": "Aria", "classe": "Guerreiro", "modo": "narrativo", "nivel": 1, "experiencia": 0,
+        "inventario": {"vida_atual": 30, "vida_maxima": 30, "ouro": 0, "itens": []},
+        "magias": [], "status": []
+    }, campaign_id="c1")
+    requests = []
+
+    async def fake_completion(messages, model=None, tool_calls=None, **kwargs):
+        requests.append((messages, kwargs))
+        if len(requests) == 1:
+            tool_calls.append({"id": "call_1", "name": "atualizar_estado", "arguments": '{"inventario": {"ouro": 40}}'})
+            return ""
+        return "Você encontra 40 moedas."
+
+    turn_messages = [{"role": "user", "content": "Revisto o baú"}]
+    old = chat.chat_completion, chat._prepare_turn
+    chat.chat_completion = fake_completion
+    chat._prepare_turn = lambda *args: (None, {"llm_messages": turn_messages, "passive_msg": None})
+    try:
+        reply = asyncio.run(chat._process_message("Revisto o baú", 1, "c1"))
+    finally:
+        chat.chat_completion, chat._prepare_turn = old
+
+    assert len(requests) == 2
+    followup, kwargs = requests[1]
+    assert kwargs["tool_choice"] == "none"
+    assert followup[:1] == turn_messages and followup[1]["tool_calls"][0]["id"] == "call_1"
+    assert followup[2] == {"role": "tool", "tool_call_id": "call_1", "content": followup[2]["content"]}
+    assert "Você encontra 40 moedas." in reply
+    assert load_player(1, "c1")["inventario"]["ouro"] == 40
+    assert {"role": "assistant", "content": "Você encontra 40 moedas."} in load_history(1, "c1")
+    print("Test 5 Passed: Narration requested once, update applied")
+
+if __name__ == "__main__":
+    from conftest import temp_data_dir
+    try:
+        for test in (test_tool_schema_is_compact, test_parse_state_updates, test_stream_assembles_tool_calls, test_finish_turn_applies_tool_updates, test_tool_only_reply_gets_narration):
+            with temp_data_dir():
+                test()
+        print("\n[OK] All Tests Passed!")
+    except AssertionError as e:
+        print(f"\n[FAIL] Test Failed: {e}")
+        sys.exit(1)
@@ -0,0 +1,72 @@
+
+import sys
+import os
+import json
+
+# Add src to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from core.effects import add_effect, end_effect, tick_effects, effects_summary
+from core.player import apply_state_update, process_passive_effects
+
+def make_player():
+    return {"nome": "Aria", "inventario": {"vida_atual": 10, "vida_maxima": 40, "mana_atual": 5, "mana_maxima": 20}, "status": []}
+
+def test_tick_counter():
+    print("--- Test 1: Heal over time counts down 3/3 -> 0/3 ---")
+    player = make_player()
+    add_effect(player, "Regeneração", "vida", 10, duracao=3)
+    assert "Regeneração" in player["status"]
+    assert "Regeneração +10 PV/turno 3/3" in effects_summary(player)
+
+    assert tick_effects(player) == ["❤️ Regeneração: +10 PV (2/3)"]
+    tick_effects(player)
+    messages = tick_effects(player)
+    assert messages == ["❤️ Regeneração: +10 PV (0/3)", "⌛ Efeito terminou: Regeneração"]
+    assert player["inventario"]["vida_atual"] == 40
+    assert player["efeitos"] == [] and player["status"] == []
+    assert effects_summary(player) is None
+    print("Test 1 Passed")
+
+def test_only_due_effects_are_touched():
+    print("\n--- Test 2: Turns pop only what is due; heap survives JSON ---")
+    player = make_player()
+    add_effect(player, "Bênção", "status", duracao=50)
+    add_effect(player, "Veneno", "vida", -2, duracao=4, intervalo=2)
+    player = json.loads(json.dumps(player)) # Stored and reloaded
+
+    assert tick_effects(player) == [] # Veneno ticks every 2 turns
+    assert tick_effects(player) == ["☠️ Veneno: -2 PV (3/4)"]
+    assert player["efeitos"][0][2]["nome"] == "Veneno", "Soonest due on top"
+    assert "Bênção (49 turnos)" in effects_summary(player)
+
+    assert end_effect(player, "Veneno") and "Veneno" not in player["status"]
+    for _ in range(48):
+        assert tick_effects(player) == []
+    assert tick_effects(player) == ["⌛ Efeito terminou: Bênção"]
+    print("Test 2 Passed")
+
+def test_effects_from_patch():
+    print("\n--- Test 3: Effects start from the state patch; legacy passive kept ---")
+    player = make_player()
+    apply_state_update({"patch": {"efeitos": [{"nome": "Fúria", "tipo": "mana", "valor": -5, "duracao": 2}]}}, 1, "c1", player)
+    assert process_passive_effects(1, "c1", player=player) == "🔷 Fúria: -5 Mana (1/2)"
+    assert player["inventario"]["mana_atual"] == 0
+
+    before = json.dumps(player)
+    apply_state_update({"patch": {"efeitos": [{"nome": "X", "tipo": "fogo", "duracao": 2}]}}, 1, "c1", player)
+    assert json.dumps(player) == before, "Invalid effect rejects the patch"
+
+    player["status"].append("Recuperação de Vida Extrema")
+    assert "❤️ Recuperação Extrema: +15 PV" in process_passive_effects(1, "c1", player=player)
+    print("Test 3 Passed")
+
+if __name__ == "__main__":
+    try:
+        test_tick_counter()
+        test_only_due_effects_are_touched()
+        test_effects_from_patch()
+        print("\n[OK] All Tests Passed!")
+    except AssertionError as e:
+        print(f"\n[FAIL] Test Failed: {e}")
+        sys.exit(1)
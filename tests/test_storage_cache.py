@@ -0,0 +1,104 @@
+
+import sys
+import os
+import json
+
+# Add src to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from core import storage
+
+def test_write_behind():
+    print("--- Test 1: Writes stay in memory until flush ---")
+    storage.save_json(1, "player.json", {"nome": "Aria"}, campaign_id="c1")
+    path = storage.DATA_DIR / "1" / "campaigns" / "c1" / "player.json"
+
+    assert storage.load_json(1, "player.json", campaign_id="c1") == {"nome": "Aria"}
+    assert not path.exists(), "File should not be written before flush"
+
+    assert storage.flush_cache() == 1
+    assert json.loads(path.read_text()) == {"nome": "Aria"}
+    assert storage.flush_cache() == 0, "Clean entries should not be rewritten"
+    print("Test 1 Passed: Write coalesced until flush")
+
+def test_lru_eviction():
+    print("\n--- Test 2: LRU eviction keeps dirty entries ---")
+    old_max = storage.CACHE_MAX_ENTRIES
+    storage.CACHE_MAX_ENTRIES = 2
+    try:
+        for i in range(4):
+            storage.save_json(1, "player.json", {"i": i}, campaign_id=f"c{i}")
+        assert len(storage._cache) == 4, "Dirty entries must not be evicted before flush"
+
+        storage.flush_cache()
+        assert len(storage._cache) == 2
+        # Evicted entries are reloaded from disk
+        assert storage.load_json(1, "player.json", campaign_id="c0") == {"i": 0}
+    finally:
+        storage.CACHE_MAX_ENTRIES = old_max
+    print("Test 2 Passed: Size bounded after flush")
+
+def test_delete_drops_pending_writes():
+    print("\n--- Test 3: Deleting a campaign discards pending writes ---")
+    storage.save_json(1, "history.json", [{"role": "user", "content": "oi"}], campaign_id="gone")
+    storage.delete_campaign_folder(1, "gone")
+    storage.flush_cache()
+
+    assert not (storage.DATA_DIR / "1" / "campaigns" / "gone").exists()
+    assert storage.load_json(1, "history.json", default=[], campaign_id="gone") == []
+    print("Test 3 Passed: No resurrected files")
+
+def test_bad_entry_does_not_block_flush():
+    print("\n--- Test 4: One bad entry does not stop the flusher ---")
+    storage.save_json(1, "player.json", {"nome": "Aria"}, campaign_id="c1")
+    storage.save_json(1, "broken.json", {"valor": object()}, campaign_id="c1")
+    assert storage.flush_cache() == 1
+    assert (storage.DATA_DIR / "1" / "campaigns" / "c1" / "player.json").exists()
+    # Dropped, so later flushes (and the shutdown flush) keep working
+    assert storage._dirty == set()
+    storage.save_json(1, "player.json", {"nome": "Bram"}, campaign_id="c1")
+    assert storage.flush_cache() == 1
+
+    class MutatedMidDump(dict):
+        calls = 0
+        def items(self):
+            MutatedMidDump.calls += 1
+            if MutatedMidDump.calls == 1:
+                raise RuntimeError("dictionary changed size during iteration")
+            return super().items()
+
+    storage.save_json(1, "memory.json", MutatedMidDump(pontos=[]), campaign_id="c1")
+    assert storage.flush_cache() == 0
+    assert len(storage._dirty) == 1 # Retried on the next flush
+    assert storage.flush_cache() == 1
+    assert json.loads((storage.DATA_DIR / "1" / "campaigns" / "c1" / "memory.json").read_text()) == {"pontos": []}
+
+    storage.CACHE_FLUSH_INTERVAL, old_interval = 0.01, storage.CACHE_FLUSH_INTERVAL
+    old_flush = storage.flush_cache
+    calls = []
+    def failing_flush():
+        calls.append(1)
+        raise OSError("disco cheio")
+    storage.flush_cache = failing_flush
+    try:
+        storage.start_cache_flusher()
+        import time
+        time.sleep(0.1)
+        assert storage._flusher_thread.is_alive() and len(calls) > 1
+    finally:
+        storage._flusher_stop.set()
+        storage._flusher_thread.join()
+        storage.flush_cache = old_flush
+        storage.CACHE_FLUSH_INTERVAL = old_interval
+    print("Test 4 Passed: Good entries written, flusher thread survives errors")
+
+if __name__ == "__main__":
+    from conftest import temp_data_dir
+    try:
+        for test in (test_write_behind, test_lru_eviction, test_delete_drops_pending_writes, test_bad_entry_does_not_block_flush):
+            with temp_data_dir():
+                test()
+        print("\n[OK] All Tests Passed!")
+    except AssertionError as e:
+        print(f"\n[FAIL] Test Failed: {e}")
+        sys.exit(1)